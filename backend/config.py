@@ -16,11 +16,26 @@ class Config:
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
     OPENROUTER_API_BASE: str = "https://openrouter.ai/api/v1"
 
+    # OpenRouter HTTP client (shared connection pool)
+    OPENROUTER_TIMEOUT: float = float(os.getenv("OPENROUTER_TIMEOUT", "60"))
+    OPENROUTER_CONNECT_TIMEOUT: float = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "10"))
+    OPENROUTER_MAX_CONNECTIONS: int = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    OPENROUTER_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+    # Coalesce identical concurrent chat requests into one upstream call
+    OPENROUTER_SINGLE_FLIGHT: bool = os.getenv("OPENROUTER_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+    # Requires the 'h2' package (pip install httpx[http2])
+    OPENROUTER_HTTP2: bool = os.getenv("OPENROUTER_HTTP2", "false").lower() in ("1", "true", "yes")
+
     # Model Configuration
     DEFAULT_MODEL: str = os.getenv("DEFAULT_MODEL", "google/gemini-2.5-flash-preview-09-2025")
     FALLBACK_MODEL: str = os.getenv("FALLBACK_MODEL", "x-ai/grok-4-fast")
 
     # Available models for user selection
+    # prompt_cache: "explicit" = provider caches the prompt prefix only when marked with
+    # cache_control (Anthropic, Gemini); "auto" = provider caches repeated prefixes itself.
+    # cached_input_cost_per_1m is the price of prompt tokens served from that cache.
+    # history_token_budget (optional) overrides HISTORY_TOKEN_BUDGET for the model.
     AVAILABLE_MODELS = [
         {
             "id": "google/gemini-2.5-flash-preview-09-2025",
@@ -29,7 +44,9 @@ class Config:
             "context_length": 1000000,
             "context_display": "1M",
             "input_cost_per_1m": 0.075,
+            "cached_input_cost_per_1m": 0.01875,
             "output_cost_per_1m": 0.30,
+            "prompt_cache": "explicit",
             "temperature": 0.7,
             "max_tokens": 4000,
             "top_p": 1.0
@@ -41,7 +58,9 @@ class Config:
             "context_length": 2000000,
             "context_display": "2M",
             "input_cost_per_1m": 0.05,
+            "cached_input_cost_per_1m": 0.0125,
             "output_cost_per_1m": 0.15,
+            "prompt_cache": "auto",
             "temperature": 0.7,
             "max_tokens": 4000,
             "top_p": 1.0
@@ -53,7 +72,9 @@ class Config:
             "context_length": 1000000,
             "context_display": "1M",
             "input_cost_per_1m": 0.15,
+            "cached_input_cost_per_1m": 0.0375,
             "output_cost_per_1m": 0.60,
+            "prompt_cache": "auto",
             "temperature": 0.6,
             "max_tokens": 3000,
             "top_p": 0.95
@@ -65,7 +86,10 @@ class Config:
             "context_length": 200000,
             "context_display": "200K",
             "input_cost_per_1m": 3.0,
+            "cached_input_cost_per_1m": 0.30,
             "output_cost_per_1m": 15.0,
+            "prompt_cache": "explicit",
+            "history_token_budget": 8000,
             "temperature": 0.5,
             "max_tokens": 8000,
             "top_p": 0.95
@@ -78,6 +102,81 @@ class Config:
 
     # Lessons Configuration
     LESSONS_DIR: str = os.path.join(os.path.dirname(__file__), "data", "lessons")
+    # Number of assembled lesson contexts kept in memory (LRU)
+    CONTEXT_CACHE_SIZE: int = int(os.getenv("CONTEXT_CACHE_SIZE", "16"))
+    # Hot reload: apply added/edited/deleted lesson files without a restart
+    LESSONS_WATCH: bool = os.getenv("LESSONS_WATCH", "true").lower() in ("1", "true", "yes")
+    LESSONS_WATCH_INTERVAL: float = float(os.getenv("LESSONS_WATCH_INTERVAL", "2.0"))
+    # /lessons, /lessons/{id} and /models bodies are serialized once per corpus version and
+    # served with ETags; bodies above the threshold are also stored gzip (and brotli, if the
+    # 'brotli' package is installed) compressed
+    PREPARED_RESPONSE_CACHE_SIZE: int = int(os.getenv("PREPARED_RESPONSE_CACHE_SIZE", "256"))
+    RESPONSE_COMPRESS_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+    # Context mode: "lessons" sends the selected lessons in full,
+    # "lexical" sends only the chunks most relevant to the question (BM25),
+    # "semantic" does the same using local embeddings
+    CONTEXT_MODE: str = os.getenv("CONTEXT_MODE", "lessons")
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+    RETRIEVAL_TOKEN_BUDGET: int = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "24000"))
+    CHUNK_MAX_CHARS: int = int(os.getenv("CHUNK_MAX_CHARS", "2400"))
+
+    # Context packing: lessons, history and reserved output (model max_tokens) must fit the
+    # model's context_length; this share of the window is kept free for tokenizer estimate error
+    CONTEXT_SAFETY_MARGIN: float = float(os.getenv("CONTEXT_SAFETY_MARGIN", "0.05"))
+    # Assumed prompt tokens per attached image
+    IMAGE_TOKEN_ESTIMATE: int = int(os.getenv("IMAGE_TOKEN_ESTIMATE", "1500"))
+
+    # History compaction: the last N turns are sent verbatim, older ones as a rolling summary.
+    # HISTORY_TOKEN_BUDGET caps the verbatim part; a model may override it with "history_token_budget"
+    HISTORY_KEEP_TURNS: int = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000"))
+    HISTORY_SUMMARY_MAX_CHARS: int = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "4000"))
+
+    # Semantic retrieval: "hashing" (built-in, deterministic) or "sentence-transformers" (local model)
+    EMBEDDING_ENCODER: str = os.getenv("EMBEDDING_ENCODER", "hashing")
+    EMBEDDING_MODEL_PATH: str = os.getenv("EMBEDDING_MODEL_PATH", "")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "384"))
+    # Chunk embeddings are only built (at startup and on hot reload) when enabled; by default
+    # only with CONTEXT_MODE=semantic, otherwise context_mode="semantic" falls back to lexical
+    EMBEDDINGS_ENABLED: bool = os.getenv(
+        "EMBEDDINGS_ENABLED", str(CONTEXT_MODE == "semantic")
+    ).lower() in ("1", "true", "yes")
+
+    # Derived on-disk indexes (embeddings etc.), safe to delete
+    INDEX_DIR: str = os.getenv("INDEX_DIR", os.path.join(os.path.dirname(__file__), "data", ".index"))
+    # Compiled lesson corpus reused across restarts and uvicorn workers
+    CORPUS_SNAPSHOT_ENABLED: bool = os.getenv("CORPUS_SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+    CORPUS_SNAPSHOT_PATH: str = os.path.join(INDEX_DIR, "corpus.snapshot")
+    # Artifact metadata index used by GET /artifacts (rebuilt from docs/artifacts when missing)
+    ARTIFACT_INDEX_PATH: str = os.path.join(INDEX_DIR, "artifacts.sqlite3")
+    # Artifact file I/O runs in this many worker threads, off the event loop
+    ARTIFACT_IO_WORKERS: int = int(os.getenv("ARTIFACT_IO_WORKERS", "4"))
+
+    # Event-loop lag probe reported in /metrics (0 = disabled); lags above the threshold are logged
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_STALL_THRESHOLD_MS: float = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+    # Chat response cache (opt-in): repeated questions over the same context skip the upstream call
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_PATH: str = os.getenv("RESPONSE_CACHE_PATH", os.path.join(INDEX_DIR, "response_cache.sqlite3"))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_ALLOW_IMAGES: bool = os.getenv("RESPONSE_CACHE_ALLOW_IMAGES", "false").lower() in ("1", "true", "yes")
+    RESPONSE_CACHE_ALLOW_HISTORY: bool = os.getenv("RESPONSE_CACHE_ALLOW_HISTORY", "false").lower() in ("1", "true", "yes")
+
+    # Server-side conversation sessions (memory or sqlite), expired after SESSION_TTL seconds idle
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", os.path.join(INDEX_DIR, "sessions.sqlite3"))
+    SESSION_TTL: float = float(os.getenv("SESSION_TTL", "86400"))
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    SESSION_MAX_MESSAGES: int = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+
+    # Uploaded images (POST /images, artifacts) are stored once per content hash
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+    # Total size of image data URLs kept in memory for upstream payloads
+    IMAGE_DATA_URL_CACHE_BYTES: int = int(os.getenv("IMAGE_DATA_URL_CACHE_BYTES", str(64 * 1024 * 1024)))
 
     # Prompts Configuration
     PROMPTS_DIR: str = os.path.join(os.path.dirname(__file__), "prompts")
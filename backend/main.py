@@ -2,26 +2,33 @@
 AI Learning Agent - FastAPI Backend
 Main application file
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import asyncio
+import json
 import logging
 from contextlib import asynccontextmanager
 import os
-import uuid
-import base64
-from datetime import datetime
+from typing import Callable, Hashable, List, Literal, Optional
 
 from config import config
 from models import (
-    ChatRequest, ChatResponse, TokensUsage, CostInfo,
+    ChatRequest, ChatResponse, ChatStreamEnd, TokensUsage, CostInfo,
     LessonsListResponse, LessonInfo, LessonDetailResponse,
+    LessonSection, LessonTocResponse, LessonSectionResponse, LessonRangeResponse,
     ModelsListResponse, ModelInfo,
-    HealthResponse,
-    ContextPreviewRequest, ContextPreviewResponse,
+    HealthResponse, MetricsResponse, CacheStats, UpstreamHttpStats, ResponseCacheStats,
+    SingleFlightStats, SessionStats, EventLoopStats, SessionResponse, ChatMessage,
+    ImageUploadRequest, ImageUploadResponse, StoredImage,
+    ContextPreviewRequest, ContextPreviewResponse, SearchHit, SearchResponse,
     LessonsGroupedResponse,
-    CreateArtifactRequest, ArtifactListResponse, Artifact, ArtifactMeta
+    CreateArtifactRequest, ArtifactListResponse, Artifact, ArtifactMeta, ArtifactType
+)
+from services import (
+    ArtifactStore, ContextService, HistoryCompactor, ImageStore, ImageTooLargeError, LessonRecord, LessonWatcher, LoopLagMonitor, OpenRouterService, PreparedBody, PreparedResponseCache, PromptLoader, VectorStore,
+    SearchService, Section, SessionStore, create_response_cache, create_session_store, get_encoder, get_tokenizer
 )
-from services import ContextService, OpenRouterService, PromptLoader
 
 # Configure logging
 logging.basicConfig(
@@ -33,6 +40,16 @@ logger = logging.getLogger(__name__)
 # Global service instances
 context_service: ContextService = None
 openrouter_service: OpenRouterService = None
+lesson_watcher: LessonWatcher = None
+history_compactor: HistoryCompactor = None
+session_store: SessionStore = None
+image_store: ImageStore = None
+artifact_store: ArtifactStore = None
+loop_monitor: LoopLagMonitor = None
+search_service: SearchService = None
+prepared_responses: PreparedResponseCache = None
+# Serializes artifact creation with reindexing, so a rebuild cannot drop a new artifact
+artifact_write_lock: asyncio.Lock = None
 
 # Artifacts storage (docs/artifacts)
 ARTIFACTS_DIR = os.path.abspath(
@@ -45,106 +62,61 @@ def _ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def _generate_artifact_id() -> str:
-    """Generate unique artifact id: YYYYMMDDHHMMSS-xxxxxx"""
-    return datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
-
-
-def _frontmatter(meta: dict) -> str:
-    """Build YAML-like frontmatter without external deps"""
-    lines = ["---"]
-    for k, v in meta.items():
-        if isinstance(v, list):
-            lines.append(f"{k}: [{', '.join(v)}]")
-        else:
-            lines.append(f"{k}: {v}")
-    lines.append("---")
-    return "\n".join(lines)
-
+async def _resolve_images(images: Optional[list[str]]) -> Optional[list[str]]:
+    """
+    Replace image references with data URLs for the upstream payload
 
-def _write_markdown_file(artifact_id: str, meta: dict, body: str) -> str:
-    md_path = os.path.join(ARTIFACTS_DIR, f"{artifact_id}.md")
-    content = _frontmatter(meta) + "\n\n" + (body or "")
-    with open(md_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    return md_path
+    Raises:
+        HTTPException: 400 if a reference is unknown
+    """
+    if not images:
+        return images
+    try:
+        # Reading and base64-encoding image files would block the event loop
+        return await asyncio.to_thread(lambda: [image_store.resolve(image) for image in images])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _prepared_response(
+    request: Request,
+    key: Hashable,
+    version: Hashable,
+    build: Callable[[], bytes]
+) -> Response:
+    """
+    Serve a read-only JSON body that is serialized and compressed once per data version
 
+    Conditional requests whose If-None-Match matches get 304 without a body.
 
-def _save_images(images: list[str], artifact_id: str) -> list[str]:
-    """
-    Save data URL images to assets folder.
-    Returns list of relative asset paths 'assets/<file>'.
+    Args:
+        request: Incoming request (If-None-Match / Accept-Encoding)
+        key: Resource key
+        version: Current version of the data behind the resource
+        build: Serializes the response body (called on a cache miss)
     """
-    saved: list[str] = []
-    if not images:
-        return saved
-    _ensure_dir(ASSETS_DIR)
-    for idx, data_url in enumerate(images, start=1):
-        try:
-            if not data_url.startswith("data:"):
-                # skip non data URLs
-                continue
-            header, b64 = data_url.split(",", 1)
-            # data:image/png;base64,...
-            mime = header.split(";")[0].split(":")[1] if ":" in header else "image/png"
-            ext = "png"
-            if mime.endswith("jpeg") or mime.endswith("jpg"):
-                ext = "jpg"
-            elif mime.endswith("png"):
-                ext = "png"
-            elif mime.endswith("webp"):
-                ext = "webp"
-            else:
-                # default to png if unknown
-                ext = "png"
-            binary = base64.b64decode(b64)
-            filename = f"{artifact_id}-{idx}.{ext}"
-            abs_path = os.path.join(ASSETS_DIR, filename)
-            with open(abs_path, "wb") as out:
-                out.write(binary)
-            saved.append(f"assets/{filename}")
-        except Exception as e:
-            logger.error(f"Failed to save image {idx} for artifact {artifact_id}: {e}")
-            continue
-    return saved
-
-
-def _parse_frontmatter(md_text: str) -> tuple[dict, str]:
-    """
-    Naive frontmatter parser: returns (meta_dict, body)
-    Expects:
-    ---
-    key: value
-    ---
-    body...
-    """
-    if not md_text.startswith("---"):
-        return {}, md_text
-    parts = md_text.split("---", 2)
-    if len(parts) < 3:
-        return {}, md_text
-    _, meta_str, body = parts
-    meta: dict = {}
-    for raw in meta_str.strip().splitlines():
-        if ":" not in raw:
-            continue
-        k, v = raw.split(":", 1)
-        key = k.strip()
-        val = v.strip()
-        if val.startswith("[") and val.endswith("]"):
-            # list like [a, b]
-            items = [x.strip() for x in val[1:-1].split(",") if x.strip()]
-            meta[key] = items
-        else:
-            meta[key] = val
-    return meta, body.lstrip("\n")
+    prepared: Optional[PreparedBody] = prepared_responses.get(key, version)
+    if prepared is None:
+        body = build()
+        # Hashing and compression off the event loop
+        prepared = await asyncio.to_thread(prepared_responses.prepare, body)
+        prepared_responses.put(key, version, prepared)
+
+    content, encoding = prepared.select(request.headers.get("accept-encoding"))
+    headers = {"ETag": prepared.etag(encoding), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if prepared.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown"""
     # Startup
-    global context_service, openrouter_service
+    global context_service, openrouter_service, lesson_watcher, history_compactor, session_store, image_store
+    global artifact_store, loop_monitor, search_service, prepared_responses, artifact_write_lock
 
     logger.info("Starting AI Learning Agent Backend...")
 
@@ -158,9 +130,43 @@ async def lifespan(app: FastAPI):
 
     # Initialize services
     logger.info(f"Loading lessons from: {config.LESSONS_DIR}")
-    context_service = ContextService(config.LESSONS_DIR)
+    # Embedding every chunk is only worth it when semantic retrieval is used
+    vector_store = None
+    if config.EMBEDDINGS_ENABLED:
+        vector_store = VectorStore(
+            config.INDEX_DIR,
+            get_encoder(config.EMBEDDING_ENCODER, config.EMBEDDING_MODEL_PATH, config.EMBEDDING_DIM)
+        )
+    context_service = ContextService(
+        config.LESSONS_DIR,
+        context_cache_size=config.CONTEXT_CACHE_SIZE,
+        chunk_max_chars=config.CHUNK_MAX_CHARS,
+        vector_store=vector_store,
+        snapshot_path=config.CORPUS_SNAPSHOT_PATH if config.CORPUS_SNAPSHOT_ENABLED else None
+    )
     logger.info(f"Loaded {context_service.get_total_lessons()} lessons")
 
+    if config.LESSONS_WATCH:
+        lesson_watcher = LessonWatcher(context_service, poll_interval=config.LESSONS_WATCH_INTERVAL)
+        lesson_watcher.start()
+
+    prepared_responses = PreparedResponseCache(
+        max_entries=config.PREPARED_RESPONSE_CACHE_SIZE,
+        compress_min_bytes=config.RESPONSE_COMPRESS_MIN_BYTES
+    )
+
+    history_compactor = HistoryCompactor(
+        keep_turns=config.HISTORY_KEEP_TURNS,
+        summary_max_chars=config.HISTORY_SUMMARY_MAX_CHARS
+    )
+    session_store = create_session_store(
+        backend=config.SESSION_BACKEND,
+        path=config.SESSION_DB_PATH,
+        ttl=config.SESSION_TTL,
+        max_sessions=config.SESSION_MAX_SESSIONS,
+        max_messages=config.SESSION_MAX_MESSAGES
+    )
+
     logger.info(f"Loading prompts from: {config.PROMPTS_DIR}")
     prompt_loader = PromptLoader(config.PROMPTS_DIR)
     logger.info("Prompts loaded successfully")
@@ -169,6 +175,41 @@ async def lifespan(app: FastAPI):
     _ensure_dir(ARTIFACTS_DIR)
     _ensure_dir(ASSETS_DIR)
     logger.info(f"Artifacts directory ready: {ARTIFACTS_DIR}")
+    image_store = ImageStore(
+        ASSETS_DIR,
+        max_bytes=config.IMAGE_MAX_BYTES,
+        data_url_cache_bytes=config.IMAGE_DATA_URL_CACHE_BYTES
+    )
+    artifact_store = ArtifactStore(
+        ARTIFACTS_DIR,
+        index_path=config.ARTIFACT_INDEX_PATH,
+        image_store=image_store,
+        max_workers=config.ARTIFACT_IO_WORKERS
+    )
+    artifact_write_lock = asyncio.Lock()
+    await artifact_store.sync_index()
+    await artifact_store.migrate_asset_manifests()
+
+    search_service = SearchService(context_service, chunk_max_chars=config.CHUNK_MAX_CHARS)
+    await asyncio.to_thread(search_service.load_artifacts, await artifact_store.read_documents())
+
+    if config.LOOP_MONITOR_INTERVAL > 0:
+        loop_monitor = LoopLagMonitor(
+            interval=config.LOOP_MONITOR_INTERVAL,
+            stall_threshold=config.LOOP_STALL_THRESHOLD_MS / 1000
+        )
+        loop_monitor.start()
+
+    response_cache = None
+    if config.RESPONSE_CACHE_ENABLED:
+        response_cache = create_response_cache(
+            backend=config.RESPONSE_CACHE_BACKEND,
+            path=config.RESPONSE_CACHE_PATH,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=config.RESPONSE_CACHE_TTL,
+            allow_images=config.RESPONSE_CACHE_ALLOW_IMAGES,
+            allow_history=config.RESPONSE_CACHE_ALLOW_HISTORY
+        )
 
     openrouter_service = OpenRouterService(
         api_key=config.OPENROUTER_API_KEY,
@@ -176,8 +217,17 @@ async def lifespan(app: FastAPI):
         default_model=config.DEFAULT_MODEL,
         fallback_model=config.FALLBACK_MODEL,
         prompt_loader=prompt_loader,
-        model_configs=config.AVAILABLE_MODELS
+        model_configs=config.AVAILABLE_MODELS,
+        timeout=config.OPENROUTER_TIMEOUT,
+        connect_timeout=config.OPENROUTER_CONNECT_TIMEOUT,
+        max_connections=config.OPENROUTER_MAX_CONNECTIONS,
+        max_keepalive_connections=config.OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.OPENROUTER_KEEPALIVE_EXPIRY,
+        http2=config.OPENROUTER_HTTP2,
+        response_cache=response_cache,
+        single_flight=config.OPENROUTER_SINGLE_FLIGHT
     )
+    await openrouter_service.start()
     logger.info(f"OpenRouter service initialized with model: {config.DEFAULT_MODEL}")
 
     logger.info("Backend startup complete!")
@@ -186,6 +236,15 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down AI Learning Agent Backend...")
+    if lesson_watcher is not None:
+        await lesson_watcher.stop()
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    await openrouter_service.aclose()
+    if response_cache is not None:
+        response_cache.close()
+    session_store.close()
+    artifact_store.close()
 
 
 # Create FastAPI app
@@ -216,9 +275,14 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "lessons": "/lessons",
             "models": "/models",
-            "chat": "/chat"
+            "chat": "/chat",
+            "chat_stream": "/chat/stream",
+            "sessions": "/sessions",
+            "images": "/images",
+            "search": "/search"
         }
     }
 
@@ -227,44 +291,68 @@ async def root():
 async def health_check():
     """
     Health check endpoint
-    Returns service status and number of loaded lessons
+    Returns service status, number of loaded lessons and corpus version
     """
     return HealthResponse(
         status="healthy",
         version="1.0.0",
-        lessons_loaded=context_service.get_total_lessons()
+        lessons_loaded=context_service.get_total_lessons(),
+        corpus_version=context_service.corpus_version
+    )
+
+
+@app.get("/metrics", response_model=MetricsResponse, tags=["General"])
+async def get_metrics():
+    """
+    Runtime metrics endpoint
+    Returns cache effectiveness counters for monitoring
+    """
+    response_cache = openrouter_service.response_cache
+    single_flight = openrouter_service.get_single_flight_stats()
+    return MetricsResponse(
+        context_cache=CacheStats(**context_service.get_cache_stats()),
+        upstream_http=UpstreamHttpStats(**openrouter_service.get_http_stats()),
+        response_cache=ResponseCacheStats(**await response_cache.get_stats()) if response_cache else None,
+        single_flight=SingleFlightStats(**single_flight) if single_flight else None,
+        sessions=SessionStats(**await session_store.aget_stats()),
+        event_loop=EventLoopStats(**loop_monitor.get_stats()) if loop_monitor else None
     )
 
 
 @app.get("/lessons", response_model=LessonsListResponse, tags=["Lessons"])
-async def get_lessons():
+async def get_lessons(request: Request):
     """
     Get list of all available lessons
-    Returns lesson IDs, titles, and module information
+    Returns lesson IDs, titles, and module information (serialized once per corpus version, ETag)
     """
-    lessons_list = context_service.get_lessons_list()
+    def build() -> bytes:
+        lessons_list = context_service.get_lessons_list()
+        return LessonsListResponse(
+            total=len(lessons_list),
+            lessons=[LessonInfo(**lesson) for lesson in lessons_list]
+        ).model_dump_json().encode("utf-8")
 
-    return LessonsListResponse(
-        total=len(lessons_list),
-        lessons=[LessonInfo(**lesson) for lesson in lessons_list]
-    )
+    return await _prepared_response(request, ("lessons",), context_service.corpus_version, build)
 
 
 @app.get("/lessons/grouped", response_model=LessonsGroupedResponse, tags=["Lessons"])
-async def get_lessons_grouped():
+async def get_lessons_grouped(request: Request):
     """
     Get lessons grouped by course and module
-    Returns hierarchical structure for tree display
+    Returns hierarchical structure for tree display (serialized once per corpus version, ETag)
     """
-    grouped = context_service.get_grouped_lessons()
-    return LessonsGroupedResponse(groups=grouped)
+    def build() -> bytes:
+        grouped = context_service.get_grouped_lessons()
+        return LessonsGroupedResponse(groups=grouped).model_dump_json().encode("utf-8")
+
+    return await _prepared_response(request, ("lessons_grouped",), context_service.corpus_version, build)
 
 
 @app.get("/lessons/{lesson_id}", response_model=LessonDetailResponse, tags=["Lessons"])
-async def get_lesson(lesson_id: int):
+async def get_lesson(lesson_id: int, request: Request):
     """
     Get detailed information about a specific lesson including its content
-    Returns lesson with Markdown content
+    Returns lesson with Markdown content (serialized and compressed once per corpus version, ETag)
     """
     lesson = context_service.get_lesson(lesson_id)
 
@@ -274,27 +362,130 @@ async def get_lesson(lesson_id: int):
             detail=f"Lesson with ID {lesson_id} not found"
         )
 
-    return LessonDetailResponse(
-        id=lesson["id"],
-        title=lesson["title"],
-        filename=lesson["filename"],
-        content=lesson["content"],
-        course=lesson.get("course"),
-        module=lesson.get("module"),
-        category=lesson.get("category")
+    def build() -> bytes:
+        return LessonDetailResponse(
+            id=lesson.id,
+            title=lesson.title,
+            filename=lesson.filename,
+            content=lesson.content,
+            course=lesson.course,
+            module=lesson.module,
+            category=lesson.category
+        ).model_dump_json().encode("utf-8")
+
+    return await _prepared_response(request, ("lesson", lesson_id), context_service.corpus_version, build)
+
+
+def _get_lesson_or_404(lesson_id: int) -> LessonRecord:
+    lesson = context_service.get_lesson(lesson_id)
+    if not lesson:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Lesson with ID {lesson_id} not found"
+        )
+    return lesson
+
+
+def _get_section_or_404(lesson_id: int, section_id: str) -> Section:
+    section = context_service.get_section(lesson_id, section_id)
+    if section is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Section '{section_id}' not found in lesson {lesson_id}"
+        )
+    return section
+
+
+@app.get("/lessons/{lesson_id}/toc", response_model=LessonTocResponse, tags=["Lessons"])
+async def get_lesson_toc(lesson_id: int, request: Request):
+    """
+    Get the table of contents of a lesson
+    Returns the heading tree (section IDs, levels, parents) with byte offsets, without content
+    """
+    lesson = _get_lesson_or_404(lesson_id)
+
+    def build() -> bytes:
+        return LessonTocResponse(
+            id=lesson.id,
+            title=lesson.title,
+            size=lesson.size_bytes,
+            sections=[LessonSection.model_validate(section, from_attributes=True) for section in lesson.sections]
+        ).model_dump_json().encode("utf-8")
+
+    return await _prepared_response(request, ("lesson_toc", lesson_id), context_service.corpus_version, build)
+
+
+@app.get("/lessons/{lesson_id}/sections/{section_id}", response_model=LessonSectionResponse, tags=["Lessons"])
+async def get_lesson_section(
+    lesson_id: int,
+    section_id: str,
+    request: Request,
+    subsections: bool = Query(default=True, description="Include nested sections (False = up to the next heading)")
+):
+    """
+    Get a single section of a lesson
+    Returns the section Markdown from its heading to its end
+    """
+    lesson = _get_lesson_or_404(lesson_id)
+    section = _get_section_or_404(lesson_id, section_id)
+
+    def build() -> bytes:
+        end = section.end if subsections else section.body_end
+        return LessonSectionResponse(
+            lesson_id=lesson_id,
+            section=LessonSection.model_validate(section, from_attributes=True),
+            path=context_service.get_section_path(lesson, section),
+            content=lesson.text(section.start, end)
+        ).model_dump_json().encode("utf-8")
+
+    return await _prepared_response(
+        request, ("lesson_section", lesson_id, section_id, subsections), context_service.corpus_version, build
+    )
+
+
+@app.get("/lessons/{lesson_id}/range", response_model=LessonRangeResponse, tags=["Lessons"])
+async def get_lesson_range(
+    lesson_id: int,
+    request: Request,
+    start: int = Query(default=0, ge=0, description="First byte (UTF-8 offset)"),
+    end: Optional[int] = Query(default=None, ge=0, description="Byte after the last one (None = end of lesson)"),
+    from_section: Optional[str] = Query(default=None, description="Start at this section (overrides start)"),
+    to_section: Optional[str] = Query(default=None, description="End with this section, subsections included (overrides end)"),
+    max_bytes: int = Query(default=65536, ge=1024, le=1048576, description="Page size; cut at a line break")
+):
+    """
+    Get part of a lesson by byte or section range, paginated
+    Follow next_start until it is null to read a long range page by page
+    """
+    _get_lesson_or_404(lesson_id)
+    if from_section is not None:
+        start = _get_section_or_404(lesson_id, from_section).start
+    if to_section is not None:
+        end = _get_section_or_404(lesson_id, to_section).end
+
+    def build() -> bytes:
+        part = context_service.get_lesson_range(lesson_id, start, end, max_bytes)
+        return LessonRangeResponse(lesson_id=lesson_id, **part).model_dump_json().encode("utf-8")
+
+    return await _prepared_response(
+        request, ("lesson_range", lesson_id, start, end, max_bytes), context_service.corpus_version, build
     )
 
 
 @app.get("/models", response_model=ModelsListResponse, tags=["Models"])
-async def get_models():
+async def get_models(request: Request):
     """
     Get list of available AI models
-    Returns model IDs, names, descriptions, and context lengths
+    Returns model IDs, names, descriptions, and context lengths (serialized once, ETag)
     """
-    return ModelsListResponse(
-        models=[ModelInfo(**model) for model in config.AVAILABLE_MODELS],
-        default_model=config.DEFAULT_MODEL
-    )
+    def build() -> bytes:
+        return ModelsListResponse(
+            models=[ModelInfo(**model) for model in config.AVAILABLE_MODELS],
+            default_model=config.DEFAULT_MODEL
+        ).model_dump_json().encode("utf-8")
+
+    # The model list only changes with the configuration (restart)
+    return await _prepared_response(request, ("models",), 0, build)
 
 
 @app.post("/context/preview", response_model=ContextPreviewResponse, tags=["Context"])
@@ -304,8 +495,13 @@ async def preview_context(request: ContextPreviewRequest):
     Useful for showing users impact of their lesson selection
     """
     try:
-        # Estimate tokens
-        estimated_tokens = context_service.estimate_tokens(request.lesson_ids)
+        models_by_id = {m["id"]: m for m in config.AVAILABLE_MODELS}
+        model_id = request.model if request.model in models_by_id else config.DEFAULT_MODEL
+        model_config = models_by_id.get(model_id, {})
+
+        # Estimate tokens from precomputed per-lesson counts
+        estimated_tokens = context_service.estimate_tokens(request.lesson_ids, model=model_id)
+        context_chars = context_service.estimate_context_chars(request.lesson_ids)
 
         # Get lesson count
         if request.lesson_ids:
@@ -315,10 +511,9 @@ async def preview_context(request: ContextPreviewRequest):
             lesson_count = context_service.get_total_lessons()
             lessons = ["All available lessons"]
 
-        # Calculate estimated cost (using default model pricing as baseline)
-        # Using Gemini Flash 2.5 Preview: $0.075/1M input, $0.30/1M output
-        input_cost_per_1m = 0.075
-        output_cost_per_1m = 0.30
+        # Calculate estimated cost with the selected model's pricing
+        input_cost_per_1m = model_config.get("input_cost_per_1m", 0.075)
+        output_cost_per_1m = model_config.get("output_cost_per_1m", 0.30)
 
         estimated_cost_input = (estimated_tokens / 1_000_000) * input_cost_per_1m
         estimated_cost_output = (estimated_tokens / 1_000_000) * output_cost_per_1m
@@ -326,6 +521,8 @@ async def preview_context(request: ContextPreviewRequest):
         return ContextPreviewResponse(
             lesson_count=lesson_count,
             estimated_tokens=estimated_tokens,
+            context_chars=context_chars,
+            model=model_id,
             estimated_cost_input=estimated_cost_input,
             estimated_cost_output=estimated_cost_output,
             lessons=lessons
@@ -339,6 +536,168 @@ async def preview_context(request: ContextPreviewRequest):
         )
 
 
+def _context_token_budget(request: ChatRequest, history: list[dict]) -> Optional[int]:
+    """
+    Tokens available for lesson context in the selected model's window
+
+    The window (minus a safety margin) has to hold the system prompt
+    template, conversation history, the message with its images and the
+    reserved output (max_tokens).
+
+    Returns:
+        Token budget, or None if the model declares no context_length
+    """
+    model_id = request.model or config.DEFAULT_MODEL
+    model_config = next((m for m in config.AVAILABLE_MODELS if m["id"] == model_id), None)
+    if not model_config or not model_config.get("context_length"):
+        return None
+
+    tokenizer = get_tokenizer(model_id)
+    images = len(request.images or []) + sum(len(msg["images"]) for msg in history)
+    reserved = (
+        model_config.get("max_tokens", 4000)
+        + openrouter_service.prompt_loader.count_template_tokens(tokenizer)
+        + tokenizer.count(request.message)
+        + sum(tokenizer.count(msg["content"]) for msg in history)
+        + images * config.IMAGE_TOKEN_ESTIMATE
+    )
+    window = int(model_config["context_length"] * (1 - config.CONTEXT_SAFETY_MARGIN))
+    return max(0, window - reserved)
+
+
+async def _load_history(request: ChatRequest) -> list[dict]:
+    """
+    Get service-level history from the request's session or its conversation_history
+
+    Raises:
+        HTTPException: 404 if the session is unknown or expired
+    """
+    if request.session_id:
+        history = await session_store.aget_messages(request.session_id)
+        if history is None:
+            raise HTTPException(status_code=404, detail=f"Session not found or expired: {request.session_id}")
+        return history
+
+    # Convert Pydantic models to dicts for the service
+    return [
+        {
+            "role": msg.role,
+            "content": msg.content,
+            "images": msg.images if msg.images else []
+        }
+        for msg in request.conversation_history
+    ]
+
+
+def _store_session_images(images: list[str]) -> list[str]:
+    """Store inline data URLs in the image store and return img:<sha256> references"""
+    refs = []
+    for image in images:
+        try:
+            refs.append(image_store.store(image)["ref"])
+        except ValueError as e:
+            logger.warning(f"Image not kept in session history: {e}")
+    return refs
+
+
+async def _record_turn(request: ChatRequest, response: str) -> None:
+    """Append the user message and the assistant response to the request's session"""
+    if not request.session_id:
+        return
+    # Sessions keep short references instead of base64 payloads
+    images = await asyncio.to_thread(_store_session_images, request.images) if request.images else []
+    await session_store.aappend(request.session_id, [
+        {"role": "user", "content": request.message, "images": images},
+        {"role": "assistant", "content": response, "images": []}
+    ])
+
+
+async def _prepare_chat(request: ChatRequest) -> tuple[str, list[str], list[dict], dict]:
+    """
+    Build context, lessons_used and service-level history for a chat request
+
+    Returns:
+        (context, lessons_used, history, packing) where packing holds the
+        titles of lessons truncated/dropped to fit the model's context window
+        and the number of history messages replaced by a summary
+    """
+    context_mode = request.context_mode or config.CONTEXT_MODE
+    model_id = request.model or config.DEFAULT_MODEL
+
+    history = await _load_history(request)
+
+    # Keep recent turns verbatim, condense older ones (and drop their images)
+    model_config = next((m for m in config.AVAILABLE_MODELS if m["id"] == model_id), {})
+    history, history_summarized = history_compactor.compact(
+        history,
+        token_budget=model_config.get("history_token_budget", config.HISTORY_TOKEN_BUDGET),
+        tokenizer=get_tokenizer(model_id)
+    )
+    # Image references are loaded only for the messages actually sent
+    history = [
+        {**msg, "images": await _resolve_images(msg["images"])} if msg["images"] else msg
+        for msg in history
+    ]
+
+    token_budget = _context_token_budget(request, history)
+    packing = {"lessons_truncated": [], "lessons_dropped": [], "history_summarized": history_summarized}
+
+    if request.section_ids:
+        # Pinned sections (plus whole lessons from lesson_ids), fitted into the context window
+        try:
+            context, used_ids, truncated_ids, dropped = context_service.pack_sections(
+                request.section_ids,
+                request.lesson_ids,
+                token_budget=token_budget,
+                model=model_id
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        lessons_used = context_service.get_lesson_titles(used_ids)
+        packing["lessons_truncated"] = context_service.get_lesson_titles(truncated_ids)
+        packing["lessons_dropped"] = dropped
+    elif context_mode in ("lexical", "semantic"):
+        # Only the chunks most relevant to the question, within the token budget
+        retrieval_budget = config.RETRIEVAL_TOKEN_BUDGET
+        if token_budget is not None:
+            retrieval_budget = min(retrieval_budget, token_budget)
+        context, used_ids = context_service.build_query_context(
+            request.message,
+            request.lesson_ids,
+            top_k=config.RETRIEVAL_TOP_K,
+            token_budget=retrieval_budget,
+            model=model_id,
+            mode=context_mode
+        )
+        lessons_used = context_service.get_lesson_titles(used_ids)
+    else:
+        # Build context from lessons, fitted into the model's context window
+        context, used_ids, truncated_ids, dropped_ids = context_service.pack_context(
+            request.lesson_ids,
+            token_budget=token_budget,
+            model=model_id,
+            query=request.message
+        )
+
+        # Determine which lessons were used
+        if dropped_ids:
+            lessons_used = context_service.get_lesson_titles(used_ids)
+        elif request.lesson_ids:
+            lessons_used = context_service.get_lesson_titles(request.lesson_ids)
+        else:
+            # All lessons
+            lessons_used = ["All available lessons"]
+        packing["lessons_truncated"] = context_service.get_lesson_titles(truncated_ids)
+        packing["lessons_dropped"] = context_service.get_lesson_titles(dropped_ids)
+
+    return context, lessons_used, history, packing
+
+
+def _sse_event(event: str, data: str) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
 @app.post("/chat", response_model=ChatResponse, tags=["Chat"])
 async def chat(request: ChatRequest):
     """
@@ -350,25 +709,7 @@ async def chat(request: ChatRequest):
         logger.info(f"Chat request: message length={len(request.message)}, "
                    f"lessons={request.lesson_ids}, model={request.model}")
 
-        # Build context from lessons
-        context = context_service.build_context(request.lesson_ids)
-
-        # Determine which lessons were used
-        if request.lesson_ids:
-            lessons_used = context_service.get_lesson_titles(request.lesson_ids)
-        else:
-            # All lessons
-            lessons_used = ["All available lessons"]
-
-        # Convert Pydantic models to dicts for the service
-        history = [
-            {
-                "role": msg.role,
-                "content": msg.content,
-                "images": msg.images if msg.images else []
-            }
-            for msg in request.conversation_history
-        ]
+        context, lessons_used, history, packing = await _prepare_chat(request)
 
         # Send to OpenRouter
         result = await openrouter_service.chat(
@@ -376,8 +717,9 @@ async def chat(request: ChatRequest):
             context=context,
             history=history,
             model=request.model,
-            images=request.images
+            images=await _resolve_images(request.images)
         )
+        await _record_turn(request, result["response"])
 
         # Build response with tokens and cost info
         tokens_data = result.get("tokens_used")
@@ -389,9 +731,14 @@ async def chat(request: ChatRequest):
             lessons_used=lessons_used,
             tokens_used=TokensUsage(**tokens_data) if tokens_data else None,
             cost=CostInfo(**cost_data) if cost_data else None,
-            context_length=result.get("context_length")
+            context_length=result.get("context_length"),
+            cached=result.get("cached", False),
+            session_id=request.session_id,
+            **packing
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat error: {e}", exc_info=True)
         raise HTTPException(
@@ -400,6 +747,190 @@ async def chat(request: ChatRequest):
         )
 
 
+@app.post("/chat/stream", tags=["Chat"])
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Relays tokens as they arrive:
+    - event: delta  data: {"content": "..."}
+    - event: done   data: ChatStreamEnd (model, lessons, tokens, cost)
+    - event: error  data: {"detail": "..."}
+    """
+    try:
+        logger.info(f"Chat stream request: message length={len(request.message)}, "
+                   f"lessons={request.lesson_ids}, model={request.model}")
+        context, lessons_used, history, packing = await _prepare_chat(request)
+        images = await _resolve_images(request.images)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing chat request: {str(e)}"
+        )
+
+    async def event_stream():
+        parts: list[str] = []
+        try:
+            async for event in openrouter_service.chat_stream(
+                message=request.message,
+                context=context,
+                history=history,
+                model=request.model,
+                images=images
+            ):
+                if event["type"] == "delta":
+                    parts.append(event["content"])
+                    yield _sse_event("delta", json.dumps({"content": event["content"]}, ensure_ascii=False))
+                elif event["type"] == "done":
+                    await _record_turn(request, "".join(parts))
+                    tokens_data = event.get("tokens_used")
+                    cost_data = event.get("cost")
+                    end = ChatStreamEnd(
+                        model_used=event["model_used"],
+                        lessons_used=lessons_used,
+                        tokens_used=TokensUsage(**tokens_data) if tokens_data else None,
+                        cost=CostInfo(**cost_data) if cost_data else None,
+                        context_length=event.get("context_length"),
+                        cached=event.get("cached", False),
+                        session_id=request.session_id,
+                        **packing
+                    )
+                    yield _sse_event("done", end.model_dump_json())
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}", exc_info=True)
+            yield _sse_event("error", json.dumps({"detail": f"Error processing chat request: {str(e)}"}))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ---------------------------
+# Images API
+# ---------------------------
+
+@app.post("/images", response_model=ImageUploadResponse, tags=["Images"])
+async def upload_images(request: ImageUploadRequest):
+    """
+    Store images once by content hash
+    Returns img:<sha256> references usable in /chat, sessions and /artifacts instead of inline base64
+    """
+    stored: list[StoredImage] = []
+    for idx, data_url in enumerate(request.images, start=1):
+        try:
+            # Decoding and writing large images would block the event loop
+            info = await asyncio.to_thread(image_store.put_data_url, data_url)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"Image {idx}: {e}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Image {idx}: {e}")
+        stored.append(_stored_image(info))
+    return ImageUploadResponse(images=stored)
+
+
+@app.post("/images/upload", response_model=StoredImage, tags=["Images"])
+async def upload_image_stream(request: Request):
+    """
+    Store one image sent as the raw request body (Content-Type: image/png, image/jpeg, ...)
+    The body is written to disk while it arrives, so memory use does not grow with image size.
+    Use the returned reference in POST /artifacts (or /chat) instead of a base64 data URL.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > image_store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {image_store.max_bytes} bytes")
+    try:
+        info = await image_store.put_stream(request.stream())
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    return _stored_image(info)
+
+
+def _stored_image(info: dict) -> StoredImage:
+    return StoredImage(
+        ref=info["ref"],
+        mime=info["mime"],
+        size=info["size"],
+        url=f"/images/{info['hash']}"
+    )
+
+
+@app.get("/images/{image_hash}", tags=["Images"])
+async def get_image(image_hash: str):
+    """
+    Get a stored image by its SHA-256 digest
+    """
+    path = image_store.get_path(image_hash)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Content-addressed: the bytes behind a digest never change
+    return FileResponse(
+        path,
+        media_type=image_store.get_mime(image_hash),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+# ---------------------------
+# Sessions API
+# ---------------------------
+
+@app.post("/sessions", response_model=SessionResponse, tags=["Sessions"])
+async def create_session():
+    """
+    Create a server-side conversation session
+    Send its session_id with /chat or /chat/stream instead of conversation_history
+    """
+    return SessionResponse(session_id=await session_store.acreate(), messages=[])
+
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse, tags=["Sessions"])
+async def get_session(session_id: str):
+    """
+    Get the stored conversation of a session
+    """
+    messages = await session_store.aget_messages(session_id)
+    if messages is None:
+        raise HTTPException(status_code=404, detail=f"Session not found or expired: {session_id}")
+    return SessionResponse(
+        session_id=session_id,
+        messages=[
+            ChatMessage(role=msg["role"], content=msg["content"], images=msg["images"] or None)
+            for msg in messages
+        ]
+    )
+
+
+@app.delete("/sessions/{session_id}", tags=["Sessions"])
+async def delete_session(session_id: str):
+    """
+    Delete a session and its stored history
+    """
+    if not await session_store.adelete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found or expired: {session_id}")
+    return {"status": "deleted", "session_id": session_id}
+
+
+@app.get("/search", response_model=SearchResponse, tags=["Search"])
+async def search(
+    q: str = Query(..., min_length=1, max_length=500, description="Search text"),
+    kind: Optional[Literal["lesson", "artifact"]] = Query(default=None, description="Only lessons or only artifacts"),
+    lesson_ids: Optional[List[int]] = Query(default=None, description="Restrict lesson hits to these lessons"),
+    limit: int = Query(default=10, ge=1, le=50)
+):
+    """
+    Full-text search over lessons and artifacts
+    Returns ranked sections with a highlighted snippet and heading anchor instead of whole documents
+    """
+    hits = search_service.search(q, kind=kind, lesson_ids=lesson_ids, limit=limit)
+    return SearchResponse(query=q, hits=[SearchHit(**hit) for hit in hits])
+
+
 # ---------------------------
 # Artifacts API
 # ---------------------------
@@ -411,171 +942,90 @@ async def create_artifact(request: CreateArtifactRequest):
     - type=markdown: saves .md with frontmatter + body
     - type=code: saves .md with description and .html with code
     - type=images: saves images to assets/ and records paths
+      (large images: upload via POST /images/upload and pass the img:<sha256> refs)
     """
     try:
-        now_iso = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-        artifact_id = _generate_artifact_id()
-
-        saved_images: list[str] = []
-        if request.type == "images" and request.images:
-            saved_images = _save_images(request.images, artifact_id)
-
-        # Prepare meta
-        meta = {
-            "id": artifact_id,
-            "title": request.title,
-            "type": request.type,
-            "source": (request.source or ""),
-            "tags": request.tags or [],
-            "created_at": now_iso,
-            "updated_at": now_iso
-        }
-
-        # Build body and write files
-        body = ""
-        html_path = None
-        if request.type == "markdown":
-            body = request.content_markdown or ""
-        elif request.type == "code":
-            # Put optional description into body
-            body = (request.content_markdown or "Code artifact")
-            # Save HTML for execution/preview
-            if request.html:
-                html_path = os.path.join(ARTIFACTS_DIR, f"{artifact_id}.html")
-                with open(html_path, "w", encoding="utf-8") as f:
-                    f.write(request.html)
-        elif request.type == "images":
-            if saved_images:
-                lines = ["# Images", ""]
-                for rel in saved_images:
-                    lines.append(f"![image]({rel})")
-                body = "\n".join(lines)
-            else:
-                body = request.content_markdown or "Images artifact"
-
-        _write_markdown_file(artifact_id, meta, body)
-
-        return Artifact(
-            id=artifact_id,
-            title=request.title,
-            type=request.type,
-            content_markdown=body if request.type in ("markdown", "code") else None,
-            html=request.html if request.type == "code" else None,
-            images=saved_images if request.type == "images" else None,
-            source=request.source,
-            tags=request.tags or [],
-            created_at=now_iso,
-            updated_at=now_iso
-        )
+        async with artifact_write_lock:
+            artifact = await artifact_store.create(
+                title=request.title,
+                type=request.type,
+                content_markdown=request.content_markdown,
+                html=request.html,
+                images=request.images,
+                source=request.source,
+                tags=request.tags
+            )
+            search_service.index_artifact(artifact["id"], artifact["title"], artifact["content_markdown"] or "")
+        return Artifact(**artifact)
     except Exception as e:
         logger.error(f"Error creating artifact: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to create artifact")
 
 
 @app.get("/artifacts", response_model=ArtifactListResponse, tags=["Artifacts"])
-async def list_artifacts():
+async def list_artifacts(
+    type: Optional[ArtifactType] = Query(default=None, description="Only artifacts of this type"),
+    tag: Optional[List[str]] = Query(default=None, description="Only artifacts having all of these tags"),
+    source: Optional[str] = Query(default=None, description="Only artifacts with this source"),
+    sort: Literal["created_at", "updated_at", "title"] = Query(default="created_at"),
+    order: Literal["asc", "desc"] = Query(default="asc"),
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0)
+):
     """
-    List artifacts by reading docs/artifacts/*.md (excluding specs/help docs)
+    List artifacts from the metadata index (files are only read when new ones appear in docs/artifacts)
     """
     try:
-        if not os.path.exists(ARTIFACTS_DIR):
-            return ArtifactListResponse(items=[])
-        items: list[ArtifactMeta] = []
-        for name in sorted(os.listdir(ARTIFACTS_DIR)):
-            if not name.endswith(".md"):
-                continue
-            if name in ("ARTIFACTS_SPEC.md", "artifacts.md"):
-                continue
-            md_path = os.path.join(ARTIFACTS_DIR, name)
-            with open(md_path, "r", encoding="utf-8") as f:
-                text = f.read()
-            meta, _ = _parse_frontmatter(text)
-            if not meta:
-                # fallback: derive id from filename
-                art_id = name[:-3]
-                items.append(ArtifactMeta(
-                    id=art_id,
-                    title=art_id,
-                    type="markdown",
-                    created_at="",
-                    updated_at="",
-                    tags=None
-                ))
-                continue
-            items.append(ArtifactMeta(
-                id=str(meta.get("id", name[:-3])),
-                title=str(meta.get("title", name[:-3])),
-                type=str(meta.get("type", "markdown")),  # type: ignore
-                created_at=str(meta.get("created_at", "")),
-                updated_at=str(meta.get("updated_at", "")),
-                tags=meta.get("tags") if isinstance(meta.get("tags"), list) else None
-            ))
-        return ArtifactListResponse(items=items)
+        rows, total = await artifact_store.list(
+            type=type,
+            tags=tag,
+            source=source,
+            sort=sort,
+            descending=order == "desc",
+            limit=limit,
+            offset=offset
+        )
+        return ArtifactListResponse(
+            items=[ArtifactMeta(**row) for row in rows],
+            total=total,
+            limit=limit,
+            offset=offset
+        )
     except Exception as e:
         logger.error(f"Error listing artifacts: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to list artifacts")
 
 
+@app.post("/artifacts/reindex", tags=["Artifacts"])
+async def reindex_artifacts():
+    """
+    Rebuild the artifact index from docs/artifacts (e.g. after editing files by hand)
+    """
+    try:
+        # Artifacts created meanwhile wait, otherwise the swapped-in search index would miss them
+        async with artifact_write_lock:
+            result = await artifact_store.reindex()
+            await asyncio.to_thread(search_service.load_artifacts, await artifact_store.read_documents())
+        return {"status": "ok", "indexed": result["added"]}
+    except Exception as e:
+        logger.error(f"Error rebuilding artifact index: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to rebuild artifact index")
+
+
 @app.get("/artifacts/{artifact_id}", response_model=Artifact, tags=["Artifacts"])
 async def get_artifact(artifact_id: str):
     """
     Read a single artifact by id from docs/artifacts
     """
     try:
-        md_path = os.path.join(ARTIFACTS_DIR, f"{artifact_id}.md")
-        if not os.path.exists(md_path):
-            raise HTTPException(status_code=404, detail="Artifact not found")
-        with open(md_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        meta, body = _parse_frontmatter(text)
-
-        # Load optional HTML for code type
-        html_content = None
-        if meta.get("type") == "code":
-            html_file = os.path.join(ARTIFACTS_DIR, f"{artifact_id}.html")
-            if os.path.exists(html_file):
-                with open(html_file, "r", encoding="utf-8") as hf:
-                    html_content = hf.read()
-
-        # Collect images by file prefix
-        images_list: list[str] = []
-        if meta.get("type") == "images" and os.path.exists(ASSETS_DIR):
-            for name in sorted(os.listdir(ASSETS_DIR)):
-                if name.startswith(f"{artifact_id}-"):
-                    images_list.append(f"assets/{name}")
-
-        # Build config for react-component type
-        config_dict = None
-        if meta.get("type") == "react-component":
-            config_dict = {
-                "type": "react-component",
-                "id": meta.get("componentId", artifact_id),
-                "props": {
-                    "title": meta.get("propsTitle"),
-                    "message": meta.get("propsMessage"),
-                    "timestamp": int(meta.get("propsTimestamp", 0)) if meta.get("propsTimestamp") else None
-                }
-            }
-
-        return Artifact(
-            id=str(meta.get("id", artifact_id)),
-            title=str(meta.get("title", artifact_id)),
-            type=str(meta.get("type", "markdown")),  # type: ignore
-            content_markdown=body if meta.get("type") in ("markdown", "code", "react-component") else None,
-            html=html_content if meta.get("type") == "code" else None,
-            images=images_list if meta.get("type") == "images" else None,
-            config=config_dict,
-            source=meta.get("source"),
-            tags=meta.get("tags") if isinstance(meta.get("tags"), list) else None,
-            created_at=str(meta.get("created_at", "")),
-            updated_at=str(meta.get("updated_at", ""))
-        )
-    except HTTPException:
-        raise
+        artifact = await artifact_store.get(artifact_id)
     except Exception as e:
         logger.error(f"Error reading artifact {artifact_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to read artifact")
-        
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return Artifact(**artifact)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -9,7 +9,7 @@ class ChatMessage(BaseModel):
     """Single message in conversation"""
     role: str = Field(..., description="Role: 'user' or 'assistant'")
     content: str = Field(..., description="Message content")
-    images: Optional[List[str]] = Field(default=None, description="Base64 encoded images")
+    images: Optional[List[str]] = Field(default=None, description="Base64 encoded images or image references (img:<sha256>)")
 
 
 class ChatRequest(BaseModel):
@@ -19,17 +19,35 @@ class ChatRequest(BaseModel):
         default=None,
         description="List of lesson IDs to include in context. None = all lessons"
     )
+    context_mode: Optional[Literal["lessons", "lexical", "semantic"]] = Field(
+        default=None,
+        description=(
+            "'lessons' = full selected lessons, 'lexical'/'semantic' = most relevant chunks only "
+            "(keyword or embedding search). None = server default"
+        )
+    )
     model: Optional[str] = Field(
         default=None,
         description="Model to use (e.g., 'anthropic/claude-3.5-sonnet'). None = default model"
     )
     conversation_history: Optional[List[ChatMessage]] = Field(
         default_factory=list,
-        description="Previous messages in conversation"
+        description="Previous messages in conversation (ignored when session_id is set)"
     )
     images: Optional[List[str]] = Field(
         default=None,
-        description="Base64 encoded images (data:image/jpeg;base64,...)"
+        description="Base64 encoded images (data:image/jpeg;base64,...) or references from POST /images (img:<sha256>)"
+    )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Server-side session (POST /sessions); its stored history is used and this turn is appended"
+    )
+    section_ids: Optional[List[str]] = Field(
+        default=None,
+        description=(
+            "Pinned lesson sections ('<lesson_id>#<section_id>', see /lessons/{id}/toc). When set, the context "
+            "is these sections plus the lessons in lesson_ids (whole), instead of all lessons"
+        )
     )
 
 
@@ -38,6 +56,7 @@ class TokensUsage(BaseModel):
     input: int = Field(..., description="Input tokens (prompt)")
     output: int = Field(..., description="Output tokens (completion)")
     total: int = Field(..., description="Total tokens")
+    cached: int = Field(default=0, description="Input tokens served from the provider's prompt cache")
 
 
 class CostInfo(BaseModel):
@@ -54,6 +73,49 @@ class ChatResponse(BaseModel):
     tokens_used: Optional[TokensUsage] = Field(default=None, description="Token usage breakdown")
     cost: Optional[CostInfo] = Field(default=None, description="Cost information")
     context_length: Optional[int] = Field(default=None, description="Length of context in characters")
+    lessons_truncated: List[str] = Field(default_factory=list, description="Lessons cut at a section boundary to fit the model's context window")
+    lessons_dropped: List[str] = Field(default_factory=list, description="Selected lessons left out to fit the model's context window")
+    history_summarized: int = Field(default=0, description="Older history messages sent as a summary instead of verbatim")
+    session_id: Optional[str] = Field(default=None, description="Session the turn was appended to")
+    cached: bool = Field(default=False, description="Served from the response cache (no upstream cost)")
+
+
+class ChatStreamEnd(BaseModel):
+    """Final 'done' event of the /chat/stream endpoint (ChatResponse metadata without the text)"""
+    model_used: str = Field(..., description="Which model was used")
+    lessons_used: List[str] = Field(..., description="Titles of lessons included in context")
+    tokens_used: Optional[TokensUsage] = Field(default=None, description="Token usage breakdown")
+    cost: Optional[CostInfo] = Field(default=None, description="Cost information")
+    context_length: Optional[int] = Field(default=None, description="Length of context in characters")
+    lessons_truncated: List[str] = Field(default_factory=list, description="Lessons cut at a section boundary to fit the model's context window")
+    lessons_dropped: List[str] = Field(default_factory=list, description="Selected lessons left out to fit the model's context window")
+    history_summarized: int = Field(default=0, description="Older history messages sent as a summary instead of verbatim")
+    session_id: Optional[str] = Field(default=None, description="Session the turn was appended to")
+    cached: bool = Field(default=False, description="Served from the response cache (no upstream cost)")
+
+
+class SessionResponse(BaseModel):
+    """Response model for /sessions endpoints"""
+    session_id: str = Field(..., description="Session ID")
+    messages: List[ChatMessage] = Field(default_factory=list, description="Stored conversation, oldest first")
+
+
+class ImageUploadRequest(BaseModel):
+    """Request model for POST /images"""
+    images: List[str] = Field(..., description="Base64 encoded images (data:image/png;base64,...)", min_length=1)
+
+
+class StoredImage(BaseModel):
+    """Image stored by content hash"""
+    ref: str = Field(..., description="Reference accepted by /chat and /artifacts (img:<sha256>)")
+    mime: str = Field(..., description="MIME type detected from the file content")
+    size: int = Field(..., description="Size in bytes")
+    url: str = Field(..., description="Path to fetch the image")
+
+
+class ImageUploadResponse(BaseModel):
+    """Response model for POST /images"""
+    images: List[StoredImage] = Field(..., description="Stored images, in request order")
 
 
 class LessonInfo(BaseModel):
@@ -82,6 +144,43 @@ class LessonDetailResponse(BaseModel):
     category: Optional[str] = Field(default=None, description="Lesson category")
 
 
+class LessonSection(BaseModel):
+    """One heading of a lesson's table of contents"""
+    id: str = Field(..., description="Section ID (heading anchor slug, unique within the lesson)")
+    title: str = Field(..., description="Heading text")
+    level: int = Field(..., description="Heading level (1-6)")
+    parent: Optional[str] = Field(default=None, description="ID of the enclosing section")
+    start: int = Field(..., description="Byte offset of the heading line (UTF-8)")
+    end: int = Field(..., description="Byte offset where the section ends, subsections included")
+    body_end: int = Field(..., description="Byte offset of the next heading (end without subsections)")
+
+
+class LessonTocResponse(BaseModel):
+    """Response model for /lessons/:id/toc endpoint"""
+    id: int = Field(..., description="Lesson ID")
+    title: str = Field(..., description="Lesson title")
+    size: int = Field(..., description="Content size in bytes (UTF-8)")
+    sections: List[LessonSection] = Field(..., description="Headings in document order")
+
+
+class LessonSectionResponse(BaseModel):
+    """Response model for /lessons/:id/sections/:section_id endpoint"""
+    lesson_id: int = Field(..., description="Lesson ID")
+    section: LessonSection = Field(..., description="Section position in the lesson")
+    path: str = Field(..., description="Heading path (' > '-joined)")
+    content: str = Field(..., description="Section Markdown, heading line included")
+
+
+class LessonRangeResponse(BaseModel):
+    """Response model for /lessons/:id/range endpoint"""
+    lesson_id: int = Field(..., description="Lesson ID")
+    start: int = Field(..., description="Byte offset of the returned content")
+    end: int = Field(..., description="Byte offset just after the returned content")
+    size: int = Field(..., description="Content size of the whole lesson in bytes")
+    content: str = Field(..., description="Markdown between start and end")
+    next_start: Optional[int] = Field(default=None, description="Start of the next page (None = range complete)")
+
+
 class ModelInfo(BaseModel):
     """Information about available AI model"""
     id: str = Field(..., description="Model identifier")
@@ -90,6 +189,7 @@ class ModelInfo(BaseModel):
     context_length: int = Field(..., description="Maximum context length")
     context_display: str = Field(..., description="Human-readable context size (e.g., '1M', '2M')")
     input_cost_per_1m: float = Field(..., description="Cost per 1M input tokens in USD")
+    cached_input_cost_per_1m: Optional[float] = Field(default=None, description="Cost per 1M cached input tokens in USD")
     output_cost_per_1m: float = Field(..., description="Cost per 1M output tokens in USD")
 
 
@@ -104,6 +204,73 @@ class HealthResponse(BaseModel):
     status: str = Field(..., description="Service status")
     version: str = Field(default="1.0.0", description="API version")
     lessons_loaded: int = Field(..., description="Number of lessons loaded")
+    corpus_version: int = Field(..., description="Lesson corpus version (incremented on every reload)")
+
+
+class CacheStats(BaseModel):
+    """Hit/miss counters for an in-memory cache"""
+    hits: int = Field(..., description="Number of cache hits")
+    misses: int = Field(..., description="Number of cache misses")
+    size: int = Field(..., description="Current number of cached entries")
+    max_size: int = Field(..., description="Maximum number of cached entries")
+    corpus_version: Optional[int] = Field(default=None, description="Lesson corpus version the cache belongs to")
+
+
+class UpstreamHttpStats(BaseModel):
+    """Connection pool metrics for upstream (OpenRouter) requests"""
+    requests: int = Field(..., description="Number of upstream requests sent")
+    new_connections: int = Field(..., description="Requests that opened a new TCP/TLS connection")
+    reused_connections: int = Field(..., description="Requests served over a pooled keep-alive connection")
+    connect_time_ms_total: float = Field(..., description="Total connection setup time in milliseconds")
+    last_connect_time_ms: float = Field(..., description="Setup time of the most recent new connection")
+    avg_connect_time_ms: float = Field(..., description="Average connection setup time per request")
+    http2: bool = Field(..., description="Whether HTTP/2 is enabled")
+
+
+class ResponseCacheStats(BaseModel):
+    """Effectiveness counters for the chat response cache"""
+    backend: str = Field(..., description="Storage backend (memory or sqlite)")
+    hits: int = Field(..., description="Requests answered from the cache")
+    misses: int = Field(..., description="Cacheable requests sent upstream")
+    bypassed: int = Field(..., description="Requests not eligible for caching (images or history)")
+    size: int = Field(..., description="Current number of cached responses")
+    max_size: int = Field(..., description="Maximum number of cached responses")
+    saved_tokens: int = Field(..., description="Upstream tokens avoided by cache hits")
+    saved_cost_usd: float = Field(..., description="Upstream cost avoided by cache hits in USD")
+
+
+class SingleFlightStats(BaseModel):
+    """Request coalescing counters for upstream chat calls"""
+    leaders: int = Field(..., description="Upstream calls made")
+    coalesced: int = Field(..., description="Requests that joined an identical in-flight call")
+    in_flight: int = Field(..., description="Shared calls currently in progress")
+
+
+class SessionStats(BaseModel):
+    """Server-side conversation session storage counters"""
+    backend: str = Field(..., description="Storage backend (memory or sqlite)")
+    sessions: int = Field(..., description="Live sessions")
+    max_sessions: int = Field(..., description="Maximum number of live sessions")
+
+
+class EventLoopStats(BaseModel):
+    """Event-loop lag (delay of scheduled callbacks; blocking calls show up here)"""
+    interval_ms: float = Field(..., description="Probe interval")
+    samples: int = Field(..., description="Samples in the recent window")
+    mean_ms: float = Field(..., description="Mean lag over the recent window")
+    p99_ms: float = Field(..., description="99th percentile lag over the recent window")
+    max_ms: float = Field(..., description="Maximum lag since startup")
+    stalls: int = Field(..., description="Probes delayed beyond the stall threshold since startup")
+
+
+class MetricsResponse(BaseModel):
+    """Response model for /metrics endpoint"""
+    context_cache: CacheStats = Field(..., description="Assembled lesson context cache")
+    upstream_http: UpstreamHttpStats = Field(..., description="OpenRouter connection pool")
+    response_cache: Optional[ResponseCacheStats] = Field(default=None, description="Chat response cache (None = disabled)")
+    single_flight: Optional[SingleFlightStats] = Field(default=None, description="Request coalescing (None = disabled)")
+    sessions: SessionStats = Field(..., description="Conversation session store")
+    event_loop: Optional[EventLoopStats] = Field(default=None, description="Event-loop lag (None = monitor disabled)")
 
 
 class ContextPreviewRequest(BaseModel):
@@ -112,12 +279,18 @@ class ContextPreviewRequest(BaseModel):
         default=None,
         description="List of lesson IDs to preview. None = all lessons"
     )
+    model: Optional[str] = Field(
+        default=None,
+        description="Model to estimate for (tokenizer and pricing). None = default model"
+    )
 
 
 class ContextPreviewResponse(BaseModel):
     """Response model for /context/preview endpoint"""
     lesson_count: int = Field(..., description="Number of lessons in selection")
     estimated_tokens: int = Field(..., description="Estimated token count")
+    context_chars: Optional[int] = Field(default=None, description="Context length in characters")
+    model: Optional[str] = Field(default=None, description="Model used for the estimate")
     estimated_cost_input: float = Field(..., description="Estimated cost for input in USD")
     estimated_cost_output: float = Field(..., description="Estimated cost for output in USD (4x input)")
     lessons: List[str] = Field(..., description="Titles of selected lessons")
@@ -130,6 +303,29 @@ class LessonsGroupedResponse(BaseModel):
         description="Lessons grouped by course and module"
     )
 
+
+class SearchHit(BaseModel):
+    """One matching lesson or artifact section"""
+    kind: Literal["lesson", "artifact"] = Field(..., description="Document kind")
+    lesson_id: Optional[int] = Field(default=None, description="Lesson ID when kind=lesson")
+    artifact_id: Optional[str] = Field(default=None, description="Artifact ID when kind=artifact")
+    title: str = Field(..., description="Lesson or artifact title")
+    heading: Optional[str] = Field(default=None, description="Heading path of the matching section (' > '-joined)")
+    anchor: Optional[str] = Field(
+        default=None,
+        description="Anchor slug of the section heading (for lessons the section ID, see /lessons/{id}/toc)"
+    )
+    snippet: str = Field(..., description="Text around the matches")
+    highlights: List[List[int]] = Field(default_factory=list, description="[start, end] offsets of matches in snippet")
+    score: float = Field(..., description="BM25 relevance score")
+
+
+class SearchResponse(BaseModel):
+    """Response model for /search endpoint"""
+    query: str = Field(..., description="Search text")
+    hits: List[SearchHit] = Field(..., description="Hits in relevance order")
+
+
 # ---------------------------
 # Canvas Artifacts (for Canvas MVP)
 # ---------------------------
@@ -137,6 +333,13 @@ class LessonsGroupedResponse(BaseModel):
 ArtifactType = Literal["markdown", "code", "images", "plot", "calculator", "react-component"]
 
 
+class ArtifactAsset(BaseModel):
+    """File stored in the artifacts assets folder and referenced by an artifact"""
+    path: str = Field(..., description="Asset path relative to docs/artifacts (assets/<file>)")
+    size: Optional[int] = Field(default=None, description="Size in bytes (None if the file is missing)")
+    sha256: Optional[str] = Field(default=None, description="SHA-256 of the file content")
+
+
 class Artifact(BaseModel):
     id: str = Field(..., description="Artifact identifier")
     title: str = Field(..., description="Title")
@@ -153,6 +356,10 @@ class Artifact(BaseModel):
         default=None,
         description="List of images (base64 data URLs) when type=images"
     )
+    assets: Optional[List[ArtifactAsset]] = Field(
+        default=None,
+        description="Manifest of the image files when type=images"
+    )
     config: Optional[dict] = Field(
         default=None,
         description="Configuration for plot/calculator artifacts (JSON)"
@@ -173,10 +380,14 @@ class ArtifactMeta(BaseModel):
     created_at: str = Field(..., description="Creation timestamp (ISO 8601)")
     updated_at: str = Field(..., description="Update timestamp (ISO 8601)")
     tags: Optional[List[str]] = Field(default=None, description="Tags")
+    source: Optional[str] = Field(default=None, description="Source reference (lesson/chat)")
 
 
 class ArtifactListResponse(BaseModel):
-    items: List[ArtifactMeta] = Field(..., description="List of artifacts")
+    items: List[ArtifactMeta] = Field(..., description="List of artifacts (one page)")
+    total: int = Field(default=0, description="Number of artifacts matching the filters")
+    limit: Optional[int] = Field(default=None, description="Page size")
+    offset: int = Field(default=0, description="Index of the first returned artifact")
 
 
 class CreateArtifactRequest(BaseModel):
@@ -186,7 +397,7 @@ class CreateArtifactRequest(BaseModel):
     html: Optional[str] = Field(default=None, description="HTML content when type=code")
     images: Optional[List[str]] = Field(
         default=None,
-        description="List of images (base64 data URLs) when type=images"
+        description="List of images (base64 data URLs or img:<sha256> references) when type=images"
     )
     config: Optional[dict] = Field(
         default=None,
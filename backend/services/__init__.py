@@ -1,8 +1,29 @@
 """
 Services package for AI Learning Agent
 """
+from .artifact_index import ArtifactIndex
+from .artifact_store import ArtifactStore
 from .context_service import ContextService
+from .history_compactor import HistoryCompactor
+from .image_store import ImageStore, ImageTooLargeError, is_image_ref
+from .lesson_record import LessonRecord, Section
+from .lesson_watcher import LessonWatcher
+from .loop_monitor import LoopLagMonitor
 from .openrouter_service import OpenRouterService
+from .prepared_response import PreparedBody, PreparedResponseCache
 from .prompt_loader import PromptLoader
+from .response_cache import ResponseCache, create_response_cache
+from .search_service import SearchService
+from .session_store import SessionStore, create_session_store
+from .tokenizer import Tokenizer, get_tokenizer, register_tokenizer
+from .vector_store import Encoder, HashingEncoder, VectorStore, get_encoder
 
-__all__ = ["ContextService", "OpenRouterService", "PromptLoader"]
+__all__ = [
+    "ArtifactIndex", "ArtifactStore", "ContextService", "HistoryCompactor", "ImageStore", "ImageTooLargeError", "is_image_ref", "LessonRecord", "Section", "LessonWatcher", "LoopLagMonitor", "OpenRouterService",
+    "PreparedBody", "PreparedResponseCache", "PromptLoader",
+    "ResponseCache", "create_response_cache",
+    "SearchService",
+    "SessionStore", "create_session_store",
+    "Tokenizer", "get_tokenizer", "register_tokenizer",
+    "Encoder", "HashingEncoder", "VectorStore", "get_encoder"
+]
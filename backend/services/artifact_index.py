@@ -0,0 +1,301 @@
+"""
+Artifact Index - SQLite metadata index for listing artifacts without reading their files
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SORT_FIELDS = ("created_at", "updated_at", "title")
+
+# Bump when the schema or the indexed fields change (forces a rebuild)
+_SCHEMA_VERSION = "2"
+
+
+class ArtifactIndex:
+    """
+    Persistent index of artifact frontmatter (id, title, type, source, tags,
+    timestamps) and of each artifact's image assets (path, size, sha256).
+
+    create_artifact upserts the new entry; files added or removed by other
+    means are picked up by sync(), which is O(1) while the artifacts
+    directory is unchanged (its mtime is compared) and otherwise parses only
+    the files not yet indexed. rebuild() re-reads everything.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        artifacts_dir: str,
+        read_meta: Callable[[str], Dict[str, Any]],
+        excluded: Tuple[str, ...] = ()
+    ):
+        """
+        Initialize artifact index
+
+        Args:
+            path: Database file path (created if missing; safe to delete)
+            artifacts_dir: Directory with the artifact .md files
+            read_meta: Reads one artifact file name into a metadata dict
+                (id, title, type, source, tags, created_at, updated_at, assets)
+            excluded: .md file names that are not artifacts (specs/help docs)
+        """
+        self.path = path
+        self.artifacts_dir = artifacts_dir
+        self.read_meta = read_meta
+        self.excluded = set(excluded)
+        # One connection shared by the I/O worker threads
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                type TEXT NOT NULL,
+                source TEXT,
+                tags TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_created_at ON artifacts (created_at);
+            CREATE INDEX IF NOT EXISTS artifacts_type_created_at ON artifacts (type, created_at);
+            CREATE INDEX IF NOT EXISTS artifacts_source ON artifacts (source);
+            CREATE TABLE IF NOT EXISTS artifact_tags (
+                artifact_id TEXT NOT NULL REFERENCES artifacts (id) ON DELETE CASCADE,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, artifact_id)
+            );
+            CREATE INDEX IF NOT EXISTS artifact_tags_artifact_id ON artifact_tags (artifact_id);
+            CREATE TABLE IF NOT EXISTS artifact_assets (
+                artifact_id TEXT NOT NULL REFERENCES artifacts (id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER,
+                sha256 TEXT,
+                PRIMARY KEY (artifact_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS index_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        row = self._conn.execute("SELECT value FROM index_state WHERE key = 'schema'").fetchone()
+        self._needs_rebuild = row is None or row[0] != _SCHEMA_VERSION
+
+    def _dir_mtime(self) -> str:
+        try:
+            return str(os.stat(self.artifacts_dir).st_mtime_ns)
+        except FileNotFoundError:
+            return ""
+
+    def _insert(self, filename: str, meta: Dict[str, Any]) -> None:
+        tags = meta.get("tags") or []
+        self._conn.execute("DELETE FROM artifacts WHERE id = ? OR filename = ?", (meta["id"], filename))
+        self._conn.execute(
+            "INSERT INTO artifacts (id, filename, title, type, source, tags, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                meta["id"], filename, meta["title"], meta["type"], meta.get("source") or None,
+                json.dumps(tags, ensure_ascii=False) if tags else None,
+                meta.get("created_at", ""), meta.get("updated_at", "")
+            )
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO artifact_tags (artifact_id, tag) VALUES (?, ?)",
+            [(meta["id"], tag) for tag in tags]
+        )
+        self._conn.executemany(
+            "INSERT INTO artifact_assets (artifact_id, seq, path, size, sha256) VALUES (?, ?, ?, ?, ?)",
+            [
+                (meta["id"], seq, asset["path"], asset.get("size"), asset.get("sha256"))
+                for seq, asset in enumerate(meta.get("assets") or [])
+            ]
+        )
+
+    def upsert(self, filename: str, meta: Dict[str, Any]) -> None:
+        """
+        Add or replace one artifact entry
+
+        Args:
+            filename: Artifact file name (<id>.md)
+            meta: Metadata dict (id, title, type, source, tags, created_at, updated_at,
+                assets as [{"path", "size", "sha256"}])
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._insert(filename, meta)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def sync(self, force: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date with the artifacts directory
+
+        Args:
+            force: Re-read every file (full rebuild) instead of only new ones
+
+        Returns:
+            Dictionary with added and removed counts
+        """
+        with self._lock:
+            force = force or self._needs_rebuild
+            dir_mtime = self._dir_mtime()
+            row = self._conn.execute("SELECT value FROM index_state WHERE key = 'dir_mtime'").fetchone()
+            if not force and row is not None and row[0] == dir_mtime:
+                return {"added": 0, "removed": 0}
+
+            names = set()
+            if os.path.exists(self.artifacts_dir):
+                names = {
+                    name for name in os.listdir(self.artifacts_dir)
+                    if name.endswith(".md") and name not in self.excluded
+                }
+            indexed = {filename for (filename,) in self._conn.execute("SELECT filename FROM artifacts")}
+            to_add = names if force else names - indexed
+            to_remove = indexed - names
+
+            self._conn.execute("BEGIN")
+            try:
+                if force:
+                    self._conn.execute("DELETE FROM artifacts")
+                else:
+                    self._conn.executemany("DELETE FROM artifacts WHERE filename = ?", [(n,) for n in to_remove])
+                for filename in sorted(to_add):
+                    try:
+                        self._insert(filename, self.read_meta(filename))
+                    except Exception as e:
+                        logger.error(f"Cannot index artifact {filename}: {e}")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)",
+                    [("dir_mtime", dir_mtime), ("schema", _SCHEMA_VERSION)]
+                )
+                self._conn.execute("COMMIT")
+                self._needs_rebuild = False
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            if to_add or to_remove:
+                logger.info(f"Artifact index synced: {len(to_add)} indexed, {len(to_remove)} removed")
+            return {"added": len(to_add), "removed": len(to_remove)}
+
+    def rebuild(self) -> Dict[str, int]:
+        """Re-read every artifact file (e.g. after files were edited by hand)"""
+        return self.sync(force=True)
+
+    def query(
+        self,
+        type: Optional[str] = None,
+        tags: Optional[List[str]] = None,
+        source: Optional[str] = None,
+        sort: str = "created_at",
+        descending: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        List artifacts from the index
+
+        Args:
+            type: Only artifacts of this type
+            tags: Only artifacts having all of these tags
+            source: Only artifacts with this source
+            sort: One of SORT_FIELDS
+            descending: Newest (or last) first
+            limit: Page size (None = all)
+            offset: Number of entries to skip
+
+        Returns:
+            Tuple of (page of metadata dicts, total number of matches)
+        """
+        with self._lock:
+            if sort not in SORT_FIELDS:
+                raise ValueError(f"Unsupported sort field: {sort}")
+            self.sync()
+
+            where: List[str] = []
+            params: List[Any] = []
+            if type:
+                where.append("type = ?")
+                params.append(type)
+            if source:
+                where.append("source = ?")
+                params.append(source)
+            for tag in tags or []:
+                where.append("id IN (SELECT artifact_id FROM artifact_tags WHERE tag = ?)")
+                params.append(tag)
+            where_sql = (" WHERE " + " AND ".join(where)) if where else ""
+
+            (total,) = self._conn.execute(f"SELECT COUNT(*) FROM artifacts{where_sql}", params).fetchone()
+            direction = "DESC" if descending else "ASC"
+            rows = self._conn.execute(
+                f"SELECT id, title, type, source, tags, created_at, updated_at FROM artifacts{where_sql}"
+                f" ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]
+            ).fetchall()
+            items = [
+                {
+                    "id": art_id,
+                    "title": title,
+                    "type": art_type,
+                    "source": art_source,
+                    "tags": json.loads(art_tags) if art_tags else None,
+                    "created_at": created_at,
+                    "updated_at": updated_at
+                }
+                for art_id, title, art_type, art_source, art_tags, created_at, updated_at in rows
+            ]
+            return items, total
+
+    def get_assets(self, artifact_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the image manifest of an artifact
+
+        Args:
+            artifact_id: Artifact ID
+
+        Returns:
+            List of {"path", "size", "sha256"} in artifact order (empty if none or not indexed)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, sha256 FROM artifact_assets WHERE artifact_id = ? ORDER BY seq",
+                (artifact_id,)
+            ).fetchall()
+        return [{"path": path, "size": size, "sha256": sha256} for path, size, sha256 in rows]
+
+    def find_without_assets(self, type: str = "images") -> List[str]:
+        """
+        Find artifacts of a type that have no asset manifest yet
+
+        Args:
+            type: Artifact type
+
+        Returns:
+            Artifact file names
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename FROM artifacts WHERE type = ?"
+                " AND id NOT IN (SELECT artifact_id FROM artifact_assets)",
+                (type,)
+            ).fetchall()
+        return [filename for (filename,) in rows]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        self._conn.close()
@@ -0,0 +1,443 @@
+"""
+Artifact Store - Async storage of canvas artifacts in docs/artifacts
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .artifact_index import ArtifactIndex
+from .image_store import ImageStore
+
+logger = logging.getLogger(__name__)
+
+# Docs in the artifacts directory that are not artifacts
+NON_ARTIFACT_DOCS = ("ARTIFACTS_SPEC.md", "artifacts.md")
+
+_ASSET_LINK_RE = re.compile(r"\]\((assets/[^)\s]+)\)")
+_ARTIFACT_ID_RE = re.compile(r"^[\w.-]+$")
+# Content-addressed asset names carry their SHA-256; older ones are <artifact_id>-<n>.<ext>
+_HASHED_ASSET_RE = re.compile(r"^([0-9a-f]{64})\.\w+$")
+_LEGACY_ASSET_RE = re.compile(r"^(.+)-(\d+)\.\w+$")
+
+
+def build_frontmatter(meta: dict) -> str:
+    """Build YAML-like frontmatter without external deps"""
+    lines = ["---"]
+    for k, v in meta.items():
+        if isinstance(v, list):
+            lines.append(f"{k}: [{', '.join(v)}]")
+        else:
+            lines.append(f"{k}: {v}")
+    lines.append("---")
+    return "\n".join(lines)
+
+
+def parse_frontmatter(md_text: str) -> Tuple[dict, str]:
+    """
+    Naive frontmatter parser: returns (meta_dict, body)
+    Expects:
+    ---
+    key: value
+    ---
+    body...
+    """
+    if not md_text.startswith("---"):
+        return {}, md_text
+    parts = md_text.split("---", 2)
+    if len(parts) < 3:
+        return {}, md_text
+    _, meta_str, body = parts
+    meta: dict = {}
+    for raw in meta_str.strip().splitlines():
+        if ":" not in raw:
+            continue
+        k, v = raw.split(":", 1)
+        key = k.strip()
+        val = v.strip()
+        if val.startswith("[") and val.endswith("]"):
+            # list like [a, b]
+            items = [x.strip() for x in val[1:-1].split(",") if x.strip()]
+            meta[key] = items
+        else:
+            meta[key] = val
+    return meta, body.lstrip("\n")
+
+
+def _manifest_paths(meta: dict, body: str) -> List[str]:
+    """Asset paths of an image artifact: the 'images' manifest, else the body's asset links"""
+    images = meta.get("images")
+    if isinstance(images, list) and images:
+        return images
+    return _ASSET_LINK_RE.findall(body)
+
+
+def _atomic_write(path: str, text: str) -> None:
+    """Write a text file via temp file + rename, so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ArtifactStore:
+    """
+    Reads and writes artifacts without blocking the event loop.
+
+    Every filesystem operation (markdown/HTML files, image decoding and
+    writes, index queries) runs in a small dedicated thread pool, so a slow
+    disk or a large listing only occupies a worker thread while chat
+    streams keep flowing. The pool is bounded, which also bounds how much
+    concurrent disk I/O artifact requests can cause.
+    """
+
+    def __init__(
+        self,
+        artifacts_dir: str,
+        index_path: str,
+        image_store: ImageStore,
+        max_workers: int = 4
+    ):
+        """
+        Initialize artifact store
+
+        Args:
+            artifacts_dir: Directory with artifact .md/.html files (images go to image_store)
+            index_path: SQLite metadata index path
+            image_store: Content-addressed store for artifact images
+            max_workers: Size of the I/O thread pool
+        """
+        self.artifacts_dir = artifacts_dir
+        self.image_store = image_store
+        os.makedirs(artifacts_dir, exist_ok=True)
+        self.index = ArtifactIndex(
+            index_path,
+            artifacts_dir,
+            read_meta=self._read_meta,
+            excluded=NON_ARTIFACT_DOCS
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="artifact-io")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def sync_index(self) -> Dict[str, int]:
+        """Pick up artifact files added or removed outside the API"""
+        return await self._run(self.index.sync)
+
+    async def reindex(self) -> Dict[str, int]:
+        """Rebuild the metadata index from all artifact files"""
+        return await self._run(self.index.rebuild)
+
+    async def migrate_asset_manifests(self) -> int:
+        """Backfill asset manifests of older image artifacts (see _backfill_asset_manifests)"""
+        return await self._run(self._backfill_asset_manifests)
+
+    async def create(
+        self,
+        title: str,
+        type: str,
+        content_markdown: Optional[str] = None,
+        html: Optional[str] = None,
+        images: Optional[List[str]] = None,
+        source: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Create and persist an artifact
+        - type=markdown: saves .md with frontmatter + body
+        - type=code: saves .md with description and .html with code
+        - type=images: stores images (data URLs or img:<sha256> refs) and links them from the body
+
+        Returns:
+            Artifact fields as a dict
+        """
+        return await self._run(self._create, title, type, content_markdown, html, images, source, tags)
+
+    async def get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a single artifact
+
+        Returns:
+            Artifact fields as a dict, or None if not found
+        """
+        return await self._run(self._get, artifact_id)
+
+    async def list(self, **filters) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        List artifact metadata (see ArtifactIndex.query for filters)
+
+        Returns:
+            Tuple of (page of metadata dicts, total number of matches)
+        """
+        return await self._run(lambda: self.index.query(**filters))
+
+    async def read_documents(self) -> List[Dict[str, str]]:
+        """
+        Read the title and body of every artifact (for the search index)
+
+        Returns:
+            List of {"id", "title", "body"}
+        """
+        return await self._run(self._read_documents)
+
+    def close(self) -> None:
+        """Wait for pending I/O and release the thread pool and index"""
+        self._executor.shutdown(wait=True)
+        self.index.close()
+
+    # Blocking implementations (run in the thread pool)
+
+    def _save_images(self, images: List[str], artifact_id: str) -> List[Dict[str, Any]]:
+        """Store images; returns their manifest [{"path": 'assets/<file>', "size", "sha256"}]"""
+        saved: List[Dict[str, Any]] = []
+        for idx, image in enumerate(images, start=1):
+            try:
+                stored = self.image_store.store(image)
+            except Exception as e:
+                logger.error(f"Failed to save image {idx} for artifact {artifact_id}: {e}")
+                continue
+            saved.append({"path": f"assets/{stored['filename']}", "size": stored["size"], "sha256": stored["hash"]})
+        return saved
+
+    def _describe_assets(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Build the manifest of existing asset paths (older, non content-addressed files are hashed)"""
+        assets: List[Dict[str, Any]] = []
+        assets_dir = self.image_store.root_dir
+        for rel in paths:
+            name = os.path.basename(rel)
+            abs_path = os.path.join(assets_dir, name)
+            try:
+                size = os.path.getsize(abs_path)
+            except OSError:
+                assets.append({"path": rel, "size": None, "sha256": None})
+                continue
+            match = _HASHED_ASSET_RE.match(name)
+            if match:
+                digest = match.group(1)
+            else:
+                with open(abs_path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            assets.append({"path": rel, "size": size, "sha256": digest})
+        return assets
+
+    def _create(
+        self,
+        title: str,
+        type: str,
+        content_markdown: Optional[str],
+        html: Optional[str],
+        images: Optional[List[str]],
+        source: Optional[str],
+        tags: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        now_iso = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+        # YYYYMMDDHHMMSS-xxxxxx
+        artifact_id = datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+        assets: List[Dict[str, Any]] = []
+        if type == "images" and images:
+            assets = self._save_images(images, artifact_id)
+        saved_images = [asset["path"] for asset in assets]
+
+        meta = {
+            "id": artifact_id,
+            "title": title,
+            "type": type,
+            "source": (source or ""),
+            "tags": tags or [],
+            "created_at": now_iso,
+            "updated_at": now_iso
+        }
+        if saved_images:
+            # Asset manifest, so reads never have to look for the files
+            meta["images"] = saved_images
+
+        body = ""
+        if type == "markdown":
+            body = content_markdown or ""
+        elif type == "code":
+            # Put optional description into body
+            body = (content_markdown or "Code artifact")
+            # Save HTML for execution/preview (before the .md, which makes the artifact visible)
+            if html:
+                _atomic_write(os.path.join(self.artifacts_dir, f"{artifact_id}.html"), html)
+        elif type == "images":
+            if saved_images:
+                lines = ["# Images", ""]
+                for rel in saved_images:
+                    lines.append(f"![image]({rel})")
+                body = "\n".join(lines)
+            else:
+                body = content_markdown or "Images artifact"
+
+        _atomic_write(
+            os.path.join(self.artifacts_dir, f"{artifact_id}.md"),
+            build_frontmatter(meta) + "\n\n" + (body or "")
+        )
+        self.index.upsert(f"{artifact_id}.md", {**meta, "source": source or None, "assets": assets})
+
+        return {
+            "id": artifact_id,
+            "title": title,
+            "type": type,
+            "content_markdown": body if type in ("markdown", "code") else None,
+            "html": html if type == "code" else None,
+            "images": saved_images if type == "images" else None,
+            "assets": assets if type == "images" else None,
+            "source": source,
+            "tags": tags or [],
+            "created_at": now_iso,
+            "updated_at": now_iso
+        }
+
+    def _get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        if not _ARTIFACT_ID_RE.match(artifact_id):
+            return None
+        md_path = os.path.join(self.artifacts_dir, f"{artifact_id}.md")
+        try:
+            with open(md_path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        meta, body = parse_frontmatter(text)
+
+        # Load optional HTML for code type
+        html_content = None
+        if meta.get("type") == "code":
+            html_file = os.path.join(self.artifacts_dir, f"{artifact_id}.html")
+            if os.path.exists(html_file):
+                with open(html_file, "r", encoding="utf-8") as hf:
+                    html_content = hf.read()
+
+        # Images from the asset manifest (sizes and hashes come from the index)
+        images_list: List[str] = []
+        assets: Optional[List[Dict[str, Any]]] = None
+        if meta.get("type") == "images":
+            images_list = _manifest_paths(meta, body)
+            assets = self.index.get_assets(str(meta.get("id", artifact_id)))
+            if [asset["path"] for asset in assets] != images_list:
+                assets = self._describe_assets(images_list)
+
+        # Build config for react-component type
+        config_dict = None
+        if meta.get("type") == "react-component":
+            config_dict = {
+                "type": "react-component",
+                "id": meta.get("componentId", artifact_id),
+                "props": {
+                    "title": meta.get("propsTitle"),
+                    "message": meta.get("propsMessage"),
+                    "timestamp": int(meta.get("propsTimestamp", 0)) if meta.get("propsTimestamp") else None
+                }
+            }
+
+        return {
+            "id": str(meta.get("id", artifact_id)),
+            "title": str(meta.get("title", artifact_id)),
+            "type": str(meta.get("type", "markdown")),
+            "content_markdown": body if meta.get("type") in ("markdown", "code", "react-component") else None,
+            "html": html_content if meta.get("type") == "code" else None,
+            "images": images_list if meta.get("type") == "images" else None,
+            "assets": assets,
+            "config": config_dict,
+            "source": meta.get("source"),
+            "tags": meta.get("tags") if isinstance(meta.get("tags"), list) else None,
+            "created_at": str(meta.get("created_at", "")),
+            "updated_at": str(meta.get("updated_at", ""))
+        }
+
+    def _read_documents(self) -> List[Dict[str, str]]:
+        documents: List[Dict[str, str]] = []
+        for name in sorted(os.listdir(self.artifacts_dir)):
+            if not name.endswith(".md") or name in NON_ARTIFACT_DOCS:
+                continue
+            try:
+                with open(os.path.join(self.artifacts_dir, name), "r", encoding="utf-8") as f:
+                    meta, body = parse_frontmatter(f.read())
+            except Exception as e:
+                logger.error(f"Cannot read artifact {name}: {e}")
+                continue
+            artifact_id = str(meta.get("id", name[:-3]))
+            documents.append({"id": artifact_id, "title": str(meta.get("title", artifact_id)), "body": body})
+        return documents
+
+    def _read_meta(self, filename: str) -> Dict[str, Any]:
+        """Read listing metadata of one artifact file (derived from the filename when it has no frontmatter)"""
+        with open(os.path.join(self.artifacts_dir, filename), "r", encoding="utf-8") as f:
+            text = f.read()
+        meta, body = parse_frontmatter(text)
+        stem = filename[:-3]
+        assets = self._describe_assets(_manifest_paths(meta, body)) if meta.get("type") == "images" else []
+        return {
+            "id": str(meta.get("id", stem)),
+            "title": str(meta.get("title", stem)),
+            "type": str(meta.get("type", "markdown")),
+            "source": str(meta.get("source") or "") or None,
+            "tags": meta.get("tags") if isinstance(meta.get("tags"), list) else None,
+            "created_at": str(meta.get("created_at", "")),
+            "updated_at": str(meta.get("updated_at", "")),
+            "assets": assets
+        }
+
+    def _backfill_asset_manifests(self) -> int:
+        """
+        Add the 'images' manifest to image artifacts saved before it existed
+
+        Images are taken from the body's asset links or, for the oldest
+        artifacts, from assets named <artifact_id>-<n>.<ext> (one directory
+        listing for all of them). Idempotent.
+
+        Returns:
+            Number of artifacts migrated
+        """
+        candidates = self.index.find_without_assets("images")
+        legacy: Optional[Dict[str, List[str]]] = None
+        migrated = 0
+        for filename in candidates:
+            md_path = os.path.join(self.artifacts_dir, filename)
+            try:
+                with open(md_path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                continue
+            meta, body = parse_frontmatter(text)
+            if not meta:
+                continue
+            if not meta.get("images"):
+                images = _ASSET_LINK_RE.findall(body)
+                if not images:
+                    if legacy is None:
+                        legacy = self._legacy_assets()
+                    images = legacy.get(str(meta.get("id", filename[:-3])), [])
+                if not images:
+                    continue
+                meta["images"] = images
+                _atomic_write(md_path, build_frontmatter(meta) + "\n\n" + body)
+            self.index.upsert(filename, self._read_meta(filename))
+            migrated += 1
+        if migrated:
+            logger.info(f"Backfilled asset manifests for {migrated} artifacts")
+        return migrated
+
+    def _legacy_assets(self) -> Dict[str, List[str]]:
+        """Group assets named <artifact_id>-<n>.<ext> by artifact id, in saving order"""
+        grouped: Dict[str, List[Tuple[int, str]]] = {}
+        assets_dir = self.image_store.root_dir
+        if os.path.exists(assets_dir):
+            for name in os.listdir(assets_dir):
+                match = _LEGACY_ASSET_RE.match(name)
+                if match:
+                    grouped.setdefault(match.group(1), []).append((int(match.group(2)), f"assets/{name}"))
+        return {art_id: [path for _, path in sorted(items)] for art_id, items in grouped.items()}
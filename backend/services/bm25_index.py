@@ -0,0 +1,167 @@
+"""
+BM25 Index - In-process inverted index for lexical retrieval
+"""
+import heapq
+import math
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class BM25Index:
+    """Okapi BM25 inverted index supporting incremental add/remove"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize empty index
+
+        Args:
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        self._doc_terms: Optional[Dict[Hashable, Counter]] = {}
+        self._total_length = 0
+        # Per-document length normalization, recomputed on the first search after a change
+        self._norms: Optional[Dict[Hashable, float]] = None
+
+    def get_state(self) -> Dict:
+        """
+        Export index contents as plain dicts (for snapshots)
+
+        Returns:
+            Dictionary with postings and document lengths
+        """
+        return {"postings": self.postings, "doc_lengths": self.doc_lengths}
+
+    def load_state(self, state: Dict) -> None:
+        """
+        Replace index contents with a previously exported state
+
+        Args:
+            state: Result of get_state()
+        """
+        self.postings = state["postings"]
+        self.doc_lengths = state["doc_lengths"]
+        self._total_length = sum(self.doc_lengths.values())
+        self._norms = None
+        # Per-document term lists are only needed for removal; rebuilt lazily
+        self._doc_terms = None
+
+    def copy(self) -> "BM25Index":
+        """
+        Independent copy that can be updated while this index keeps serving searches
+
+        Returns:
+            BM25Index with the same contents
+        """
+        clone = BM25Index(self.k1, self.b)
+        clone.postings = {term: dict(docs) for term, docs in self.postings.items()}
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone._total_length = self._total_length
+        # Term counters are replaced, never mutated, so they can be shared
+        clone._doc_terms = None if self._doc_terms is None else dict(self._doc_terms)
+        return clone
+
+    def _get_doc_terms(self) -> Dict[Hashable, Counter]:
+        if self._doc_terms is None:
+            doc_terms: Dict[Hashable, Counter] = {key: Counter() for key in self.doc_lengths}
+            for term, docs in self.postings.items():
+                for doc_key, tf in docs.items():
+                    doc_terms[doc_key][term] = tf
+            self._doc_terms = doc_terms
+        return self._doc_terms
+
+    def _get_norms(self) -> Dict[Hashable, float]:
+        if self._norms is None:
+            avg_length = self._total_length / len(self.doc_lengths) or 1.0
+            k1, b = self.k1, self.b
+            self._norms = {
+                doc_key: k1 * (1 - b + b * length / avg_length)
+                for doc_key, length in self.doc_lengths.items()
+            }
+        return self._norms
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_document(self, doc_key: Hashable, terms: Iterable[str]) -> None:
+        """
+        Index a document (replaces an existing document with the same key)
+
+        Args:
+            doc_key: Unique document key
+            terms: Analyzed terms of the document
+        """
+        if doc_key in self.doc_lengths:
+            self.remove_document(doc_key)
+
+        counts = Counter(terms)
+        length = sum(counts.values())
+        self._get_doc_terms()[doc_key] = counts
+        self.doc_lengths[doc_key] = length
+        self._total_length += length
+        self._norms = None
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_key] = tf
+
+    def remove_document(self, doc_key: Hashable) -> None:
+        """
+        Remove a document from the index (no-op if missing)
+
+        Args:
+            doc_key: Document key
+        """
+        counts = self._get_doc_terms().pop(doc_key, None)
+        if counts is None:
+            return
+        self._total_length -= self.doc_lengths.pop(doc_key)
+        self._norms = None
+        for term in counts:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_key, None)
+                if not docs:
+                    del self.postings[term]
+
+    def search(
+        self,
+        query_terms: Iterable[str],
+        top_k: int = 10,
+        doc_filter: Optional[Callable[[Hashable], bool]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Rank documents against query terms
+
+        Args:
+            query_terms: Analyzed query terms
+            top_k: Maximum number of results
+            doc_filter: Optional predicate restricting candidate documents
+
+        Returns:
+            List of (doc_key, score) sorted by descending score
+        """
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        norms = self._get_norms()
+
+        scores: Dict[Hashable, float] = {}
+        get_score = scores.get
+        for term, query_tf in Counter(query_terms).items():
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            weight = query_tf * idf * (self.k1 + 1)
+            if doc_filter is None:
+                for doc_key, tf in docs.items():
+                    scores[doc_key] = get_score(doc_key, 0.0) + weight * tf / (tf + norms[doc_key])
+            else:
+                for doc_key, tf in docs.items():
+                    if doc_filter(doc_key):
+                        scores[doc_key] = get_score(doc_key, 0.0) + weight * tf / (tf + norms[doc_key])
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,175 @@
+"""
+Chunker - Parses lesson Markdown into a title, a heading tree and heading-aware chunks
+"""
+import re
+from typing import Dict, List, Optional
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SLUG_STRIP_RE = re.compile(r"[^\w\- ]")
+
+
+def slugify(title: str) -> str:
+    """
+    Turn a heading into a GitHub-style anchor slug
+
+    Args:
+        title: Heading text
+
+    Returns:
+        Lowercase slug (punctuation removed, spaces replaced by hyphens)
+    """
+    return _SLUG_STRIP_RE.sub("", title.strip().lower()).replace(" ", "-")
+
+
+def _match_heading(line: str, stripped: str) -> Optional[re.Match]:
+    # Headings may be indented by up to three spaces; deeper is an indented code block
+    if not stripped.startswith("#") or len(line) - len(line.lstrip(" \t")) > 3:
+        return None
+    return _HEADING_RE.match(stripped)
+
+
+def parse_markdown(content: str, max_chars: int = 2400) -> Dict:
+    """
+    Parse Markdown content in a single pass over its lines
+
+    Produces everything derived from a lesson's text at once: the title,
+    the heading tree (see build_sections) and the retrieval chunks (see
+    split_into_chunks).
+
+    Args:
+        content: Lesson Markdown
+        max_chars: Soft upper bound for chunk length in characters
+
+    Returns:
+        Dictionary with "title" (first '# ' or '## ' line, None if there is none),
+        "sections" and "chunks"
+    """
+    title: Optional[str] = None
+    chunks: List[Dict] = []
+    sections: List[Dict] = []
+    open_sections: List[Dict] = []  # enclosing headings of the current position, outermost first
+    slug_counts: Dict[str, int] = {}
+    previous: Optional[Dict] = None
+
+    section_start = 0
+    section_heading = ""
+    section_level = 0
+    split_points: List[int] = []  # blank-line offsets inside the current section
+    in_code = False
+    pos = 0
+    # Byte offsets are converted from character offsets incrementally, at headings only
+    byte_pos = 0
+    byte_pos_at = 0
+
+    def close_section(end: int) -> None:
+        if end <= section_start or not content[section_start:end].strip():
+            return
+        start = section_start
+        previous_point = start
+        for point in split_points:
+            # Cut at the last paragraph break that still fits
+            if point - start > max_chars and previous_point > start and content[start:previous_point].strip():
+                chunks.append({"start": start, "end": previous_point, "heading": section_heading, "level": section_level})
+                start = previous_point
+            previous_point = point
+        if content[start:end].strip():
+            chunks.append({"start": start, "end": end, "heading": section_heading, "level": section_level})
+
+    for line in content.splitlines(keepends=True):
+        stripped = line.strip()
+        if title is None:
+            # The title is the first '# ' (or non-empty '## ') line, fenced or not
+            if stripped.startswith('# '):
+                title = stripped.lstrip('# ').strip()
+            elif stripped.startswith('## ') and len(stripped) > 3:
+                title = stripped.lstrip('## ').strip()
+        if _FENCE_RE.match(line):
+            in_code = not in_code
+        elif not in_code:
+            match = _match_heading(line, stripped)
+            if match:
+                close_section(pos)
+                byte_pos += len(content[byte_pos_at:pos].encode("utf-8"))
+                byte_pos_at = pos
+                level = len(match.group(1))
+                heading = match.group(2)
+                while open_sections and open_sections[-1]["level"] >= level:
+                    closed = open_sections.pop()
+                    closed["end"], closed["char_end"] = byte_pos, pos
+                if previous is not None:
+                    previous["body_end"], previous["char_body_end"] = byte_pos, pos
+
+                slug = slugify(heading) or "section"
+                count = slug_counts.get(slug, 0)
+                slug_counts[slug] = count + 1
+                section = {
+                    "id": f"{slug}-{count}" if count else slug,
+                    "title": heading,
+                    "level": level,
+                    "parent": open_sections[-1]["id"] if open_sections else None,
+                    "start": byte_pos,
+                    "end": None,
+                    "body_end": None,
+                    "char_start": pos,
+                    "char_end": None,
+                    "char_body_end": None
+                }
+                sections.append(section)
+                open_sections.append(section)
+                previous = section
+
+                section_start = pos
+                section_heading = " > ".join(item["title"] for item in open_sections)
+                section_level = level
+                split_points = []
+            elif not stripped:
+                split_points.append(pos + len(line))
+        pos += len(line)
+
+    close_section(len(content))
+    byte_pos += len(content[byte_pos_at:pos].encode("utf-8"))
+    for section in open_sections:
+        section["end"], section["char_end"] = byte_pos, pos
+    if previous is not None:
+        previous["body_end"], previous["char_body_end"] = byte_pos, pos
+    return {"title": title, "sections": sections, "chunks": chunks}
+
+
+def split_into_chunks(content: str, max_chars: int = 2400) -> List[Dict]:
+    """
+    Split Markdown content into chunks aligned to headings
+
+    Every heading starts a new chunk. Sections longer than max_chars are
+    split further at blank lines outside fenced code blocks, so code
+    examples stay intact where possible.
+
+    Args:
+        content: Lesson Markdown
+        max_chars: Soft upper bound for chunk length in characters
+
+    Returns:
+        List of chunks: {"start", "end", "heading", "level"} where start/end are
+        character offsets into content and heading is the " > "-joined heading path
+    """
+    return parse_markdown(content, max_chars)["chunks"]
+
+
+def build_sections(content: str) -> List[Dict]:
+    """
+    Parse the heading tree of Markdown content
+
+    Headings inside fenced code blocks are ignored. Section IDs are
+    GitHub-style slugs, made unique within the document with -1, -2, ...
+
+    Args:
+        content: Lesson Markdown
+
+    Returns:
+        Sections in document order: {"id", "title", "level", "parent", "start", "end",
+        "body_end", "char_start", "char_end", "char_body_end"}. start/end/body_end are
+        UTF-8 byte offsets into content (the char_* fields are the same positions as
+        character offsets); end includes subsections, body_end stops at the next heading;
+        parent is the enclosing section's ID or None
+    """
+    return parse_markdown(content)["sections"]
@@ -1,104 +1,561 @@
 """
 Context Service - Manages lessons and builds context for AI
 """
+import copy
+import hashlib
 import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 
+from .bm25_index import BM25Index
+from .corpus_snapshot import CorpusSnapshot, file_sha256, read_snapshot, snapshot_settings, write_snapshot
+from .lesson_record import LessonRecord, Section
+from .text_analysis import analyze
+from .tokenizer import count_all, get_tokenizer, get_tokenizers
+from .vector_store import VectorStore
+
 logger = logging.getLogger(__name__)
 
 
+def _strip_newlines(data: memoryview, leading: bool = True) -> memoryview:
+    """Drop trailing (and optionally leading) newlines from a byte view without copying"""
+    start, end = 0, len(data)
+    while end > start and data[end - 1] == 0x0A:
+        end -= 1
+    while leading and start < end and data[start] == 0x0A:
+        start += 1
+    return data[start:end]
+
+
+def parse_section_ref(ref: str) -> Tuple[int, str]:
+    """
+    Split a section reference into lesson ID and section ID
+
+    Args:
+        ref: '<lesson_id>#<section_id>' (section IDs as listed by the lesson's table of contents)
+
+    Returns:
+        Tuple of (lesson_id, section_id)
+
+    Raises:
+        ValueError: If the reference is malformed
+    """
+    lesson_part, sep, section_id = ref.partition("#")
+    try:
+        lesson_id = int(lesson_part)
+    except ValueError:
+        lesson_id = None
+    if not sep or not section_id or lesson_id is None:
+        raise ValueError(f"Invalid section reference '{ref}' (expected '<lesson_id>#<section_id>')")
+    return lesson_id, section_id
+
+
 class ContextService:
     """Service for managing lessons and building context"""
 
-    def __init__(self, lessons_dir: str):
+    # Text appended after each lesson body; lessons are additionally separated by one newline
+    _LESSON_FOOTER = "\n\n"
+    _TRUNCATION_NOTE = "[... rest of this lesson omitted to fit the model's context window ...]"
+
+    # Bump when lesson parsing/indexing changes so stale corpus snapshots are rebuilt
+    _PARSER_VERSION = 5
+
+    def __init__(
+        self,
+        lessons_dir: str,
+        context_cache_size: int = 16,
+        chunk_max_chars: int = 2400,
+        vector_store: Optional[VectorStore] = None,
+        snapshot_path: Optional[str] = None
+    ):
         """
         Initialize context service
 
         Args:
             lessons_dir: Path to directory containing lesson Markdown files
+            context_cache_size: Maximum number of assembled contexts kept in the LRU cache
+            chunk_max_chars: Soft size limit for retrieval chunks
+            vector_store: Optional embedding store enabling semantic retrieval
+            snapshot_path: Optional corpus snapshot file for fast cold start
         """
         self.lessons_dir = Path(lessons_dir)
-        self.lessons_cache: Dict[int, Dict] = {}
+        # Lessons in corpus order (sorted by relative path); IDs are derived from the path
+        self.lessons_cache: Dict[int, LessonRecord] = {}
+        self._ids_by_path: Dict[str, int] = {}
+        self._positions: Dict[int, int] = {}
+        self.snapshot_path = snapshot_path
+
+        # Lexical retrieval index over heading-aware chunks, keyed by (lesson_id, chunk_index)
+        self.chunk_max_chars = chunk_max_chars
+        self.lexical_index = BM25Index()
+        self.vector_store = vector_store
+
+        # Assembled contexts keyed by canonical lesson-id tuple (LRU order)
+        self.corpus_version = 0
+        self._context_cache: "OrderedDict[Tuple[int, ...], str]" = OrderedDict()
+        self._context_cache_size = max(0, context_cache_size)
+        self._context_cache_hits = 0
+        self._context_cache_misses = 0
+
         self._load_lessons()
 
     def _load_lessons(self) -> None:
-        """Load all lessons into memory at startup"""
+        """Load all lessons into memory at startup (from the corpus snapshot when valid)"""
         if not self.lessons_dir.exists():
             logger.warning(f"Lessons directory not found: {self.lessons_dir}")
             return
 
-        lesson_id = 1  # Counter for lesson IDs
+        files = self._scan_lesson_files()
+        settings = self._snapshot_settings()
 
-        # Walk through all subdirectories
-        for root, dirs, files in os.walk(self.lessons_dir):
-            for filename in sorted(files):
-                if filename.endswith(('.md', '.txt')) and not filename.startswith('.'):
-                    file_path = Path(root) / filename
-
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-
-                        # Extract course and module from path
-                        # Examples:
-                        #   ai-web-learning/1-basics/lesson-01.md -> course=ai-web-learning, module=1-basics
-                        #   extras/report.md -> course=extras, module=extras
-                        relative_path = file_path.relative_to(self.lessons_dir)
-                        course = relative_path.parts[0] if len(relative_path.parts) > 0 else "root"
-
-                        # For extras, module is same as course
-                        if course == "extras":
-                            module = "extras"
-                        else:
-                            module = relative_path.parts[1] if len(relative_path.parts) > 1 else "root"
-
-                        title = self._extract_title(content, filename)
-                        category = self._categorize_lesson(course, module, filename)
-
-                        self.lessons_cache[lesson_id] = {
-                            "id": lesson_id,
-                            "filename": filename,
-                            "filepath": str(file_path),
-                            "content": content,
-                            "title": title,
-                            "course": course,
-                            "module": module,
-                            "category": category
-                        }
-
-                        lesson_id += 1
-                        logger.info(f"Loaded lesson {lesson_id - 1}: {title} [{course}/{module}]")
-
-                    except Exception as e:
-                        logger.error(f"Error loading {file_path}: {e}")
+        loaded_from_snapshot = False
+        if self.snapshot_path:
+            snapshot = read_snapshot(self.snapshot_path)
+            if snapshot is not None:
+                if snapshot.is_valid(self.lessons_dir, files, settings):
+                    # Records reference the mapped content blob, so the map stays open
+                    self._restore_snapshot(snapshot)
+                    loaded_from_snapshot = True
+                    logger.info(f"Lessons restored from snapshot: {self.snapshot_path}")
+                else:
+                    logger.info("Corpus snapshot is stale, re-parsing lessons")
+                    snapshot.close()
+
+        if not loaded_from_snapshot:
+            for file_path in files:
+                self._load_lesson_file(file_path)
+            self._reorder_lessons()
+            self._store_content()
 
         logger.info(f"Total lessons loaded: {len(self.lessons_cache)}")
+        self._sync_vector_store()
+        self._bump_corpus_version()
+
+    def _scan_lesson_files(self) -> List[Path]:
+        """
+        List lesson files in corpus order (sorted by relative path)
 
-    def _extract_title(self, content: str, filename: str) -> str:
+        Returns:
+            List of lesson file paths
         """
-        Extract title from Markdown content
+        files = []
+        for root, dirs, filenames in os.walk(self.lessons_dir):
+            for filename in filenames:
+                if filename.endswith(('.md', '.txt')) and not filename.startswith('.'):
+                    files.append(Path(root) / filename)
+        return sorted(files, key=lambda path: path.relative_to(self.lessons_dir).as_posix())
+
+    def _lesson_id_for_path(self, relative_path: str) -> int:
+        """
+        Derive a stable lesson ID from the lesson's relative path
+
+        IDs survive restarts and adding/removing other files, so selections
+        cached by the frontend stay valid. The ID is a positive 31-bit
+        integer (safe in JSON/JavaScript); the rare collision is resolved by
+        probing the next free value.
 
         Args:
-            content: Markdown content
-            filename: Fallback filename if no title found
+            relative_path: Path relative to the lessons directory (POSIX form)
 
         Returns:
-            Extracted title or filename
+            Lesson ID
         """
-        lines = content.split('\n')
+        existing = self._ids_by_path.get(relative_path)
+        if existing is not None:
+            return existing
+
+        digest = hashlib.blake2b(relative_path.encode('utf-8'), digest_size=4).digest()
+        lesson_id = int.from_bytes(digest, 'big') & 0x7FFFFFFF or 1
+        while lesson_id in self.lessons_cache:
+            lesson_id = lesson_id % 0x7FFFFFFF + 1
+        return lesson_id
+
+    def _load_lesson_file(self, file_path: Path) -> Optional[int]:
+        """
+        Read, parse and index a single lesson file (replacing its previous version)
+
+        Args:
+            file_path: Lesson file path
+
+        Returns:
+            Lesson ID, or None if the file could not be loaded
+        """
+        filename = file_path.name
+        try:
+            stat = file_path.stat()
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+
+            # Extract course and module from path
+            # Examples:
+            #   ai-web-learning/1-basics/lesson-01.md -> course=ai-web-learning, module=1-basics
+            #   extras/report.md -> course=extras, module=extras
+            relative_path = file_path.relative_to(self.lessons_dir)
+            course = relative_path.parts[0] if len(relative_path.parts) > 0 else "root"
+
+            # For extras, module is same as course
+            if course == "extras":
+                module = "extras"
+            else:
+                module = relative_path.parts[1] if len(relative_path.parts) > 1 else "root"
+
+            category = self._categorize_lesson(course, module, filename)
+
+            relpath = relative_path.as_posix()
+            lesson_id = self._lesson_id_for_path(relpath)
+            self._unindex_lesson(lesson_id)
 
-        for line in lines:
-            line = line.strip()
-            # Look for # Title or ## Title
-            if line.startswith('# '):
-                return line.lstrip('# ').strip()
-            elif line.startswith('## ') and len(line) > 3:
-                return line.lstrip('## ').strip()
+            # One parsing pass: title, heading tree, chunks and per-chunk token counts
+            lesson = LessonRecord.parse(
+                raw,
+                lesson_id=lesson_id,
+                filename=filename,
+                filepath=str(file_path),
+                relpath=relpath,
+                course=course,
+                module=module,
+                category=category,
+                mtime_ns=stat.st_mtime_ns,
+                file_size=stat.st_size,
+                content_hash=hashlib.sha256(raw).hexdigest(),
+                chunk_max_chars=self.chunk_max_chars
+            )
+            self._compute_lesson_sizes(lesson)
+            self._index_lesson(lesson)
+            self.lessons_cache[lesson_id] = lesson
+            self._ids_by_path[relpath] = lesson_id
+
+            logger.debug(f"Loaded lesson {lesson_id}: {lesson.title} [{course}/{module}]")
+            return lesson_id
+
+        except Exception as e:
+            logger.error(f"Error loading {file_path}: {e}")
+            return None
+
+    def _remove_lesson(self, lesson_id: int) -> None:
+        """
+        Drop a lesson from the cache and all derived indexes
+
+        Args:
+            lesson_id: Lesson ID
+        """
+        self._unindex_lesson(lesson_id)
+        lesson = self.lessons_cache.pop(lesson_id, None)
+        if lesson is not None:
+            self._ids_by_path.pop(lesson.relpath, None)
+
+    def _reorder_lessons(self) -> None:
+        """Keep lessons_cache in corpus order (relative path) and refresh positions"""
+        ordered = sorted(self.lessons_cache.values(), key=lambda lesson: lesson.relpath)
+        self.lessons_cache = {lesson.id: lesson for lesson in ordered}
+        self._positions = {lesson_id: position for position, lesson_id in enumerate(self.lessons_cache)}
+
+    def reload_changed(self) -> Dict[str, List[int]]:
+        """
+        Apply lesson file changes incrementally (hot reload)
+
+        Equivalent to stage_reload() followed by apply_reload().
+
+        Returns:
+            Dictionary with lists of added, updated and removed lesson IDs
+        """
+        staged, changes = self.stage_reload()
+        if staged is not None:
+            self.apply_reload(staged, changes)
+        return changes
+
+    def stage_reload(self) -> Tuple[Optional["ContextService"], Dict[str, List[int]]]:
+        """
+        Build the reloaded corpus on a copy of the service, leaving this one untouched
+
+        Only added, modified (by mtime/size, confirmed by content hash) and
+        deleted files are processed; their chunks are updated in copies of
+        the lexical index and vector store. Requests keep reading the
+        current corpus meanwhile, so this may run in a worker thread.
+
+        Returns:
+            Tuple of (staged service or None if nothing changed, dictionary
+            with lists of added, updated and removed lesson IDs)
+        """
+        changes: Dict[str, List[int]] = {"added": [], "updated": [], "removed": []}
+        if not self.lessons_dir.exists():
+            return None, changes
+
+        files = {
+            path.relative_to(self.lessons_dir).as_posix(): path
+            for path in self._scan_lesson_files()
+        }
+
+        removed = [relpath for relpath in self._ids_by_path if relpath not in files]
+        changed_paths = []
+        for relpath, path in files.items():
+            lesson_id = self._ids_by_path.get(relpath)
+            if lesson_id is not None:
+                lesson = self.lessons_cache[lesson_id]
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if stat.st_mtime_ns == lesson.mtime_ns and stat.st_size == lesson.file_size:
+                    continue
+                if stat.st_size == lesson.file_size and file_sha256(path) == lesson.content_hash:
+                    # Content unchanged (e.g. touch); remember the new mtime
+                    lesson.mtime_ns = stat.st_mtime_ns
+                    continue
+            changed_paths.append((path, lesson_id))
+
+        if not removed and not changed_paths:
+            return None, changes
+
+        # Records are copied because storing the new content rebinds them to another buffer
+        staged = copy.copy(self)
+        staged.lessons_cache = {lesson_id: copy.copy(lesson) for lesson_id, lesson in self.lessons_cache.items()}
+        staged._ids_by_path = dict(self._ids_by_path)
+        staged.lexical_index = self.lexical_index.copy()
+        if self.vector_store is not None:
+            staged.vector_store = VectorStore(self.vector_store.index_dir, self.vector_store.encoder)
+
+        for relpath in removed:
+            lesson_id = staged._ids_by_path[relpath]
+            staged._remove_lesson(lesson_id)
+            changes["removed"].append(lesson_id)
+
+        for path, lesson_id in changed_paths:
+            loaded_id = staged._load_lesson_file(path)
+            if loaded_id is not None:
+                changes["updated" if lesson_id is not None else "added"].append(loaded_id)
+
+        if not changes["added"] and not changes["updated"] and not changes["removed"]:
+            return None, changes
+
+        staged._reorder_lessons()
+        staged._sync_vector_store()
+        staged._store_content()
+        return staged, changes
+
+    def apply_reload(self, staged: "ContextService", changes: Dict[str, List[int]]) -> None:
+        """
+        Switch to a corpus built by stage_reload()
 
-        # Fallback to filename without extension
-        return filename.replace('.md', '').replace('.txt', '').replace('-', ' ').replace('_', ' ')
+        Only swaps references, so calling it on the event loop makes the
+        update visible to requests all at once.
+
+        Args:
+            staged: Staged service returned by stage_reload()
+            changes: Changes returned by stage_reload()
+        """
+        self.lessons_cache = staged.lessons_cache
+        self._ids_by_path = staged._ids_by_path
+        self._positions = staged._positions
+        self.lexical_index = staged.lexical_index
+        self.vector_store = staged.vector_store
+        self._invalidate_contexts(changes["added"] + changes["updated"] + changes["removed"])
+
+        logger.info(
+            f"Lessons reloaded (corpus v{self.corpus_version}): "
+            f"{len(changes['added'])} added, {len(changes['updated'])} updated, "
+            f"{len(changes['removed'])} removed"
+        )
+
+    def _snapshot_settings(self) -> Dict:
+        """Build settings that a corpus snapshot must match (anything affecting derived data)"""
+        return snapshot_settings(
+            parser=self._PARSER_VERSION,
+            chunk_max_chars=self.chunk_max_chars,
+            tokenizers=sorted(t.signature for t in get_tokenizers().values())
+        )
+
+    def _manifest(self) -> List[Tuple[str, int, int, str]]:
+        """Source files of the loaded lessons as recorded in a snapshot manifest"""
+        return [
+            (lesson.relpath, lesson.mtime_ns, lesson.file_size, lesson.content_hash)
+            for lesson in self.lessons_cache.values()
+        ]
+
+    def _write_snapshot(self, settings: Dict) -> bool:
+        """
+        Persist parsed lessons and the lexical index as a corpus snapshot
+
+        Args:
+            settings: Build settings from _snapshot_settings
+
+        Returns:
+            True if the snapshot was written
+        """
+        lessons = list(self.lessons_cache.values())
+        if len(lessons) != len(self._scan_lesson_files()):
+            # Some files failed to parse; keep re-parsing until they are fixed
+            logger.warning("Not writing corpus snapshot: some lessons failed to load")
+            return False
+
+        metadata = {
+            "settings": settings,
+            "manifest": self._manifest(),
+            "lessons": [lesson.to_state() for lesson in lessons],
+            "lexical_index": self.lexical_index.get_state()
+        }
+        try:
+            write_snapshot(self.snapshot_path, metadata, [lesson.view() for lesson in lessons])
+        except OSError as e:
+            logger.warning(f"Cannot write corpus snapshot {self.snapshot_path}: {e}")
+            return False
+        return True
+
+    def _store_content(self) -> None:
+        """
+        Move all lesson texts into one contiguous buffer
+
+        With a snapshot path the snapshot is (re)written and its
+        memory-mapped content blob becomes the buffer: the pages are backed
+        by the page cache and shared by all worker processes instead of
+        being private heap memory of each. Otherwise the texts are joined
+        into a single bytes object.
+        """
+        lessons = list(self.lessons_cache.values())
+        if self.snapshot_path and self._write_snapshot(self._snapshot_settings()):
+            snapshot = read_snapshot(self.snapshot_path)
+            if snapshot is not None:
+                # Another process may have replaced the file in the meantime
+                if snapshot.metadata.get("manifest") == self._manifest():
+                    blob = snapshot.blob()
+                    for lesson, record in zip(lessons, snapshot.metadata["lessons"]):
+                        lesson.rebind(blob, record["offset"])
+                    return
+                snapshot.close()
+
+        buffer = memoryview(b"".join([lesson.view() for lesson in lessons]))
+        offset = 0
+        for lesson in lessons:
+            lesson.rebind(buffer, offset)
+            offset += lesson.size_bytes
+
+    def _restore_snapshot(self, snapshot: CorpusSnapshot) -> None:
+        """
+        Fill lessons_cache and the lexical index from a validated snapshot
+
+        Args:
+            snapshot: Validated corpus snapshot
+        """
+        blob = snapshot.blob()
+        for record in snapshot.metadata["lessons"]:
+            lesson = LessonRecord.from_state(
+                record,
+                buffer=blob,
+                offset=record["offset"],
+                filepath=str(self.lessons_dir / record["relpath"])
+            )
+            self.lessons_cache[lesson.id] = lesson
+            self._ids_by_path[lesson.relpath] = lesson.id
+        self.lexical_index.load_state(snapshot.metadata["lexical_index"])
+        self._reorder_lessons()
+
+    def _invalidate_contexts(self, lesson_ids: List[int]) -> None:
+        """
+        Bump the corpus version and drop cached contexts that include given lessons
+
+        Args:
+            lesson_ids: IDs of added, changed or removed lessons
+        """
+        self.corpus_version += 1
+        changed = set(lesson_ids)
+        for key in [key for key in self._context_cache if changed.intersection(key)]:
+            del self._context_cache[key]
+
+    def _bump_corpus_version(self) -> None:
+        """Mark the lesson corpus as changed and drop everything derived from it"""
+        self.corpus_version += 1
+        self._context_cache.clear()
+
+    def _lesson_header(self, lesson: LessonRecord) -> str:
+        """
+        Build the framing block that precedes a lesson in the context
+
+        Args:
+            lesson: Lesson record
+
+        Returns:
+            Header string (separator, lesson id/title, module, separator)
+        """
+        separator = '=' * 80
+        return (
+            f"\n{separator}\n"
+            f"LESSON {lesson.id}: {lesson.title}\n"
+            f"Module: {lesson.module or 'N/A'}\n"
+            f"{separator}\n\n"
+        )
+
+    def _compute_lesson_sizes(self, lesson: LessonRecord) -> None:
+        """
+        Precompute context size of a lesson, framing included
+
+        Sets context_chars and token_counts ({tokenizer name: tokens})
+        so estimates can be summed without building the context string.
+
+        Args:
+            lesson: Lesson record (updated in place)
+        """
+        header = self._lesson_header(lesson)
+        content = lesson.content
+        lesson.context_chars = len(header) + len(content) + len(self._LESSON_FOOTER)
+        header_tokens = count_all(header)
+        lesson.token_counts = {
+            name: header_tokens[name] + tokens for name, tokens in count_all(content).items()
+        }
+
+    def _index_lesson(self, lesson: LessonRecord) -> None:
+        """
+        Add a lesson's heading-aware chunks to the lexical index
+
+        Args:
+            lesson: Lesson record
+        """
+        for index in range(lesson.chunk_count):
+            terms = analyze(lesson.chunk_headings[index])
+            terms.extend(analyze(lesson.chunk_text(index)))
+            self.lexical_index.add_document((lesson.id, index), terms)
+
+    def _unindex_lesson(self, lesson_id: int) -> None:
+        """
+        Remove a lesson's chunks from the lexical index
+
+        Args:
+            lesson_id: Lesson ID
+        """
+        lesson = self.lessons_cache.get(lesson_id)
+        if lesson is None:
+            return
+        for index in range(lesson.chunk_count):
+            self.lexical_index.remove_document((lesson_id, index))
+
+    def _chunk_text(self, lesson: LessonRecord, chunk_index: int) -> str:
+        """
+        Get the text of a chunk prefixed with its heading path
+
+        Args:
+            lesson: Lesson record
+            chunk_index: Chunk index
+
+        Returns:
+            Heading path and chunk body
+        """
+        return f"{lesson.chunk_headings[chunk_index]}\n{lesson.chunk_text(chunk_index)}"
+
+    def _sync_vector_store(self) -> None:
+        """Embed new or changed chunks; unchanged chunks are reused by content hash"""
+        if self.vector_store is None:
+            return
+        items = [
+            ((lesson_id, chunk_index), self._chunk_text(lesson, chunk_index))
+            for lesson_id, lesson in self.lessons_cache.items()
+            for chunk_index in range(lesson.chunk_count)
+        ]
+        try:
+            self.vector_store.sync(items)
+        except Exception as e:
+            logger.error(f"Vector store sync failed, semantic retrieval disabled: {e}", exc_info=True)
+            self.vector_store = None
 
     def _categorize_lesson(self, course: str, module: str, filename: str) -> str:
         """
@@ -138,49 +595,349 @@ class ContextService:
         """
         return [
             {
-                "id": lesson["id"],
-                "title": lesson["title"],
-                "filename": lesson["filename"],
-                "course": lesson.get("course", "unknown"),
-                "module": lesson.get("module", "unknown")
+                "id": lesson.id,
+                "title": lesson.title,
+                "filename": lesson.filename,
+                "course": lesson.course or "unknown",
+                "module": lesson.module or "unknown"
             }
-            for lesson in sorted(self.lessons_cache.values(), key=lambda x: x["id"])
+            for lesson in self.lessons_cache.values()
         ]
 
     def build_context(self, lesson_ids: Optional[List[int]] = None) -> str:
         """
         Build context string from selected lessons
 
+        The selection is canonicalized (unknown IDs dropped, duplicates removed,
+        lessons in corpus order), so any ordering of the same lesson set maps to
+        the same cached context string.
+
         Args:
             lesson_ids: List of lesson IDs to include. If None, includes all lessons
 
         Returns:
             Combined context string
         """
-        if lesson_ids is None or len(lesson_ids) == 0:
-            # Include all lessons
-            lesson_ids = list(self.lessons_cache.keys())
+        key = self._canonical_lesson_ids(lesson_ids)
+
+        cached = self._context_cache.get(key)
+        if cached is not None:
+            self._context_cache.move_to_end(key)
+            self._context_cache_hits += 1
+            logger.debug(f"Context cache hit: {len(key)} lessons (corpus v{self.corpus_version})")
+            return cached
+
+        self._context_cache_misses += 1
+        context = self._assemble_context(key)
+
+        if self._context_cache_size > 0:
+            self._context_cache[key] = context
+            while len(self._context_cache) > self._context_cache_size:
+                self._context_cache.popitem(last=False)
+
+        return context
+
+    def _canonical_lesson_ids(self, lesson_ids: Optional[List[int]]) -> Tuple[int, ...]:
+        """
+        Normalize a lesson selection into the context cache key
 
-        context_parts = []
-        lessons_included = 0
+        Args:
+            lesson_ids: Requested lesson IDs. None or empty means all lessons
+
+        Returns:
+            Tuple of unique, known lesson IDs in corpus order
+        """
+        if not lesson_ids:
+            return tuple(self.lessons_cache)
+        return tuple(sorted(
+            {i for i in lesson_ids if i in self.lessons_cache},
+            key=self._positions.__getitem__
+        ))
+
+    def _assemble_context(self, lesson_ids: Tuple[int, ...]) -> str:
+        """
+        Join the given lessons into a single context string
+
+        Args:
+            lesson_ids: Canonical tuple of lesson IDs
+
+        Returns:
+            Combined context string
+        """
+        # Lesson bodies are copied straight from the content buffer (one copy, one decode)
+        context_parts: List = []
 
         for lesson_id in lesson_ids:
-            if lesson_id in self.lessons_cache:
-                lesson = self.lessons_cache[lesson_id]
-                context_parts.append(f"\n{'=' * 80}")
-                context_parts.append(f"LESSON {lesson['id']}: {lesson['title']}")
-                context_parts.append(f"Module: {lesson.get('module', 'N/A')}")
-                context_parts.append(f"{'=' * 80}\n")
-                context_parts.append(lesson['content'])
-                context_parts.append("\n")
-                lessons_included += 1
+            if context_parts:
+                context_parts.append(b"\n")
+            self._append_lesson(context_parts, self.lessons_cache[lesson_id])
 
-        context = "\n".join(context_parts)
-        logger.info(f"Built context with {lessons_included} lessons, {len(context)} characters")
+        context = b"".join(context_parts).decode("utf-8")
+        logger.info(f"Built context with {len(lesson_ids)} lessons, {len(context)} characters")
 
         return context
 
-    def get_lesson(self, lesson_id: int) -> Optional[Dict]:
+    def pack_context(
+        self,
+        lesson_ids: Optional[List[int]] = None,
+        token_budget: Optional[int] = None,
+        model: Optional[str] = None,
+        query: Optional[str] = None
+    ) -> Tuple[str, List[int], List[int], List[int]]:
+        """
+        Build context from selected lessons, fitted into a token budget
+
+        If the selection fits, this is build_context() (cached). Otherwise
+        lessons are taken in priority order: by relevance to the query when
+        it matches any chunk, then in selection order. A lesson that does not
+        fit whole is cut at the last chunk (heading/paragraph) boundary that
+        fits; lessons with no room left are dropped. Included lessons keep
+        corpus order in the context.
+
+        Args:
+            lesson_ids: List of lesson IDs to include. If None, includes all lessons
+            token_budget: Maximum tokens for the context (None = unlimited)
+            model: Model ID whose tokenizer measures the budget
+            query: Optional user question used to prioritize lessons
+
+        Returns:
+            Tuple of (context string, included IDs, truncated IDs, dropped IDs)
+        """
+        canonical = self._canonical_lesson_ids(lesson_ids)
+        tokenizer = get_tokenizer(model)
+        total_tokens = sum(self.lessons_cache[i].token_counts[tokenizer.name] for i in canonical)
+        if token_budget is None or total_tokens <= token_budget:
+            return self.build_context(lesson_ids), list(canonical), [], []
+
+        remaining = token_budget
+        cut_offsets: Dict[int, Optional[int]] = {}  # lesson_id -> content end byte (None = whole lesson)
+        truncated: List[int] = []
+        dropped: List[int] = []
+        for lesson_id in self._packing_order(lesson_ids, canonical, query):
+            lesson = self.lessons_cache[lesson_id]
+            lesson_tokens = lesson.token_counts[tokenizer.name]
+            if lesson_tokens <= remaining:
+                cut_offsets[lesson_id] = None
+                remaining -= lesson_tokens
+                continue
+            end, used_tokens = self._truncate_lesson(lesson, remaining, tokenizer)
+            if end:
+                cut_offsets[lesson_id] = end
+                truncated.append(lesson_id)
+                remaining -= used_tokens
+            else:
+                dropped.append(lesson_id)
+
+        included = sorted(cut_offsets, key=self._positions.__getitem__)
+        context_parts: List = []
+        for lesson_id in included:
+            lesson = self.lessons_cache[lesson_id]
+            if context_parts:
+                context_parts.append(b"\n")
+            self._append_lesson(context_parts, lesson, cut_offsets[lesson_id])
+
+        context = b"".join(context_parts).decode("utf-8")
+        logger.info(
+            f"Packed context into {token_budget} tokens: {len(included)} lessons "
+            f"({len(truncated)} truncated), {len(dropped)} dropped, {len(context)} characters"
+        )
+        return context, included, truncated, dropped
+
+    def _append_lesson(self, context_parts: List, lesson: LessonRecord, end: Optional[int] = None) -> None:
+        """
+        Append a framed lesson, optionally cut, to byte context parts
+
+        Args:
+            context_parts: UTF-8 parts of the context being built
+            lesson: Lesson record
+            end: Byte offset to cut the lesson at (None = whole lesson)
+        """
+        context_parts.append(self._lesson_header(lesson).encode("utf-8"))
+        if end is None:
+            context_parts.append(lesson.view())
+        else:
+            context_parts.append(_strip_newlines(lesson.view(0, end), leading=False))
+            context_parts.append(f"\n\n{self._TRUNCATION_NOTE}".encode("utf-8"))
+        context_parts.append(self._LESSON_FOOTER.encode("utf-8"))
+
+    def _packing_order(
+        self,
+        lesson_ids: Optional[List[int]],
+        canonical: Tuple[int, ...],
+        query: Optional[str]
+    ) -> List[int]:
+        """
+        Order lessons for packing: query relevance first, then selection order
+
+        Args:
+            lesson_ids: Lesson IDs as selected by the user (None = all lessons)
+            canonical: Canonical tuple of the same selection
+            query: Optional user question
+
+        Returns:
+            Lesson IDs, most important first
+        """
+        if lesson_ids:
+            order = list(dict.fromkeys(i for i in lesson_ids if i in self.lessons_cache))
+        else:
+            order = list(canonical)
+        if not query:
+            return order
+
+        allowed = set(order)
+        best_scores: Dict[int, float] = {}
+        for (lesson_id, _), score in self.lexical_index.search(
+            analyze(query), top_k=200, doc_filter=lambda key: key[0] in allowed
+        ):
+            best_scores.setdefault(lesson_id, score)
+
+        selection_rank = {lesson_id: rank for rank, lesson_id in enumerate(order)}
+        return sorted(order, key=lambda i: (-best_scores.get(i, 0.0), selection_rank[i]))
+
+    def _truncate_lesson(self, lesson: LessonRecord, token_budget: int, tokenizer) -> Tuple[int, int]:
+        """
+        Find the longest chunk-aligned prefix of a lesson that fits a token budget
+
+        Uses the per-chunk token counts from load time.
+
+        Args:
+            lesson: Lesson record
+            token_budget: Tokens available for the lesson, header and truncation note included
+            tokenizer: Tokenizer measuring the budget
+
+        Returns:
+            Tuple of (content end byte offset, tokens used); end is 0 if not even the first chunk fits
+        """
+        used_tokens = tokenizer.count(self._lesson_header(lesson)) + tokenizer.count(self._TRUNCATION_NOTE)
+        end = 0
+        for chunk_end, chunk_tokens in zip(lesson.chunk_ends, lesson.chunk_tokens[tokenizer.name]):
+            if used_tokens + chunk_tokens > token_budget:
+                break
+            used_tokens += chunk_tokens
+            end = chunk_end
+        return end, used_tokens
+
+    def retrieve_chunks(
+        self,
+        query: str,
+        lesson_ids: Optional[List[int]] = None,
+        top_k: int = 12,
+        token_budget: Optional[int] = None,
+        model: Optional[str] = None,
+        mode: str = "lexical"
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Select the most relevant lesson chunks for a query
+
+        Chunks are taken in score order while they fit into token_budget;
+        a chunk that does not fit is skipped in favour of smaller ones.
+
+        Args:
+            query: User question
+            lesson_ids: Restrict search to these lessons. None or empty = all lessons
+            top_k: Maximum number of chunks
+            token_budget: Maximum total tokens of selected chunks (None = unlimited)
+            model: Model ID whose tokenizer measures the budget
+            mode: 'lexical' (BM25) or 'semantic' (embeddings; falls back to lexical if unavailable)
+
+        Returns:
+            List of (lesson_id, chunk_index, score) in score order
+        """
+        allowed = set(lesson_ids) if lesson_ids else None
+
+        # Over-fetch so budget-skipped chunks can be replaced by lower-ranked ones
+        if mode == "semantic" and self.vector_store is not None:
+            candidates = self.vector_store.search(query, top_k=top_k * 4, groups=allowed)
+        else:
+            if mode == "semantic":
+                logger.warning("Semantic retrieval unavailable, using lexical retrieval")
+            doc_filter = (lambda key: key[0] in allowed) if allowed is not None else None
+            candidates = self.lexical_index.search(analyze(query), top_k=top_k * 4, doc_filter=doc_filter)
+
+        tokenizer_name = get_tokenizer(model).name
+        selected: List[Tuple[int, int, float]] = []
+        used_tokens = 0
+        for (lesson_id, chunk_index), score in candidates:
+            if len(selected) >= top_k:
+                break
+            if token_budget is not None:
+                chunk_tokens = self.lessons_cache[lesson_id].chunk_tokens[tokenizer_name][chunk_index]
+                if used_tokens + chunk_tokens > token_budget:
+                    continue
+                used_tokens += chunk_tokens
+            selected.append((lesson_id, chunk_index, score))
+
+        return selected
+
+    def build_query_context(
+        self,
+        query: str,
+        lesson_ids: Optional[List[int]] = None,
+        top_k: int = 12,
+        token_budget: Optional[int] = None,
+        model: Optional[str] = None,
+        mode: str = "lexical"
+    ) -> Tuple[str, List[int]]:
+        """
+        Build context from the chunks most relevant to a query
+
+        Selected chunks are grouped per lesson (in lesson order) under the
+        usual lesson header, each prefixed with its heading path.
+
+        Args:
+            query: User question
+            lesson_ids: Restrict retrieval to these lessons. None or empty = all lessons
+            top_k: Maximum number of chunks
+            token_budget: Maximum tokens of retrieved text
+            model: Model ID whose tokenizer measures the budget
+            mode: 'lexical' or 'semantic'
+
+        Returns:
+            Tuple of (context string, IDs of lessons that contributed chunks)
+        """
+        selected = self.retrieve_chunks(query, lesson_ids, top_k, token_budget, model, mode)
+
+        by_lesson: Dict[int, List[int]] = {}
+        for lesson_id, chunk_index, _ in selected:
+            by_lesson.setdefault(lesson_id, []).append(chunk_index)
+
+        context_parts: List = []
+        footer = self._LESSON_FOOTER.encode("utf-8")
+        ordered_ids = sorted(by_lesson, key=self._positions.__getitem__)
+        for lesson_id in ordered_ids:
+            lesson = self.lessons_cache[lesson_id]
+            if context_parts:
+                context_parts.append(b"\n")
+            context_parts.append(self._lesson_header(lesson).encode("utf-8"))
+            for chunk_index in sorted(by_lesson[lesson_id]):
+                heading = lesson.chunk_headings[chunk_index] or lesson.title
+                context_parts.append(f"[Section: {heading}]\n".encode("utf-8"))
+                context_parts.append(_strip_newlines(lesson.view(lesson.chunk_starts[chunk_index], lesson.chunk_ends[chunk_index])))
+                context_parts.append(footer)
+
+        context = b"".join(context_parts).decode("utf-8")
+        logger.info(
+            f"Built query context with {len(selected)} chunks from {len(by_lesson)} lessons, "
+            f"{len(context)} characters"
+        )
+        return context, ordered_ids
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        Get context cache effectiveness counters
+
+        Returns:
+            Dictionary with hits, misses, current size, max size and corpus version
+        """
+        return {
+            "hits": self._context_cache_hits,
+            "misses": self._context_cache_misses,
+            "size": len(self._context_cache),
+            "max_size": self._context_cache_size,
+            "corpus_version": self.corpus_version
+        }
+
+    def get_lesson(self, lesson_id: int) -> Optional[LessonRecord]:
         """
         Get specific lesson by ID
 
@@ -188,11 +945,207 @@ class ContextService:
             lesson_id: Lesson ID
 
         Returns:
-            Lesson dictionary or None if not found
+            Lesson record or None if not found
         """
         return self.lessons_cache.get(lesson_id)
 
-    def get_lessons_by_module(self, module: str) -> List[Dict]:
+    def get_section(self, lesson_id: int, section_id: str) -> Optional[Section]:
+        """
+        Get a section of a lesson's heading tree
+
+        Args:
+            lesson_id: Lesson ID
+            section_id: Section ID from the lesson's sections
+
+        Returns:
+            Section or None if not found
+        """
+        lesson = self.lessons_cache.get(lesson_id)
+        if lesson is None:
+            return None
+        return lesson.get_section(section_id)
+
+    def get_lesson_range(
+        self,
+        lesson_id: int,
+        start: int = 0,
+        end: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Read part of a lesson by UTF-8 byte offsets
+
+        Offsets inside a multi-byte character are moved to the character
+        boundary. A range longer than max_bytes is cut at the last line
+        break that fits, and next_start tells where the rest begins.
+
+        Args:
+            lesson_id: Lesson ID
+            start: First byte
+            end: Byte after the last one (None = end of lesson)
+            max_bytes: Maximum size of the returned part (None = unlimited)
+
+        Returns:
+            Dictionary with start, end, size, content and next_start, or None if the lesson is unknown
+        """
+        lesson = self.lessons_cache.get(lesson_id)
+        if lesson is None:
+            return None
+        data = lesson.view()
+        size = len(data)
+        requested_end = size if end is None else max(0, min(end, size))
+        start = max(0, min(start, requested_end))
+        # UTF-8 continuation bytes are 0b10xxxxxx
+        while start < requested_end and data[start] & 0xC0 == 0x80:
+            start += 1
+        stop = requested_end
+        if max_bytes is not None and stop - start > max_bytes:
+            stop = start + max_bytes
+            newline = bytes(data[start:stop]).rfind(b"\n")
+            if newline != -1:
+                stop = start + newline + 1
+        while start < stop < size and data[stop] & 0xC0 == 0x80:
+            stop -= 1
+        if stop == start < requested_end:
+            # Always make progress, even if max_bytes is smaller than one character
+            stop = start + 1
+            while stop < size and data[stop] & 0xC0 == 0x80:
+                stop += 1
+        return {
+            "start": start,
+            "end": stop,
+            "size": size,
+            "content": str(data[start:stop], "utf-8"),
+            "next_start": stop if stop < requested_end else None
+        }
+
+    def get_section_path(self, lesson: LessonRecord, section: Section) -> str:
+        """
+        Get the " > "-joined heading path of a section
+
+        Args:
+            lesson: Lesson record
+            section: Section of that lesson
+
+        Returns:
+            Heading titles from the top-level ancestor down to the section
+        """
+        by_id = {item.id: item for item in lesson.sections}
+        titles = [section.title]
+        parent = section.parent
+        while parent is not None:
+            titles.append(by_id[parent].title)
+            parent = by_id[parent].parent
+        return " > ".join(reversed(titles))
+
+    def pack_sections(
+        self,
+        section_refs: List[str],
+        lesson_ids: Optional[List[int]] = None,
+        token_budget: Optional[int] = None,
+        model: Optional[str] = None
+    ) -> Tuple[str, List[int], List[int], List[str]]:
+        """
+        Build context from pinned sections plus optional whole lessons
+
+        Pinned sections take priority over whole lessons; a section is
+        skipped when its whole lesson is included anyway, and nested or
+        overlapping sections of a lesson are merged. Items that do not fit
+        the token budget are dropped (whole lessons are cut at a chunk
+        boundary instead when possible).
+
+        Args:
+            section_refs: '<lesson_id>#<section_id>' references
+            lesson_ids: Lessons to include in full (None or empty = none)
+            token_budget: Maximum tokens for the context (None = unlimited)
+            model: Model ID whose tokenizer measures the budget
+
+        Returns:
+            Tuple of (context string, included lesson IDs, truncated lesson IDs,
+            labels of dropped lessons/sections)
+
+        Raises:
+            ValueError: If a reference is malformed or unknown
+        """
+        whole_ids = list(dict.fromkeys(i for i in (lesson_ids or []) if i in self.lessons_cache))
+        pinned: List[Tuple[int, Section]] = []
+        for ref in section_refs:
+            lesson_id, section_id = parse_section_ref(ref)
+            section = self.get_section(lesson_id, section_id)
+            if section is None:
+                raise ValueError(f"Unknown section: {ref}")
+            if lesson_id not in whole_ids:
+                pinned.append((lesson_id, section))
+
+        tokenizer = get_tokenizer(model)
+        remaining = token_budget
+        ranges: Dict[int, List[Tuple[int, int]]] = {}  # lesson_id -> (start, end) byte ranges of sections
+        cut_offsets: Dict[int, Optional[int]] = {}  # whole lessons: content end byte (None = whole lesson)
+        truncated: List[int] = []
+        dropped: List[str] = []
+
+        for lesson_id, section in pinned:
+            lesson = self.lessons_cache[lesson_id]
+            cost = lesson.tokens_between(tokenizer.name, section.start, section.end)
+            if lesson_id not in ranges:
+                cost += tokenizer.count(self._lesson_header(lesson))
+            if remaining is not None and cost > remaining:
+                dropped.append(f"{lesson.title} > {section.title}")
+                continue
+            if remaining is not None:
+                remaining -= cost
+            ranges.setdefault(lesson_id, []).append((section.start, section.end))
+
+        for lesson_id in whole_ids:
+            lesson = self.lessons_cache[lesson_id]
+            lesson_tokens = lesson.token_counts[tokenizer.name]
+            if remaining is None or lesson_tokens <= remaining:
+                cut_offsets[lesson_id] = None
+                if remaining is not None:
+                    remaining -= lesson_tokens
+                continue
+            end, used_tokens = self._truncate_lesson(lesson, remaining, tokenizer)
+            if end:
+                cut_offsets[lesson_id] = end
+                truncated.append(lesson_id)
+                remaining -= used_tokens
+            else:
+                dropped.append(lesson.title)
+
+        included = sorted(set(ranges) | set(cut_offsets), key=self._positions.__getitem__)
+        context_parts: List = []
+        footer = self._LESSON_FOOTER.encode("utf-8")
+        for lesson_id in included:
+            lesson = self.lessons_cache[lesson_id]
+            if context_parts:
+                context_parts.append(b"\n")
+            if lesson_id in cut_offsets:
+                self._append_lesson(context_parts, lesson, cut_offsets[lesson_id])
+                continue
+
+            context_parts.append(self._lesson_header(lesson).encode("utf-8"))
+
+            # Merge nested/overlapping sections, keep document order
+            merged: List[List[int]] = []
+            for start, end in sorted(ranges[lesson_id]):
+                if merged and start < merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            starts = {section.start: section for section in lesson.sections}
+            for start, end in merged:
+                context_parts.append(f"[Section: {self.get_section_path(lesson, starts[start])}]\n".encode("utf-8"))
+                context_parts.append(_strip_newlines(lesson.view(start, end)))
+                context_parts.append(footer)
+
+        context = b"".join(context_parts).decode("utf-8")
+        logger.info(
+            f"Built section context: {len(pinned)} pinned sections, {len(cut_offsets)} whole lessons "
+            f"({len(truncated)} truncated), {len(dropped)} dropped, {len(context)} characters"
+        )
+        return context, included, truncated, dropped
+
+    def get_lessons_by_module(self, module: str) -> List[LessonRecord]:
         """
         Get all lessons from a specific module
 
@@ -204,7 +1157,7 @@ class ContextService:
         """
         return [
             lesson for lesson in self.lessons_cache.values()
-            if lesson.get("module", "").lower() == module.lower()
+            if (lesson.module or "").lower() == module.lower()
         ]
 
     def get_lesson_titles(self, lesson_ids: List[int]) -> List[str]:
@@ -220,7 +1173,7 @@ class ContextService:
         titles = []
         for lesson_id in lesson_ids:
             if lesson_id in self.lessons_cache:
-                titles.append(self.lessons_cache[lesson_id]["title"])
+                titles.append(self.lessons_cache[lesson_id].title)
         return titles
 
     def get_total_lessons(self) -> int:
@@ -237,8 +1190,8 @@ class ContextService:
         grouped = {}
 
         for lesson in self.lessons_cache.values():
-            course = lesson.get("course", "unknown")
-            module = lesson.get("module", "unknown")
+            course = lesson.course or "unknown"
+            module = lesson.module or "unknown"
 
             if course not in grouped:
                 grouped[course] = {}
@@ -247,9 +1200,9 @@ class ContextService:
                 grouped[course][module] = []
 
             grouped[course][module].append({
-                "id": lesson["id"],
-                "title": lesson["title"],
-                "filename": lesson["filename"]
+                "id": lesson.id,
+                "title": lesson.title,
+                "filename": lesson.filename
             })
 
         return grouped
@@ -266,21 +1219,42 @@ class ContextService:
             List of lesson IDs in that module
         """
         return [
-            lesson["id"] for lesson in self.lessons_cache.values()
-            if lesson.get("course") == course and lesson.get("module") == module
+            lesson.id for lesson in self.lessons_cache.values()
+            if lesson.course == course and lesson.module == module
         ]
 
-    def estimate_tokens(self, lesson_ids: Optional[List[int]] = None) -> int:
+    def estimate_tokens(self, lesson_ids: Optional[List[int]] = None, model: Optional[str] = None) -> int:
         """
         Estimate number of tokens for given lessons
-        Uses approximation: 1 token ≈ 4 characters
+
+        Sums per-lesson counts precomputed at load time (framing included),
+        so no context string is built.
 
         Args:
             lesson_ids: List of lesson IDs. If None, estimates for all lessons
+            model: Model ID whose tokenizer should be used (None = generic 4 chars/token)
 
         Returns:
             Estimated token count
         """
-        context = self.build_context(lesson_ids)
-        # Rough estimate: 1 token ≈ 4 characters for English text
-        return len(context) // 4
+        tokenizer_name = get_tokenizer(model).name
+        return sum(
+            self.lessons_cache[lesson_id].token_counts[tokenizer_name]
+            for lesson_id in self._canonical_lesson_ids(lesson_ids)
+        )
+
+    def estimate_context_chars(self, lesson_ids: Optional[List[int]] = None) -> int:
+        """
+        Get exact length of the context build_context() would return
+
+        Args:
+            lesson_ids: List of lesson IDs. If None, uses all lessons
+
+        Returns:
+            Context length in characters
+        """
+        key = self._canonical_lesson_ids(lesson_ids)
+        if not key:
+            return 0
+        # Lessons are joined with a single newline
+        return sum(self.lessons_cache[lesson_id].context_chars for lesson_id in key) + len(key) - 1
@@ -0,0 +1,186 @@
+"""
+Corpus Snapshot - Compiled, memory-mappable lesson corpus for fast cold start
+
+File layout:
+    MAGIC (8 bytes) | metadata length (uint64 LE) | metadata (marshal) | content blob (UTF-8)
+
+The metadata holds the source manifest, build settings, lesson records
+(with byte offsets into the content blob) and precomputed index state.
+marshal is used because it loads plain dicts/lists/tuples an order of
+magnitude faster than JSON; its format is tied to the Python version,
+which is therefore part of the validated settings.
+"""
+import hashlib
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ALCSNAP1"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<Q")
+
+# (relative path, mtime_ns, size, sha256)
+ManifestEntry = Tuple[str, int, int, str]
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Hash file contents
+
+    Args:
+        path: File path
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def snapshot_settings(**settings: Any) -> Dict[str, Any]:
+    """
+    Build the settings a snapshot must match to be reusable
+
+    Args:
+        **settings: Build parameters that affect derived data (chunk size, tokenizers, ...)
+
+    Returns:
+        Settings dictionary including format and Python version
+    """
+    return {
+        "format": FORMAT_VERSION,
+        "python": f"{sys.version_info[0]}.{sys.version_info[1]}",
+        **settings
+    }
+
+
+class CorpusSnapshot:
+    """Read-only view of a snapshot file backed by mmap"""
+
+    def __init__(self, path: str, metadata: Dict[str, Any], buffer: mmap.mmap, blob_offset: int):
+        self.path = path
+        self.metadata = metadata
+        self._buffer = buffer
+        self._blob_offset = blob_offset
+
+    def blob(self) -> memoryview:
+        """
+        Zero-copy view of the memory-mapped content blob
+
+        Lesson records' "offset"/"length" index into this view. The pages
+        are shared with every process mapping the same file. While views
+        exist the map cannot be closed; it is unmapped once they are gone.
+
+        Returns:
+            Read-only memoryview of the blob
+        """
+        return memoryview(self._buffer)[self._blob_offset:]
+
+    def is_valid(self, lessons_dir: Path, files: Sequence[Path], settings: Dict[str, Any]) -> bool:
+        """
+        Check the snapshot against current settings and source files
+
+        Files whose mtime/size match the manifest are trusted; for the rest the
+        content hash decides (e.g. a checkout that only touched mtimes).
+
+        Args:
+            lessons_dir: Lessons root directory
+            files: Current lesson files in load order
+            settings: Current build settings
+
+        Returns:
+            True if the snapshot can be used as-is
+        """
+        if self.metadata.get("settings") != settings:
+            return False
+
+        manifest: List[ManifestEntry] = self.metadata.get("manifest", [])
+        if len(manifest) != len(files):
+            return False
+
+        for (rel_path, mtime_ns, size, digest), path in zip(manifest, files):
+            if rel_path != path.relative_to(lessons_dir).as_posix():
+                return False
+            try:
+                stat = path.stat()
+            except OSError:
+                return False
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                continue
+            if stat.st_size != size or file_sha256(path) != digest:
+                return False
+        return True
+
+    def close(self) -> None:
+        """Release the memory map (only if no blob() view is in use)"""
+        self._buffer.close()
+
+
+def read_snapshot(path: str) -> Optional[CorpusSnapshot]:
+    """
+    Open and memory-map a snapshot file
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        CorpusSnapshot, or None if missing or unreadable
+    """
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cannot open corpus snapshot {path}: {e}")
+        return None
+
+    try:
+        if buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError("bad magic")
+        meta_start = len(MAGIC) + _HEADER.size
+        (meta_length,) = _HEADER.unpack_from(buffer, len(MAGIC))
+        metadata = marshal.loads(buffer[meta_start:meta_start + meta_length])
+        return CorpusSnapshot(path, metadata, buffer, meta_start + meta_length)
+    except Exception as e:
+        logger.warning(f"Ignoring corrupt corpus snapshot {path}: {e}")
+        buffer.close()
+        return None
+
+
+def write_snapshot(path: str, metadata: Dict[str, Any], contents: Sequence[Union[bytes, memoryview]]) -> None:
+    """
+    Write a snapshot atomically (temp file + rename)
+
+    Each lesson record in metadata["lessons"] (same order as contents) gets
+    "offset"/"length" byte positions of its body in the content blob.
+
+    Args:
+        path: Snapshot file path
+        metadata: Manifest, settings, lessons and index state (marshal-able types only)
+        contents: Lesson bodies (UTF-8) in the order of metadata["lessons"]
+    """
+    offset = 0
+    for record, data in zip(metadata["lessons"], contents):
+        record["offset"] = offset
+        record["length"] = len(data)
+        offset += len(data)
+
+    meta_bytes = marshal.dumps(metadata)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(len(meta_bytes)))
+        f.write(meta_bytes)
+        for data in contents:
+            f.write(data)
+    os.replace(tmp_path, path)
+    logger.info(f"Corpus snapshot written: {path} ({len(metadata['lessons'])} lessons)")
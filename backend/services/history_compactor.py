@@ -0,0 +1,170 @@
+"""
+History Compactor - Keeps long conversations within a token budget
+"""
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .tokenizer import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+_CODE_BLOCK_RE = re.compile(r"```.*?(?:```|$)", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s")
+
+
+class HistoryCompactor:
+    """
+    Replaces older conversation turns with a compact rolling summary.
+
+    The most recent turns are kept verbatim; everything before them is
+    condensed into one extractive summary (the gist of each message, code
+    blocks collapsed, images replaced by references). Summaries are cached
+    by a hash chain over the history prefix, so each older message is
+    condensed once and later requests only extend the cached summary.
+    """
+
+    def __init__(self, keep_turns: int = 6, summary_max_chars: int = 4000, cache_size: int = 512):
+        """
+        Initialize history compactor
+
+        Args:
+            keep_turns: Number of most recent user/assistant turns kept verbatim
+            summary_max_chars: Maximum summary length (oldest lines are dropped first)
+            cache_size: Maximum number of cached summary prefixes (LRU)
+        """
+        self.keep_messages = max(0, keep_turns) * 2
+        self.summary_max_chars = summary_max_chars
+        self._cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._cache_size = max(1, cache_size)
+
+    def compact(
+        self,
+        history: List[Dict],
+        token_budget: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None
+    ) -> Tuple[List[Dict], int]:
+        """
+        Compact conversation history
+
+        Args:
+            history: Messages as {"role", "content", "images"} dicts, oldest first
+            token_budget: Maximum tokens for the verbatim part (None = unlimited)
+            tokenizer: Tokenizer measuring the budget (required with token_budget)
+
+        Returns:
+            Tuple of (compacted history, number of messages replaced by the summary)
+        """
+        split = max(0, len(history) - self.keep_messages)
+
+        # Move more turns into the summary until the verbatim part fits the budget
+        if token_budget is not None and tokenizer is not None:
+            counts = [tokenizer.count(msg.get("content", "")) for msg in history[split:]]
+            verbatim_tokens = sum(counts)
+            dropped = 0
+            while dropped < len(counts) - 1 and verbatim_tokens > token_budget:
+                verbatim_tokens -= counts[dropped]
+                dropped += 1
+            split += dropped
+
+        if split == 0:
+            return history, 0
+
+        lines = self._summarize_prefix(history[:split])
+        summary = self._render_summary(lines)
+        compacted = [{"role": "system", "content": summary, "images": []}]
+        compacted.extend(history[split:])
+        logger.info(f"Compacted history: {split} older messages summarized, {len(history) - split} kept")
+        return compacted, split
+
+    def _summarize_prefix(self, messages: List[Dict]) -> Tuple[str, ...]:
+        """
+        Get summary lines for a history prefix, reusing the longest cached prefix
+
+        Args:
+            messages: Older messages to summarize
+
+        Returns:
+            One summary line per message
+        """
+        # Hash chain: key i identifies messages[:i + 1]
+        keys = []
+        digest = b""
+        for message in messages:
+            h = hashlib.sha256(digest)
+            h.update(message.get("role", "").encode("utf-8"))
+            h.update(b"\0")
+            h.update(message.get("content", "").encode("utf-8"))
+            for image in message.get("images") or []:
+                h.update(b"\0")
+                h.update(image.encode("utf-8"))
+            digest = h.digest()
+            keys.append(digest.hex())
+
+        start = len(messages)
+        lines: Tuple[str, ...] = ()
+        while start > 0:
+            cached = self._cache.get(keys[start - 1])
+            if cached is not None:
+                self._cache.move_to_end(keys[start - 1])
+                lines = cached
+                break
+            start -= 1
+
+        for index in range(start, len(messages)):
+            lines = lines + (self._summarize_message(messages[index], index + 1),)
+            self._cache[keys[index]] = lines
+            self._cache.move_to_end(keys[index])
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return lines
+
+    def _summarize_message(self, message: Dict, number: int, max_chars: int = 240) -> str:
+        """
+        Condense one message into a single summary line
+
+        Args:
+            message: History message
+            number: Position of the message in the conversation (1-based)
+            max_chars: Maximum length of the condensed text
+
+        Returns:
+            Summary line
+        """
+        role = "Student" if message.get("role", "user") == "user" else "Tutor"
+        text = _CODE_BLOCK_RE.sub(" [code] ", message.get("content", ""))
+        text = _WHITESPACE_RE.sub(" ", text).strip()
+        if len(text) > max_chars:
+            # Prefer ending at a sentence boundary
+            cut = text[:max_chars]
+            boundaries = [m.start() for m in _SENTENCE_END_RE.finditer(cut)]
+            cut = cut[:boundaries[-1]] if boundaries and boundaries[-1] > max_chars // 2 else cut
+            text = cut.rstrip() + " …"
+        images = message.get("images") or []
+        if images:
+            text += f" [{len(images)} image(s) attached to message {number}, omitted]"
+        return f"- {role}: {text}"
+
+    def _render_summary(self, lines: Tuple[str, ...]) -> str:
+        """
+        Build the summary message text, dropping the oldest lines past the size limit
+
+        Args:
+            lines: Summary lines, oldest first
+
+        Returns:
+            Summary message content
+        """
+        kept: List[str] = []
+        size = 0
+        for line in reversed(lines):
+            if kept and size + len(line) + 1 > self.summary_max_chars:
+                kept.append("- …")
+                break
+            kept.append(line)
+            size += len(line) + 1
+        kept.reverse()
+        return "Summary of the earlier conversation (older messages condensed):\n" + "\n".join(kept)
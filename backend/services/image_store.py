@@ -0,0 +1,320 @@
+"""
+Image Store - Content-addressed storage for chat and artifact images
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REF_PREFIX = "img:"
+_REF_RE = re.compile(r"^img:([0-9a-f]{64})$")
+_FILENAME_RE = re.compile(r"^([0-9a-f]{64})\.(png|jpg|webp|gif)$")
+
+_MIME_BY_EXT = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp", "gif": "image/gif"}
+
+
+def _remove_quietly(path: str) -> None:
+    """Delete a temporary file if it still exists"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image exceeds the store's size limit"""
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    Detect an image format from its leading bytes
+
+    Args:
+        header: First bytes of the file (at least 12)
+
+    Returns:
+        File extension ('png', 'jpg', 'webp', 'gif') or None if not a supported image
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    return None
+
+
+def is_image_ref(value: str) -> bool:
+    """Check whether a string is an image reference ('img:<sha256>')"""
+    return bool(_REF_RE.match(value))
+
+
+class ImageStore:
+    """
+    Stores image bytes once per SHA-256 digest and hands out short references.
+
+    Files are named '<sha256>.<ext>' in one directory (the artifacts assets
+    folder), so the same screenshot attached to several chats or artifacts
+    occupies disk once. The format is taken from the file's magic bytes,
+    never from the client-declared MIME type.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        max_bytes: int = 10 * 1024 * 1024,
+        data_url_cache_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Initialize image store
+
+        Args:
+            root_dir: Directory holding the image files
+            max_bytes: Maximum size of one image
+            data_url_cache_bytes: Total size of the encoded data URLs kept for upstream payloads (LRU)
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        os.makedirs(root_dir, exist_ok=True)
+        # digest -> filename; read and written from worker threads, so guarded by _files_lock
+        self._files: Dict[str, str] = {}
+        self._files_lock = threading.Lock()
+        for name in os.listdir(root_dir):
+            match = _FILENAME_RE.match(name)
+            if match:
+                self._files[match.group(1)] = name
+        self._data_urls: "OrderedDict[str, str]" = OrderedDict()
+        self._data_url_cache_bytes = max(0, data_url_cache_bytes)
+        self._data_url_bytes = 0
+        # resolve() is called from worker threads
+        self._data_url_lock = threading.Lock()
+        logger.info(f"Image store ready: {len(self._files)} images in {root_dir}")
+
+    def put(self, data: bytes) -> Dict:
+        """
+        Store image bytes (no-op if the same content is already stored)
+
+        Args:
+            data: Raw image bytes
+
+        Returns:
+            Dictionary with ref, hash, filename, mime and size
+
+        Raises:
+            ImageTooLargeError: If the data exceeds max_bytes
+            ValueError: If the data is not a supported image format
+        """
+        if len(data) > self.max_bytes:
+            raise ImageTooLargeError(f"Image exceeds {self.max_bytes} bytes")
+        ext = sniff_image_type(data[:12])
+        if ext is None:
+            raise ValueError("Unsupported image format (expected PNG, JPEG, WebP or GIF)")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._files_lock:
+            filename = self._files.get(digest)
+        if filename is None:
+            filename = f"{digest}.{ext}"
+            # Write to a temp file and rename, so readers never see a partial image
+            fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    out.write(data)
+                os.replace(tmp_path, os.path.join(self.root_dir, filename))
+            except BaseException:
+                _remove_quietly(tmp_path)
+                raise
+            with self._files_lock:
+                self._files[digest] = filename
+        return self._describe(digest, filename, len(data))
+
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> Dict:
+        """
+        Store an image from a byte stream, writing chunks to disk as they arrive
+
+        Memory use is one chunk regardless of image size. The format is
+        checked on the first bytes and the size limit on every chunk, so
+        invalid or oversized uploads are rejected without reading them whole.
+
+        Args:
+            chunks: Async iterator of raw image bytes (e.g. a request body)
+
+        Returns:
+            Same as put()
+
+        Raises:
+            ImageTooLargeError: If the stream exceeds max_bytes
+            ValueError: If the data is not a supported image format
+        """
+        digest = hashlib.sha256()
+        size = 0
+        ext: Optional[str] = None
+        header = b""
+        fd, tmp_path = await asyncio.to_thread(tempfile.mkstemp, dir=self.root_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLargeError(f"Image exceeds {self.max_bytes} bytes")
+                    if ext is None:
+                        header += chunk[:12]
+                        if len(header) >= 12:
+                            ext = sniff_image_type(header)
+                            if ext is None:
+                                raise ValueError("Unsupported image format (expected PNG, JPEG, WebP or GIF)")
+                    digest.update(chunk)
+                    # File I/O off the event loop
+                    await asyncio.to_thread(out.write, chunk)
+            if ext is None:
+                ext = sniff_image_type(header)
+                if ext is None:
+                    raise ValueError("Unsupported image format (expected PNG, JPEG, WebP or GIF)")
+
+            hex_digest = digest.hexdigest()
+            with self._files_lock:
+                filename = self._files.get(hex_digest)
+            if filename is not None:
+                await asyncio.to_thread(os.remove, tmp_path)
+            else:
+                filename = f"{hex_digest}.{ext}"
+                await asyncio.to_thread(os.replace, tmp_path, os.path.join(self.root_dir, filename))
+                with self._files_lock:
+                    self._files[hex_digest] = filename
+        except BaseException:
+            await asyncio.to_thread(_remove_quietly, tmp_path)
+            raise
+        return self._describe(hex_digest, filename, size)
+
+    def put_data_url(self, data_url: str) -> Dict:
+        """
+        Store an image given as a base64 data URL
+
+        Args:
+            data_url: 'data:image/...;base64,...'
+
+        Returns:
+            Same as put()
+
+        Raises:
+            ValueError: If the data URL is malformed or the image is rejected
+        """
+        if not data_url.startswith("data:") or "," not in data_url:
+            raise ValueError("Expected a base64 data URL")
+        _, b64 = data_url.split(",", 1)
+        try:
+            data = base64.b64decode(b64, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Invalid base64 image data")
+        return self.put(data)
+
+    def store(self, image: str) -> Dict:
+        """
+        Store an image given either as a data URL or as an existing reference
+
+        Args:
+            image: Data URL or 'img:<sha256>' reference
+
+        Returns:
+            Same as put()
+
+        Raises:
+            ValueError: If the reference is unknown or the image is rejected
+        """
+        if is_image_ref(image):
+            digest = image[len(REF_PREFIX):]
+            path = self.get_path(image)
+            if path is None:
+                raise ValueError(f"Unknown image reference: {image}")
+            return self._describe(digest, os.path.basename(path), os.path.getsize(path))
+        return self.put_data_url(image)
+
+    def get_path(self, ref: str) -> Optional[str]:
+        """
+        Get the file path of a stored image
+
+        Args:
+            ref: 'img:<sha256>' reference or bare digest
+
+        Returns:
+            Absolute file path, or None if unknown
+        """
+        digest = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+        with self._files_lock:
+            filename = self._files.get(digest)
+        if filename is None:
+            return None
+        path = os.path.join(self.root_dir, filename)
+        if not os.path.exists(path):
+            with self._files_lock:
+                self._files.pop(digest, None)
+            return None
+        return path
+
+    def resolve(self, image: str) -> str:
+        """
+        Turn an image reference into a data URL for the upstream payload
+
+        Inline data URLs are returned unchanged.
+
+        Args:
+            image: Data URL or 'img:<sha256>' reference
+
+        Returns:
+            Data URL
+
+        Raises:
+            ValueError: If the reference is unknown
+        """
+        if not is_image_ref(image):
+            return image
+        digest = image[len(REF_PREFIX):]
+        with self._data_url_lock:
+            cached = self._data_urls.get(digest)
+            if cached is not None:
+                self._data_urls.move_to_end(digest)
+                return cached
+        path = self.get_path(image)
+        if path is None:
+            raise ValueError(f"Unknown image reference: {image}")
+        with open(path, "rb") as f:
+            data = f.read()
+        data_url = f"data:{self.get_mime(image)};base64,{base64.b64encode(data).decode('ascii')}"
+        # Bounded by size: one cached screenshot can be as large as many small icons
+        if len(data_url) <= self._data_url_cache_bytes:
+            with self._data_url_lock:
+                if digest not in self._data_urls:
+                    self._data_urls[digest] = data_url
+                    self._data_url_bytes += len(data_url)
+                while self._data_url_bytes > self._data_url_cache_bytes:
+                    _, evicted = self._data_urls.popitem(last=False)
+                    self._data_url_bytes -= len(evicted)
+        return data_url
+
+    def get_mime(self, ref: str) -> str:
+        """Get the MIME type of a stored image ('application/octet-stream' if unknown)"""
+        digest = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+        with self._files_lock:
+            filename = self._files.get(digest, "")
+        return _MIME_BY_EXT.get(filename.rsplit(".", 1)[-1], "application/octet-stream")
+
+    def _describe(self, digest: str, filename: str, size: int) -> Dict:
+        return {
+            "ref": REF_PREFIX + digest,
+            "hash": digest,
+            "filename": filename,
+            "mime": _MIME_BY_EXT[filename.rsplit(".", 1)[-1]],
+            "size": size
+        }
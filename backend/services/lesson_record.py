@@ -0,0 +1,283 @@
+"""
+Lesson Record - Compact lesson representation built by one parsing pass at load time
+
+Lesson text is not stored per record: each record references its UTF-8
+bytes in a shared content buffer (the memory-mapped corpus snapshot or
+one contiguous bytes object), and all offsets are byte offsets into it.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from .chunker import parse_markdown
+from .tokenizer import count_all, get_tokenizers
+
+
+def _byte_offsets(content: str, positions: List[int]) -> List[int]:
+    """Convert ascending character offsets into UTF-8 byte offsets (one pass)"""
+    result = []
+    byte_pos = 0
+    char_pos = 0
+    for pos in positions:
+        byte_pos += len(content[char_pos:pos].encode("utf-8"))
+        char_pos = pos
+        result.append(byte_pos)
+    return result
+
+
+class Section:
+    """One heading of a lesson's heading tree (byte offsets as produced by chunker.build_sections)"""
+
+    __slots__ = ("id", "title", "level", "parent", "start", "end", "body_end")
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        level: int,
+        parent: Optional[str],
+        start: int,
+        end: int,
+        body_end: int
+    ):
+        self.id = id
+        self.title = title
+        self.level = level
+        self.parent = parent
+        self.start = start
+        self.end = end
+        self.body_end = body_end
+
+    def to_tuple(self) -> Tuple:
+        """Field values in __slots__ order (the snapshot form)"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class LessonRecord:
+    """
+    A lesson file parsed once: metadata, title, heading tree and chunks.
+
+    The text lives in a shared buffer (see rebind); content, text() and
+    view() read it from there. Chunks are stored as parallel arrays
+    instead of one dict per chunk: chunk_starts/chunk_ends are byte
+    offsets into the lesson, chunk_headings the " > "-joined heading
+    paths and chunk_tokens maps each tokenizer name to the token count of
+    every chunk. Retrieval, packing and previews read these instead of
+    re-scanning the text.
+    """
+
+    __slots__ = (
+        "id", "filename", "filepath", "relpath", "course", "module", "category",
+        "mtime_ns", "file_size", "content_hash", "buffer", "offset", "size_bytes", "title", "sections",
+        "chunk_starts", "chunk_ends", "chunk_headings", "chunk_tokens",
+        "context_chars", "token_counts"
+    )
+
+    # Fields that are stored as-is in a corpus snapshot (the text and filepath are restored separately)
+    _STATE_FIELDS = (
+        "id", "filename", "relpath", "course", "module", "category",
+        "mtime_ns", "file_size", "content_hash", "title", "size_bytes",
+        "context_chars", "token_counts"
+    )
+
+    @classmethod
+    def parse(
+        cls,
+        data: bytes,
+        *,
+        lesson_id: int,
+        filename: str,
+        filepath: str,
+        relpath: str,
+        course: str,
+        module: str,
+        category: str,
+        mtime_ns: int,
+        file_size: int,
+        content_hash: str,
+        chunk_max_chars: int = 2400
+    ) -> "LessonRecord":
+        """
+        Build a record from a lesson file's bytes in a single parsing pass
+
+        The record references data until it is rebound to a shared buffer.
+        context_chars and token_counts depend on the lesson framing and are
+        left for the caller to fill in.
+
+        Args:
+            data: Lesson Markdown (UTF-8)
+            lesson_id: Lesson ID
+            filename: File name (title fallback)
+            filepath: Absolute file path
+            relpath: Path relative to the lessons directory (POSIX form)
+            course: Course name
+            module: Module name
+            category: Lesson category
+            mtime_ns: File modification time
+            file_size: File size in bytes
+            content_hash: SHA-256 hex digest of the file
+            chunk_max_chars: Soft upper bound for chunk length
+
+        Returns:
+            LessonRecord
+
+        Raises:
+            UnicodeDecodeError: If data is not valid UTF-8
+        """
+        content = data.decode("utf-8")
+        parsed = parse_markdown(content, chunk_max_chars)
+        record = cls()
+        record.id = lesson_id
+        record.filename = filename
+        record.filepath = filepath
+        record.relpath = relpath
+        record.course = sys.intern(course)
+        record.module = sys.intern(module)
+        record.category = sys.intern(category)
+        record.mtime_ns = mtime_ns
+        record.file_size = file_size
+        record.content_hash = content_hash
+        record.buffer = memoryview(data)
+        record.offset = 0
+        record.size_bytes = len(data)
+        # Fallback to filename without extension
+        record.title = parsed["title"] or (
+            filename.replace('.md', '').replace('.txt', '').replace('-', ' ').replace('_', ' ')
+        )
+        record.sections = tuple(
+            Section(**{name: section[name] for name in Section.__slots__})
+            for section in parsed["sections"]
+        )
+
+        chunks = parsed["chunks"]
+        bounds = _byte_offsets(content, [pos for chunk in chunks for pos in (chunk["start"], chunk["end"])])
+        record.chunk_starts = array("I", bounds[0::2])
+        record.chunk_ends = array("I", bounds[1::2])
+        record.chunk_headings = tuple(sys.intern(chunk["heading"]) for chunk in chunks)
+        record.chunk_tokens = {name: array("I") for name in get_tokenizers()}
+        for chunk in chunks:
+            for name, tokens in count_all(content[chunk["start"]:chunk["end"]]).items():
+                record.chunk_tokens[name].append(tokens)
+        record.context_chars = 0
+        record.token_counts = {}
+        return record
+
+    def to_state(self) -> Dict:
+        """
+        Serialize everything but the text and filepath (marshal-compatible)
+
+        Returns:
+            State dictionary for from_state()
+        """
+        state = {name: getattr(self, name) for name in self._STATE_FIELDS}
+        state["sections"] = [section.to_tuple() for section in self.sections]
+        state["chunk_starts"] = self.chunk_starts.tobytes()
+        state["chunk_ends"] = self.chunk_ends.tobytes()
+        state["chunk_headings"] = list(self.chunk_headings)
+        state["chunk_tokens"] = {name: counts.tobytes() for name, counts in self.chunk_tokens.items()}
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict, buffer: memoryview, offset: int, filepath: str) -> "LessonRecord":
+        """
+        Restore a record saved with to_state()
+
+        Args:
+            state: State dictionary (extra keys are ignored)
+            buffer: Content buffer holding the lesson text
+            offset: Byte offset of the lesson in buffer
+            filepath: Absolute file path
+
+        Returns:
+            LessonRecord
+        """
+        record = cls()
+        for name in cls._STATE_FIELDS:
+            setattr(record, name, state[name])
+        record.course = sys.intern(record.course)
+        record.module = sys.intern(record.module)
+        record.category = sys.intern(record.category)
+        record.buffer = buffer
+        record.offset = offset
+        record.filepath = filepath
+        record.sections = tuple(Section(*fields) for fields in state["sections"])
+        record.chunk_starts = array("I", state["chunk_starts"])
+        record.chunk_ends = array("I", state["chunk_ends"])
+        record.chunk_headings = tuple(sys.intern(heading) for heading in state["chunk_headings"])
+        record.chunk_tokens = {name: array("I", counts) for name, counts in state["chunk_tokens"].items()}
+        return record
+
+    def rebind(self, buffer: memoryview, offset: int) -> None:
+        """
+        Point the record at a copy of its text in another buffer
+
+        Args:
+            buffer: Content buffer
+            offset: Byte offset of the lesson text in buffer
+        """
+        self.buffer = buffer
+        self.offset = offset
+
+    def view(self, start: int = 0, end: Optional[int] = None) -> memoryview:
+        """
+        Zero-copy view of part of the lesson's UTF-8 bytes
+
+        Args:
+            start: First byte (relative to the lesson)
+            end: Byte after the last one (None = end of lesson)
+
+        Returns:
+            memoryview into the content buffer
+        """
+        stop = self.size_bytes if end is None else end
+        return self.buffer[self.offset + start:self.offset + stop]
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode part of the lesson (byte offsets must be on character boundaries)"""
+        return str(self.view(start, end), "utf-8")
+
+    @property
+    def content(self) -> str:
+        """Whole lesson Markdown (decoded on access)"""
+        return self.text()
+
+    @property
+    def chunk_count(self) -> int:
+        """Number of retrieval chunks"""
+        return len(self.chunk_starts)
+
+    def chunk_text(self, index: int) -> str:
+        """Text of one chunk (without its heading path)"""
+        return self.text(self.chunk_starts[index], self.chunk_ends[index])
+
+    def tokens_between(self, tokenizer_name: str, start: int, end: int) -> int:
+        """
+        Sum the token counts of the chunks within a byte range
+
+        Section boundaries are chunk boundaries, so for a section this is
+        its token count without re-tokenizing the text.
+
+        Args:
+            tokenizer_name: Tokenizer name
+            start: Range start (byte offset)
+            end: Range end (byte offset)
+
+        Returns:
+            Token count
+        """
+        counts = self.chunk_tokens[tokenizer_name]
+        first = bisect_left(self.chunk_starts, start)
+        last = bisect_left(self.chunk_starts, end)
+        return sum(counts[first:last])
+
+    def get_section(self, section_id: str) -> Optional[Section]:
+        """Section with the given ID, or None"""
+        return next((section for section in self.sections if section.id == section_id), None)
+
+    def section_at(self, position: int) -> Optional[Section]:
+        """Innermost section containing a byte offset, or None before the first heading"""
+        for section in reversed(self.sections):
+            if section.start <= position < section.end:
+                return section
+        return None
@@ -0,0 +1,89 @@
+"""
+Lesson Watcher - Hot reload of lesson files while the server is running
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from .context_service import ContextService
+
+logger = logging.getLogger(__name__)
+
+try:
+    from watchfiles import awatch
+except ImportError:  # pragma: no cover - depends on environment
+    awatch = None
+
+
+class LessonWatcher:
+    """
+    Watches the lessons directory and applies changes incrementally.
+
+    Uses filesystem notifications (watchfiles: inotify/FSEvents/...) when
+    available and falls back to polling. Either way the actual diff is done
+    by ContextService.stage_reload(), so bursts of events collapse into a
+    single incremental reload. It runs in a worker thread on copies of the
+    corpus structures, which are then swapped in on the event loop.
+    """
+
+    def __init__(self, context_service: ContextService, poll_interval: float = 2.0):
+        """
+        Initialize lesson watcher
+
+        Args:
+            context_service: Context service whose corpus is kept up to date
+            poll_interval: Seconds between scans in polling mode (debounce in notify mode)
+        """
+        self.context_service = context_service
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event = asyncio.Event()
+
+    def start(self) -> None:
+        """Start watching in a background task on the running event loop"""
+        if self._task is not None:
+            return
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop watching and wait for the background task to finish"""
+        if self._task is None:
+            return
+        self._stop_event.set()
+        try:
+            # Let the notification thread see the stop event and exit cleanly
+            await asyncio.wait_for(self._task, timeout=5)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        lessons_dir = self.context_service.lessons_dir
+        if awatch is not None and lessons_dir.exists():
+            logger.info(f"Watching lessons for changes: {lessons_dir}")
+            try:
+                async for _ in awatch(
+                    lessons_dir,
+                    stop_event=self._stop_event,
+                    debounce=int(self.poll_interval * 1000)
+                ):
+                    await self._reload()
+                return
+            except Exception as e:
+                logger.warning(f"File notifications unavailable, falling back to polling: {e}")
+
+        logger.info(f"Polling lessons for changes every {self.poll_interval}s: {lessons_dir}")
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                await self._reload()
+
+    async def _reload(self) -> None:
+        try:
+            staged, changes = await asyncio.to_thread(self.context_service.stage_reload)
+            if staged is not None:
+                self.context_service.apply_reload(staged, changes)
+        except Exception as e:
+            logger.error(f"Lesson reload failed: {e}", exc_info=True)
@@ -0,0 +1,84 @@
+"""
+Loop Monitor - Measures event-loop lag (how late scheduled callbacks run)
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Periodically sleeps for a fixed interval and records how much later
+    than requested it woke up.
+
+    Any blocking call on the event loop (file I/O, CPU-heavy parsing) shows
+    up directly as lag, and every concurrent request - including open chat
+    streams - is delayed by the same amount.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600, stall_threshold: float = 0.1):
+        """
+        Initialize loop lag monitor
+
+        Args:
+            interval: Seconds between probes
+            window: Number of recent samples used for mean/p99
+            stall_threshold: Lag (seconds) counted as a stall
+        """
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._samples: "deque[float]" = deque(maxlen=max(1, window))
+        self._max = 0.0
+        self._stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start probing in a background task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop probing"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._samples.append(lag)
+            if lag > self._max:
+                self._max = lag
+            if lag >= self.stall_threshold:
+                self._stalls += 1
+                logger.warning(f"Event loop stalled for {lag * 1000:.0f} ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get lag statistics
+
+        Returns:
+            Dictionary with interval_ms, samples, mean_ms and p99_ms (recent window),
+            max_ms and stalls (since start)
+        """
+        samples = sorted(self._samples)
+        count = len(samples)
+        return {
+            "interval_ms": round(self.interval * 1000, 1),
+            "samples": count,
+            "mean_ms": round(sum(samples) / count * 1000, 2) if count else 0.0,
+            "p99_ms": round(samples[min(count - 1, int(count * 0.99))] * 1000, 2) if count else 0.0,
+            "max_ms": round(self._max * 1000, 2),
+            "stalls": self._stalls
+        }
@@ -1,10 +1,15 @@
 """
 OpenRouter Service - Handles communication with OpenRouter API for LLM access
 """
+import hashlib
 import httpx
+import json
 import logging
-from typing import List, Dict, Optional, Any
+import time
+from typing import AsyncIterator, List, Dict, Optional, Any
 from .prompt_loader import PromptLoader
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +24,15 @@ class OpenRouterService:
         default_model: str,
         fallback_model: str,
         prompt_loader: PromptLoader,
-        model_configs: List[Dict]
+        model_configs: List[Dict],
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        http2: bool = False,
+        response_cache: Optional[ResponseCache] = None,
+        single_flight: bool = True
     ):
         """
         Initialize OpenRouter service
@@ -31,6 +44,14 @@ class OpenRouterService:
             fallback_model: Fallback model if default fails
             prompt_loader: PromptLoader instance for loading prompts
             model_configs: List of model configurations from config
+            timeout: Read/write/pool timeout for upstream requests in seconds
+            connect_timeout: Connection (TCP+TLS) timeout in seconds
+            max_connections: Maximum number of pooled connections
+            max_keepalive_connections: Maximum number of idle keep-alive connections
+            keepalive_expiry: Seconds an idle connection is kept open
+            http2: Enable HTTP/2 (requires the 'h2' package)
+            response_cache: Optional cache of completed responses (None = disabled)
+            single_flight: Coalesce identical concurrent requests into one upstream call
         """
         self.api_key = api_key
         self.api_base = api_base
@@ -38,6 +59,8 @@ class OpenRouterService:
         self.fallback_model = fallback_model
         self.prompt_loader = prompt_loader
         self.model_configs = {m["id"]: m for m in model_configs}
+        self.response_cache = response_cache
+        self._single_flight: Optional[SingleFlight] = SingleFlight() if single_flight else None
 
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -46,6 +69,120 @@ class OpenRouterService:
             "X-Title": "AI Learning Agent"
         }
 
+        # Shared connection pool, created in start() and closed in aclose()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._http2 = http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but 'h2' is not installed; using HTTP/1.1")
+                self._http2 = False
+
+        # Upstream connection metrics
+        self._http_stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "connect_time_ms_total": 0.0,
+            "last_connect_time_ms": 0.0
+        }
+
+    async def start(self) -> None:
+        """Create the shared HTTP client (call once at application startup)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self._http2
+            )
+            logger.info(
+                f"OpenRouter HTTP client started (http2={self._http2}, "
+                f"max_connections={self._limits.max_connections}, "
+                f"keepalive_expiry={self._limits.keepalive_expiry}s)"
+            )
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("OpenRouter HTTP client closed")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client, creating it lazily if start() was not called
+
+        Returns:
+            Pooled httpx.AsyncClient
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self._http2
+            )
+        return self._client
+
+    def _connection_tracer(self):
+        """
+        Build an httpx trace hook that measures connection setup for one request
+
+        Returns:
+            Async trace callback for the 'trace' request extension
+        """
+        timing: Dict[str, float] = {}
+        self._http_stats["requests"] += 1
+
+        async def trace(event_name: str, info: Dict) -> None:
+            if event_name == "connection.connect_tcp.started":
+                timing["start"] = time.perf_counter()
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                timing["end"] = time.perf_counter()
+            elif event_name.endswith("send_request_headers.started"):
+                self._record_connection(timing)
+
+        return trace
+
+    def _record_connection(self, timing: Dict[str, float]) -> None:
+        """
+        Record whether a request opened a new connection and how long setup took
+
+        Args:
+            timing: Start/end timestamps collected by the trace hook
+        """
+        if timing.get("recorded"):
+            return
+        timing["recorded"] = True
+        if "start" in timing and "end" in timing:
+            connect_ms = (timing["end"] - timing["start"]) * 1000
+            self._http_stats["new_connections"] += 1
+            self._http_stats["connect_time_ms_total"] += connect_ms
+            self._http_stats["last_connect_time_ms"] = connect_ms
+        else:
+            self._http_stats["reused_connections"] += 1
+
+    def get_http_stats(self) -> Dict[str, Any]:
+        """
+        Get upstream connection pool metrics
+
+        Returns:
+            Dictionary with request/connection counters and connection setup times
+        """
+        stats = dict(self._http_stats)
+        requests = stats["requests"]
+        stats["avg_connect_time_ms"] = (
+            stats["connect_time_ms_total"] / requests if requests else 0.0
+        )
+        stats["http2"] = self._http2
+        return stats
+
     async def chat(
         self,
         message: str,
@@ -75,9 +212,51 @@ class OpenRouterService:
         # Use specified model or default
         selected_model = model or self.default_model
 
+        cache_key = self._response_cache_key(message, context, history, selected_model, images)
+        if cache_key is not None:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for model: {selected_model}")
+                return self._cached_result(cached)
+
+        if self._single_flight is None:
+            return await self._chat_with_fallback(message, context, history, selected_model, images, cache_key)
+
+        # Identical concurrent requests share one upstream call
+        flight_key = self._request_fingerprint("chat", message, context, history, selected_model, images)
+        return await self._single_flight.do(
+            flight_key,
+            lambda: self._chat_with_fallback(message, context, history, selected_model, images, cache_key)
+        )
+
+    async def _chat_with_fallback(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict],
+        selected_model: str,
+        images: List[str],
+        cache_key: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Send a buffered request, falling back to the fallback model on failure
+
+        Args:
+            message: User's question
+            context: Context from lessons
+            history: Previous conversation messages
+            selected_model: Requested model
+            images: List of base64 encoded images
+            cache_key: Response cache key (None = do not store)
+
+        Returns:
+            Dictionary with response, model_used, and token info
+        """
         # Try primary model first
         try:
             result = await self._send_request(message, context, history, selected_model, images)
+            if cache_key is not None:
+                await self.response_cache.set(cache_key, result)
             return result
         except Exception as e:
             logger.warning(f"Primary model {selected_model} failed: {e}")
@@ -97,6 +276,123 @@ class OpenRouterService:
             else:
                 raise
 
+    async def chat_stream(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict] = None,
+        model: Optional[str] = None,
+        images: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream chat response from OpenRouter
+
+        Yields {"type": "delta", "content": ...} events as tokens arrive, then a
+        single {"type": "done", ...} event carrying model_used, tokens_used, cost
+        and context_length. If the primary model fails before producing its
+        first token, the fallback model is tried, same as chat().
+
+        Args:
+            message: User's question
+            context: Context from lessons
+            history: Previous conversation messages
+            model: Model to use (None = use default)
+            images: List of base64 encoded images
+
+        Yields:
+            Stream event dictionaries
+        """
+        if history is None:
+            history = []
+        if images is None:
+            images = []
+
+        selected_model = model or self.default_model
+
+        cache_key = self._response_cache_key(message, context, history, selected_model, images)
+        if cache_key is not None:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for model: {selected_model}")
+                result = self._cached_result(cached)
+                yield {"type": "delta", "content": result.pop("response")}
+                result["type"] = "done"
+                yield result
+                return
+
+        if self._single_flight is None:
+            events = self._stream_with_fallback(message, context, history, selected_model, images, cache_key)
+        else:
+            # Identical concurrent requests subscribe to one upstream stream
+            flight_key = self._request_fingerprint("stream", message, context, history, selected_model, images)
+            events = self._single_flight.stream(
+                flight_key,
+                lambda: self._stream_with_fallback(message, context, history, selected_model, images, cache_key)
+            )
+        try:
+            async for event in events:
+                yield event
+        finally:
+            # Detach promptly when the client goes away (lets single-flight cancel unused calls)
+            await events.aclose()
+
+    async def _stream_with_fallback(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict],
+        selected_model: str,
+        images: List[str],
+        cache_key: Optional[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response, trying the fallback model if the primary fails before its first token
+
+        Args:
+            message: User's question
+            context: Context from lessons
+            history: Previous conversation messages
+            selected_model: Requested model
+            images: List of base64 encoded images
+            cache_key: Response cache key (None = do not store)
+
+        Yields:
+            Stream event dictionaries
+        """
+        models_to_try = [selected_model]
+        if selected_model != self.fallback_model:
+            models_to_try.append(self.fallback_model)
+
+        last_error: Optional[Exception] = None
+        for attempt_model in models_to_try:
+            started = False
+            parts: List[str] = []
+            try:
+                async for event in self._stream_request(message, context, history, attempt_model, images):
+                    started = True
+                    if event["type"] == "delta":
+                        parts.append(event["content"])
+                    elif cache_key is not None and attempt_model == selected_model:
+                        result = {k: v for k, v in event.items() if k != "type"}
+                        result["response"] = "".join(parts)
+                        await self.response_cache.set(cache_key, result)
+                    yield event
+                return
+            except Exception as e:
+                if started:
+                    # Tokens were already relayed to the client; switching models would mix answers
+                    logger.error(f"Model {attempt_model} failed mid-stream: {e}")
+                    raise
+                last_error = e
+                logger.warning(f"Model {attempt_model} failed before first token: {e}")
+
+        if len(models_to_try) > 1:
+            raise Exception(
+                f"Both primary ({selected_model}) and fallback ({self.fallback_model}) "
+                f"models failed. Please try again later."
+            )
+        raise last_error
+
     async def _send_request(
         self,
         message: str,
@@ -118,14 +414,148 @@ class OpenRouterService:
         Returns:
             Response dictionary
         """
+        payload = self._build_payload(message, context, history, model, images)
+
+        logger.info(f"Sending request to OpenRouter with model: {model}")
+        logger.debug(f"Context length: {len(context)} characters")
+        logger.debug(f"Total messages: {len(payload['messages'])}")
+
+        # Send request over the shared connection pool
+        response = await self._get_client().post(
+            f"{self.api_base}/chat/completions",
+            headers=self.headers,
+            json=payload,
+            extensions={"trace": self._connection_tracer()}
+        )
+
+        if response.status_code != 200:
+            error_text = response.text
+            logger.error(f"OpenRouter API error {response.status_code}: {error_text}")
+            raise Exception(f"OpenRouter API error: {error_text}")
+
+        data = response.json()
+
+        # Extract response
+        try:
+            ai_response = data["choices"][0]["message"]["content"]
+            result = self._build_result(model, data.get("usage", {}), context)
+            result["response"] = ai_response
+            return result
+
+        except (KeyError, IndexError) as e:
+            logger.error(f"Unexpected response format: {data}")
+            raise Exception(f"Unexpected response format from OpenRouter: {e}")
+
+    async def _stream_request(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict],
+        model: str,
+        images: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Send streaming request to OpenRouter API and relay SSE deltas
+
+        Args:
+            message: User message
+            context: Context string
+            history: Conversation history
+            model: Model identifier
+            images: List of base64 encoded images
+
+        Yields:
+            Delta events, then a final done event with usage and cost
+        """
+        payload = self._build_payload(message, context, history, model, images)
+        # Token usage is appended to the last chunk
+        payload["stream"] = True
+
+        logger.info(f"Sending streaming request to OpenRouter with model: {model}")
+
+        usage: Dict[str, Any] = {}
+        async with self._get_client().stream(
+            "POST",
+            f"{self.api_base}/chat/completions",
+            headers=self.headers,
+            json=payload,
+            extensions={"trace": self._connection_tracer()}
+        ) as response:
+            if response.status_code != 200:
+                error_text = (await response.aread()).decode("utf-8", errors="replace")
+                logger.error(f"OpenRouter API error {response.status_code}: {error_text}")
+                raise Exception(f"OpenRouter API error: {error_text}")
+
+            async for line in response.aiter_lines():
+                # SSE comments (": OPENROUTER PROCESSING") and blank keep-alive lines
+                if not line.startswith("data:"):
+                    continue
+                data_str = line[5:].strip()
+                if data_str == "[DONE]":
+                    break
+
+                try:
+                    chunk = json.loads(data_str)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed stream chunk: {data_str[:200]}")
+                    continue
+
+                if "error" in chunk:
+                    raise Exception(f"OpenRouter stream error: {chunk['error']}")
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+
+                for choice in chunk.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield {"type": "delta", "content": content}
+
+        result = self._build_result(model, usage, context)
+        result["type"] = "done"
+        yield result
+
+    def _build_payload(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict],
+        model: str,
+        images: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Build chat completions payload with model-specific settings
+
+        Args:
+            message: User message
+            context: Context string
+            history: Conversation history
+            model: Model identifier
+            images: List of base64 encoded images
+
+        Returns:
+            Request payload dictionary
+        """
         if images is None:
             images = []
 
         # Build system prompt with context
         system_prompt = self._build_system_prompt(context)
 
-        # Build messages array
-        messages = [{"role": "system", "content": system_prompt}]
+        # Build messages array: the system prompt (instructions + lessons) is a stable
+        # prefix across the conversation, so providers can serve it from their prompt cache
+        model_config = self._get_model_config(model)
+        if model_config.get("prompt_cache") == "explicit":
+            # Anthropic/Gemini only cache up to an explicit breakpoint
+            messages = [{
+                "role": "system",
+                "content": [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+            }]
+        else:
+            messages = [{"role": "system", "content": system_prompt}]
 
         # Add conversation history
         for msg in history:
@@ -162,78 +592,181 @@ class OpenRouterService:
         else:
             messages.append({"role": "user", "content": message})
 
-        # Get model configuration
-        model_config = self._get_model_config(model)
-
-        # Prepare request payload with model-specific settings
-        payload = {
+        return {
             "model": model,
             "messages": messages,
+            **self._sampling_params(model),
+            # Ask OpenRouter for detailed usage (includes cached prompt tokens)
+            "usage": {"include": True}
+        }
+
+    def _sampling_params(self, model: str) -> Dict[str, Any]:
+        """
+        Get sampling parameters sent upstream for a model
+
+        Args:
+            model: Model identifier
+
+        Returns:
+            Dictionary with temperature, max_tokens and top_p
+        """
+        model_config = self._get_model_config(model)
+        return {
             "temperature": model_config.get("temperature", 0.7),
             "max_tokens": model_config.get("max_tokens", 4000),
             "top_p": model_config.get("top_p", 1.0)
         }
 
-        logger.info(f"Sending request to OpenRouter with model: {model}")
-        logger.debug(f"Context length: {len(context)} characters")
-        logger.debug(f"Total messages: {len(messages)}")
-
-        # Send request
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.api_base}/chat/completions",
-                headers=self.headers,
-                json=payload
-            )
+    def _response_cache_key(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict],
+        model: str,
+        images: List[str]
+    ) -> Optional[str]:
+        """
+        Build the response cache key for a request
 
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"OpenRouter API error {response.status_code}: {error_text}")
-                raise Exception(f"OpenRouter API error: {error_text}")
+        Args:
+            message: User message
+            context: Context string
+            history: Conversation history
+            model: Requested model identifier
+            images: List of base64 encoded images
 
-            data = response.json()
+        Returns:
+            Cache key, or None if caching is disabled or the request bypasses it
+        """
+        if self.response_cache is None or not self.response_cache.is_cacheable(images, history):
+            return None
+        return self.response_cache.make_key(
+            message,
+            context,
+            model,
+            self._sampling_params(model),
+            self.prompt_loader.get_fingerprint(),
+            history=history,
+            images=images
+        )
+
+    def _request_fingerprint(
+        self,
+        kind: str,
+        message: str,
+        context: str,
+        history: List[Dict],
+        model: str,
+        images: List[str]
+    ) -> str:
+        """
+        Fingerprint everything that determines the upstream payload
 
-        # Extract response
-        try:
-            ai_response = data["choices"][0]["message"]["content"]
-            usage = data.get("usage", {})
+        Args:
+            kind: 'chat' or 'stream' (buffered and streamed calls are not shared)
+            message: User message
+            context: Context string
+            history: Conversation history
+            model: Requested model identifier
+            images: List of base64 encoded images
 
-            # Extract token usage
-            input_tokens = usage.get("prompt_tokens", 0)
-            output_tokens = usage.get("completion_tokens", 0)
-            total_tokens = usage.get("total_tokens", input_tokens + output_tokens)
+        Returns:
+            Hex SHA-256 digest
+        """
+        digest = hashlib.sha256()
+        for part in (
+            kind,
+            model,
+            json.dumps(self._sampling_params(model), sort_keys=True),
+            self.prompt_loader.get_fingerprint(),
+            message,
+            context,
+            json.dumps(history, sort_keys=True, ensure_ascii=False),
+            *images
+        ):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_single_flight_stats(self) -> Optional[Dict[str, int]]:
+        """
+        Get request coalescing counters
 
-            # Calculate cost
-            model_config = self.model_configs.get(model, {})
-            input_cost_per_1m = model_config.get("input_cost_per_1m", 0)
-            output_cost_per_1m = model_config.get("output_cost_per_1m", 0)
+        Returns:
+            Dictionary with leaders, coalesced and in_flight, or None if disabled
+        """
+        if self._single_flight is None:
+            return None
+        return self._single_flight.get_stats()
 
-            cost_usd = (
-                (input_tokens / 1_000_000) * input_cost_per_1m +
-                (output_tokens / 1_000_000) * output_cost_per_1m
-            )
-            cost_rub = cost_usd * 90  # 1 USD = 90 RUB
-
-            logger.info(f"Received response, tokens: {total_tokens} (in: {input_tokens}, out: {output_tokens}), cost: ${cost_usd:.6f}")
-
-            return {
-                "response": ai_response,
-                "model_used": model,
-                "tokens_used": {
-                    "input": input_tokens,
-                    "output": output_tokens,
-                    "total": total_tokens
-                },
-                "cost": {
-                    "usd": cost_usd,
-                    "rub": cost_rub
-                },
-                "context_length": len(context)
-            }
+    def _cached_result(self, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build a chat result from a cached response
 
-        except (KeyError, IndexError) as e:
-            logger.error(f"Unexpected response format: {data}")
-            raise Exception(f"Unexpected response format from OpenRouter: {e}")
+        Token usage is that of the original completion; cost is zero since
+        nothing was sent upstream.
+
+        Args:
+            cached: Stored result dictionary
+
+        Returns:
+            Result dictionary marked as cached
+        """
+        result = dict(cached)
+        result["cost"] = {"usd": 0.0, "rub": 0.0}
+        result["cached"] = True
+        return result
+
+    def _build_result(self, model: str, usage: Dict[str, Any], context: str) -> Dict[str, Any]:
+        """
+        Build token usage and cost metadata for a completed response
+
+        Args:
+            model: Model identifier that produced the response
+            usage: 'usage' block from OpenRouter (may be empty)
+            context: Context string sent with the request
+
+        Returns:
+            Dictionary with model_used, tokens_used, cost and context_length
+        """
+        # Extract token usage
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+        total_tokens = usage.get("total_tokens", input_tokens + output_tokens)
+        cached_tokens = min((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0, input_tokens)
+
+        # Calculate cost (prompt tokens read from the provider cache are billed at the cached rate)
+        model_config = self.model_configs.get(model, {})
+        input_cost_per_1m = model_config.get("input_cost_per_1m", 0)
+        cached_input_cost_per_1m = model_config.get("cached_input_cost_per_1m", input_cost_per_1m)
+        output_cost_per_1m = model_config.get("output_cost_per_1m", 0)
+
+        cost_usd = (
+            ((input_tokens - cached_tokens) / 1_000_000) * input_cost_per_1m +
+            (cached_tokens / 1_000_000) * cached_input_cost_per_1m +
+            (output_tokens / 1_000_000) * output_cost_per_1m
+        )
+        cost_rub = cost_usd * 90  # 1 USD = 90 RUB
+
+        logger.info(
+            f"Received response, tokens: {total_tokens} (in: {input_tokens}, cached: {cached_tokens}, "
+            f"out: {output_tokens}), cost: ${cost_usd:.6f}"
+        )
+
+        return {
+            "model_used": model,
+            "tokens_used": {
+                "input": input_tokens,
+                "output": output_tokens,
+                "total": total_tokens,
+                "cached": cached_tokens
+            },
+            "cost": {
+                "usd": cost_usd,
+                "rub": cost_rub
+            },
+            "context_length": len(context)
+        }
 
     def _build_system_prompt(self, context: str) -> str:
         """
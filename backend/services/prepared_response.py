@@ -0,0 +1,160 @@
+"""
+Prepared Responses - Read-only responses serialized and compressed once per data version
+"""
+import gzip
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+class PreparedBody:
+    """
+    One serialized response body with its strong ETag and compressed variants.
+
+    Each encoding is a different representation, so it gets its own ETag
+    ('"<digest>"', '"<digest>-gzip"', '"<digest>-br"'); a conditional
+    request matches any of them, since they all stand for the same data.
+    """
+
+    def __init__(self, body: bytes, compress_min_bytes: int = 1024):
+        """
+        Serialize-once container (compression happens here, so build it off the event loop)
+
+        Args:
+            body: Serialized response body
+            compress_min_bytes: Bodies smaller than this are only stored uncompressed
+        """
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded: Dict[str, bytes] = {}
+        if len(body) >= compress_min_bytes:
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body, quality=9)
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        """Strong ETag of the identity representation or of an encoded one"""
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        Pick the smallest representation the client accepts
+
+        Args:
+            accept_encoding: Accept-Encoding request header
+
+        Returns:
+            Tuple of (body bytes, content encoding or None for identity)
+        """
+        if accept_encoding and self.encoded:
+            accepted = _accepted_encodings(accept_encoding)
+            for encoding in ("br", "gzip"):
+                if encoding in self.encoded and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                    return self.encoded[encoding], encoding
+        return self.body, None
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """
+        Check an If-None-Match header against this body (any representation)
+
+        Args:
+            if_none_match: If-None-Match request header
+
+        Returns:
+            True if the client's copy is current (respond 304)
+        """
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+
+class PreparedResponseCache:
+    """
+    LRU of PreparedBody objects keyed by endpoint/resource and a data version.
+
+    An entry is reused while its version matches (e.g. the corpus version),
+    so every response is serialized and compressed once per change of the
+    data instead of on every request.
+    """
+
+    def __init__(self, max_entries: int = 256, compress_min_bytes: int = 1024):
+        """
+        Initialize prepared response cache
+
+        Args:
+            max_entries: Maximum number of stored bodies (least recently used are evicted)
+            compress_min_bytes: Bodies smaller than this are not compressed
+        """
+        self.max_entries = max(1, max_entries)
+        self.compress_min_bytes = compress_min_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, PreparedBody]]" = OrderedDict()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[PreparedBody]:
+        """
+        Get the prepared body of a resource if it is still current
+
+        Args:
+            key: Resource key (e.g. ("lesson", 42))
+            version: Current data version
+
+        Returns:
+            PreparedBody or None if missing or stale
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def prepare(self, body: bytes) -> PreparedBody:
+        """Serialize-once container for a body with this cache's settings (CPU-bound)"""
+        return PreparedBody(body, self.compress_min_bytes)
+
+    def put(self, key: Hashable, version: Hashable, prepared: PreparedBody) -> None:
+        """
+        Store the prepared body of a resource
+
+        Args:
+            key: Resource key
+            version: Data version the body was built from
+            prepared: Result of prepare()
+        """
+        self._entries[key] = (version, prepared)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,9 +1,12 @@
 """
 Prompt Loader Service - Loads prompts from Markdown files
 """
+import hashlib
 import os
 import logging
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+
+from .tokenizer import Tokenizer
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +23,12 @@ class PromptLoader:
         """
         self.prompts_dir = prompts_dir
         self._cache: Dict[str, str] = {}
+        self._fingerprint: Optional[str] = None
+        # Compiled template and the most recently built prompt (keyed by context identity)
+        self._segments: Optional[List[str]] = None
+        self._last_prompt: Tuple[Optional[str], str] = (None, "")
+        # Token count of the template without context, per tokenizer signature
+        self._template_tokens: Dict[str, int] = {}
         logger.info(f"PromptLoader initialized with directory: {prompts_dir}")
 
     def load_system_prompt(self) -> str:
@@ -47,11 +56,55 @@ class PromptLoader:
         - Replaces {context}
         - If {boundaries} is present in system prompt, replaces it
         - Otherwise appends a "Knowledge Boundaries" section at the end
+
+        The template is compiled once (see _get_segments), so a request costs
+        a single join over the context; the last result is reused when the
+        same context string is passed again.
+        """
+        last_context, last_prompt = self._last_prompt
+        if last_context is context:
+            return last_prompt
+
+        full_prompt = context.join(self._get_segments())
+        self._last_prompt = (context, full_prompt)
+
+        logger.debug(f"Built full prompt, length: {len(full_prompt)} characters")
+        return full_prompt
+
+    def count_template_tokens(self, tokenizer: Tokenizer) -> int:
         """
-        system_prompt = self.load_system_prompt()
+        Count the tokens of the system prompt template (everything but the context)
+
+        Counted once per tokenizer and prompt version, so requests do not
+        re-tokenize the template.
+
+        Args:
+            tokenizer: Tokenizer of the target model
 
-        # Replace {context} variable with actual lessons
-        full_prompt = system_prompt.replace("{context}", context)
+        Returns:
+            Token count of the template
+        """
+        key = tokenizer.signature
+        tokens = self._template_tokens.get(key)
+        if tokens is None:
+            tokens = tokenizer.count("".join(self._get_segments()))
+            self._template_tokens[key] = tokens
+        return tokens
+
+    def _get_segments(self) -> List[str]:
+        """
+        Compile the system prompt template into static segments around {context}
+
+        Boundaries are merged into the template text up front, so only the
+        (small) template is ever searched and copied for substitutions.
+
+        Returns:
+            Template pieces; the full prompt is context.join(segments)
+        """
+        if self._segments is not None:
+            return self._segments
+
+        template = self.load_system_prompt()
 
         # Try to load boundaries (be resilient if file is missing)
         boundaries_text = ""
@@ -63,15 +116,33 @@ class PromptLoader:
             logger.error(f"Error loading boundaries.md: {e}")
 
         if boundaries_text:
-            if "{boundaries}" in full_prompt:
-                full_prompt = full_prompt.replace("{boundaries}", boundaries_text)
+            if "{boundaries}" in template:
+                template = template.replace("{boundaries}", boundaries_text)
             else:
-                full_prompt = (
-                    f"{full_prompt}\n\n---\n## Knowledge Boundaries\n\n{boundaries_text}"
-                )
+                template = f"{template}\n\n---\n## Knowledge Boundaries\n\n{boundaries_text}"
 
-        logger.debug(f"Built full prompt, length: {len(full_prompt)} characters")
-        return full_prompt
+        self._segments = template.split("{context}")
+        return self._segments
+
+    def get_fingerprint(self) -> str:
+        """
+        Get a hash of the prompt files that shape every response
+
+        Used in response cache keys, so editing a prompt invalidates cached answers.
+
+        Returns:
+            Hex SHA-256 digest of system prompt and boundaries
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for filename in ("system_prompt.md", "boundaries.md"):
+                try:
+                    digest.update(self._load_file(filename).encode("utf-8"))
+                except FileNotFoundError:
+                    pass
+                digest.update(b"\0")
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
 
     def _load_file(self, filename: str) -> str:
         """
@@ -112,4 +183,8 @@ class PromptLoader:
     def reload_cache(self):
         """Clear cache to force reload of prompts"""
         self._cache.clear()
+        self._fingerprint = None
+        self._segments = None
+        self._last_prompt = (None, "")
+        self._template_tokens.clear()
         logger.info("Prompt cache cleared")
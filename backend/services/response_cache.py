@@ -0,0 +1,391 @@
+"""
+Response Cache - Reuses chat completions for repeated questions over the same context
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.…]+$")
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a question so trivially different spellings share a cache entry
+
+    Case, ё/е, runs of whitespace and trailing ?!. are ignored.
+
+    Args:
+        message: User message
+
+    Returns:
+        Normalized message
+    """
+    text = message.casefold().replace("ё", "е")
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+class CacheBackend(ABC):
+    """Base class for response cache storage"""
+
+    name: str = "base"
+    # Backends doing disk I/O are called from a worker thread instead of the event loop
+    blocking: bool = False
+
+    def __init__(self, max_entries: int = 1000):
+        """
+        Initialize backend
+
+        Args:
+            max_entries: Maximum number of entries (least recently used are evicted)
+        """
+        self.max_entries = max(1, max_entries)
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a non-expired entry and mark it as recently used
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Stored value or None
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        """
+        Store an entry
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+            ttl: Time to live in seconds
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all entries"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries"""
+
+    def close(self) -> None:
+        """Release resources held by the backend"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with per-entry expiry (lost on restart, not shared between workers)"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000):
+        super().__init__(max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite-backed LRU with expiry (survives restarts, shared by workers on one host)"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        """
+        Initialize SQLite backend
+
+        Args:
+            path: Database file path (created if missing)
+            max_entries: Maximum number of entries (least recently used are evicted)
+        """
+        super().__init__(max_entries)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_last_access ON response_cache (last_access)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+        )
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM response_cache")
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection"""
+        self._conn.close()
+
+
+class ResponseCache:
+    """
+    Cache of completed chat responses.
+
+    Keyed on the normalized question, a fingerprint of the lesson context,
+    the model and its sampling parameters, and a fingerprint of the prompt
+    files, so any change to what the model would see produces a new key.
+    Requests with images or conversation history bypass the cache unless
+    explicitly allowed (they are then part of the key).
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl: float = 86400.0,
+        allow_images: bool = False,
+        allow_history: bool = False
+    ):
+        """
+        Initialize response cache
+
+        Args:
+            backend: Storage backend
+            ttl: Entry time to live in seconds
+            allow_images: Cache requests that include images
+            allow_history: Cache requests that include conversation history
+        """
+        self.backend = backend
+        self.ttl = ttl
+        # One thread serializes access to a blocking backend's connection
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache") if backend.blocking else None
+        )
+        self.allow_images = allow_images
+        self.allow_history = allow_history
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "saved_tokens": 0,
+            "saved_cost_usd": 0.0
+        }
+
+    def is_cacheable(self, images: Optional[List[str]], history: Optional[List[Dict]]) -> bool:
+        """
+        Check whether a request may use the cache (counts bypasses)
+
+        Args:
+            images: Images attached to the message
+            history: Conversation history
+
+        Returns:
+            True if the request can be served from / stored in the cache
+        """
+        if (images and not self.allow_images) or (history and not self.allow_history):
+            self._stats["bypassed"] += 1
+            return False
+        return True
+
+    def make_key(
+        self,
+        message: str,
+        context: str,
+        model: str,
+        sampling: Dict[str, Any],
+        prompt_fingerprint: str,
+        history: Optional[List[Dict]] = None,
+        images: Optional[List[str]] = None
+    ) -> str:
+        """
+        Build the cache key for a request
+
+        Args:
+            message: User message
+            context: Lesson context string
+            model: Model identifier
+            sampling: Sampling parameters sent upstream (temperature, max_tokens, top_p)
+            prompt_fingerprint: Fingerprint of the system prompt files
+            history: Conversation history (only when allowed)
+            images: Images (only when allowed)
+
+        Returns:
+            Hex SHA-256 key
+        """
+        key_data = {
+            "message": normalize_message(message),
+            "context": hashlib.sha256(context.encode("utf-8")).hexdigest(),
+            "model": model,
+            "sampling": sampling,
+            "prompts": prompt_fingerprint,
+            "history": [
+                [msg.get("role"), msg.get("content"), msg.get("images") or []]
+                for msg in history or []
+            ],
+            "images": [hashlib.sha256(img.encode("utf-8")).hexdigest() for img in images or []]
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response (counts hits/misses and saved cost)
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            Cached result dictionary or None
+        """
+        try:
+            value = await self._run(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            value = None
+
+        if value is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        self._stats["saved_tokens"] += (value.get("tokens_used") or {}).get("total", 0)
+        self._stats["saved_cost_usd"] += (value.get("cost") or {}).get("usd", 0.0)
+        return value
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a completed response
+
+        Args:
+            key: Cache key from make_key()
+            result: Result dictionary (response text, model_used, tokens_used, cost, ...)
+        """
+        try:
+            await self._run(self.backend.set, key, result, self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache store failed: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache effectiveness counters
+
+        Returns:
+            Dictionary with backend, hits, misses, bypassed, size, max size and savings
+        """
+        try:
+            size = await self._run(len, self.backend)
+        except Exception:
+            size = 0
+        return {
+            "backend": self.backend.name,
+            **self._stats,
+            "size": size,
+            "max_size": self.backend.max_entries
+        }
+
+    def close(self) -> None:
+        """Wait for pending writes and close the backend"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.backend.close()
+
+
+def create_response_cache(
+    backend: str = "memory",
+    path: str = "",
+    max_entries: int = 1000,
+    ttl: float = 86400.0,
+    allow_images: bool = False,
+    allow_history: bool = False
+) -> ResponseCache:
+    """
+    Create a response cache with the named backend (falls back to memory)
+
+    Args:
+        backend: 'memory' or 'sqlite'
+        path: Database path for the sqlite backend
+        max_entries: Maximum number of entries
+        ttl: Entry time to live in seconds
+        allow_images: Cache requests that include images
+        allow_history: Cache requests that include conversation history
+
+    Returns:
+        ResponseCache instance
+    """
+    storage: CacheBackend
+    if backend == "sqlite" and path:
+        try:
+            storage = SQLiteCacheBackend(path, max_entries)
+        except sqlite3.Error as e:
+            logger.warning(f"Cannot open response cache database {path}, using memory: {e}")
+            storage = MemoryCacheBackend(max_entries)
+    else:
+        storage = MemoryCacheBackend(max_entries)
+    logger.info(f"Response cache enabled ({storage.name}, ttl={ttl}s, max_entries={storage.max_entries})")
+    return ResponseCache(storage, ttl, allow_images=allow_images, allow_history=allow_history)
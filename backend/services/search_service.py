@@ -0,0 +1,240 @@
+"""
+Search Service - Full-text search over lessons and artifacts with highlighted snippets
+"""
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .bm25_index import BM25Index
+from .chunker import slugify, split_into_chunks
+from .context_service import ContextService
+from .text_analysis import STOPWORDS, analyze, stem, tokenize_with_offsets
+
+logger = logging.getLogger(__name__)
+
+_SPLIT_RE = re.compile(r"[-.]")
+
+
+def heading_anchor(heading: str) -> Optional[str]:
+    """
+    Build the GitHub-style anchor of the innermost heading of a heading path
+
+    Args:
+        heading: " > "-joined heading path (as produced by the chunker)
+
+    Returns:
+        Anchor slug (without '#'), or None for text before the first heading
+    """
+    if not heading:
+        return None
+    return slugify(heading.rsplit(" > ", 1)[-1]) or None
+
+
+def _token_matches(token: str, stems: Set[str]) -> bool:
+    if token in STOPWORDS or len(token) < 2:
+        return False
+    if stem(token) in stems:
+        return True
+    if "-" in token or "." in token:
+        return any(len(part) > 1 and stem(part) in stems for part in _SPLIT_RE.split(token))
+    return False
+
+
+def make_snippet(text: str, stems: Set[str], max_chars: int = 240) -> Tuple[str, List[List[int]]]:
+    """
+    Cut the part of a text with the most query matches and locate the matches in it
+
+    Args:
+        text: Chunk text
+        stems: Analyzed query terms
+        max_chars: Approximate snippet length
+
+    Returns:
+        Tuple of (snippet, highlights) where highlights are [start, end] offsets into the snippet
+    """
+    # The heading line is returned separately; start at the section body
+    if text.startswith("#"):
+        newline = text.find("\n")
+        body_text = text[newline + 1:] if newline != -1 else ""
+        text = body_text if body_text.strip() else text.lstrip("#")
+    matches = [(start, end) for token, start, end in tokenize_with_offsets(text) if _token_matches(token, stems)]
+
+    # Densest window: the match whose following max_chars contain the most matches
+    window_start = 0
+    if matches:
+        best_count = 0
+        right = 0
+        for left, (start, _) in enumerate(matches):
+            right = max(right, left)
+            while right + 1 < len(matches) and matches[right + 1][1] - start <= max_chars:
+                right += 1
+            if right - left + 1 > best_count:
+                best_count = right - left + 1
+                window_start = start
+        # Some context before the first match, starting at a word boundary
+        lead = max(0, window_start - max_chars // 5)
+        space = text.find(" ", lead, window_start)
+        window_start = space + 1 if lead > 0 and space != -1 else lead
+
+    window_end = min(len(text), window_start + max_chars)
+    if window_end < len(text):
+        space = text.rfind(" ", window_start, window_end)
+        if space > window_start:
+            window_end = space
+
+    prefix = "…" if window_start > 0 else ""
+    suffix = "…" if window_end < len(text) else ""
+    # Newlines become spaces, which keeps the offsets valid
+    body = re.sub(r"\s", " ", text[window_start:window_end])
+    stripped = body.lstrip()
+    shift = len(prefix) - window_start - (len(body) - len(stripped))
+    snippet = prefix + stripped.rstrip() + suffix
+    highlights = [
+        [start + shift, end + shift]
+        for start, end in matches
+        if start >= window_start and end <= window_end and start + shift >= len(prefix)
+    ]
+    return snippet, highlights
+
+
+class SearchService:
+    """
+    Ranked full-text search returning snippets instead of whole documents.
+
+    Lessons are searched through the ContextService BM25 index (already
+    kept current by hot reload); artifacts get a second BM25 index over
+    heading-aware chunks of their bodies, built once at startup and
+    updated as artifacts are created.
+    """
+
+    def __init__(self, context_service: ContextService, chunk_max_chars: int = 2400, snippet_chars: int = 240):
+        """
+        Initialize search service
+
+        Args:
+            context_service: Lesson corpus and its lexical index
+            chunk_max_chars: Soft upper bound for artifact chunk length
+            snippet_chars: Approximate snippet length
+        """
+        self.context_service = context_service
+        self.chunk_max_chars = chunk_max_chars
+        self.snippet_chars = snippet_chars
+        self.artifact_index = BM25Index()
+        # artifact_id -> {"title", "body", "chunks"}
+        self._artifacts: Dict[str, Dict[str, Any]] = {}
+
+    def _add_artifact(self, index: BM25Index, artifacts: Dict[str, Dict], artifact_id: str, title: str, body: str) -> None:
+        for chunk_index in range(len(artifacts.get(artifact_id, {}).get("chunks", []))):
+            index.remove_document((artifact_id, chunk_index))
+        chunks = split_into_chunks(body, self.chunk_max_chars)
+        if not chunks:
+            # Title-only artifacts (e.g. images) are still findable by title
+            chunks = [{"start": 0, "end": len(body), "heading": "", "level": 0}]
+        for chunk_index, chunk in enumerate(chunks):
+            terms = analyze(title)
+            terms.extend(analyze(chunk["heading"]))
+            terms.extend(analyze(body[chunk["start"]:chunk["end"]]))
+            index.add_document((artifact_id, chunk_index), terms)
+        artifacts[artifact_id] = {"title": title, "body": body, "chunks": chunks}
+
+    def index_artifact(self, artifact_id: str, title: str, body: str) -> None:
+        """
+        Add or replace one artifact in the search index
+
+        Args:
+            artifact_id: Artifact ID
+            title: Artifact title
+            body: Artifact Markdown body
+        """
+        self._add_artifact(self.artifact_index, self._artifacts, artifact_id, title, body or "")
+
+    def load_artifacts(self, documents: Iterable[Dict[str, str]]) -> int:
+        """
+        Replace the artifact index with the given documents
+
+        The new index is built aside and swapped in at the end, so this can
+        run in a worker thread while searches are served.
+
+        Args:
+            documents: Dicts with id, title and body
+
+        Returns:
+            Number of indexed artifacts
+        """
+        index = BM25Index()
+        artifacts: Dict[str, Dict[str, Any]] = {}
+        for doc in documents:
+            self._add_artifact(index, artifacts, doc["id"], doc["title"], doc.get("body") or "")
+        self.artifact_index, self._artifacts = index, artifacts
+        logger.info(f"Search index ready: {len(artifacts)} artifacts, {len(index)} chunks")
+        return len(artifacts)
+
+    def search(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        lesson_ids: Optional[List[int]] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the best matching lesson and artifact sections
+
+        Args:
+            query: Search text
+            kind: 'lesson' or 'artifact' to search only one of them (None = both)
+            lesson_ids: Restrict lesson hits to these lessons
+            limit: Maximum number of hits
+
+        Returns:
+            Hits in score order: {kind, lesson_id, artifact_id, title, heading, anchor,
+            snippet, highlights, score}
+        """
+        terms = analyze(query)
+        if not terms:
+            return []
+        stems = set(terms)
+
+        candidates: List[Tuple[float, str, Any]] = []
+        if kind in (None, "lesson"):
+            allowed = set(lesson_ids) if lesson_ids else None
+            doc_filter = (lambda key: key[0] in allowed) if allowed is not None else None
+            for key, score in self.context_service.lexical_index.search(terms, top_k=limit, doc_filter=doc_filter):
+                candidates.append((score, "lesson", key))
+        if kind in (None, "artifact"):
+            for key, score in self.artifact_index.search(terms, top_k=limit):
+                candidates.append((score, "artifact", key))
+        candidates.sort(key=lambda item: item[0], reverse=True)
+
+        hits: List[Dict[str, Any]] = []
+        for score, hit_kind, (doc_id, chunk_index) in candidates[:limit]:
+            if hit_kind == "lesson":
+                lesson = self.context_service.lessons_cache.get(doc_id)
+                if lesson is None or chunk_index >= lesson.chunk_count:
+                    continue
+                title = lesson.title
+                heading = lesson.chunk_headings[chunk_index]
+                text = lesson.chunk_text(chunk_index)
+                section = lesson.section_at(lesson.chunk_starts[chunk_index])
+                anchor = section.id if section is not None else None
+            else:
+                artifact = self._artifacts.get(doc_id)
+                if artifact is None or chunk_index >= len(artifact["chunks"]):
+                    continue
+                chunk = artifact["chunks"][chunk_index]
+                title = artifact["title"]
+                heading = chunk["heading"]
+                text = artifact["body"][chunk["start"]:chunk["end"]]
+                anchor = heading_anchor(heading)
+            snippet, highlights = make_snippet(text, stems, self.snippet_chars)
+            hits.append({
+                "kind": hit_kind,
+                "lesson_id": doc_id if hit_kind == "lesson" else None,
+                "artifact_id": doc_id if hit_kind == "artifact" else None,
+                "title": title,
+                "heading": heading or None,
+                "anchor": anchor,
+                "snippet": snippet,
+                "highlights": highlights,
+                "score": round(score, 4)
+            })
+        return hits
@@ -0,0 +1,396 @@
+"""
+Session Store - Server-side conversation history for /chat sessions
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Base class for conversation session storage.
+
+    Sessions expire after ttl seconds without use; the number of sessions
+    and of messages kept per session are bounded. Images are kept as the
+    img:<sha256> references of the image store, so messages only hold
+    short strings and no image data.
+    The async variants (acreate, aget_messages, ...) are what request
+    handlers use: stores doing disk I/O run there in a worker thread.
+    """
+
+    name: str = "base"
+    # Stores doing disk I/O are called from a worker thread instead of the event loop
+    blocking: bool = False
+
+    def __init__(self, ttl: float = 86400.0, max_sessions: int = 1000, max_messages: int = 200):
+        """
+        Initialize session store
+
+        Args:
+            ttl: Seconds of inactivity after which a session expires
+            max_sessions: Maximum number of live sessions (least recently used are evicted)
+            max_messages: Maximum messages kept per session (oldest are dropped)
+        """
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.max_messages = max(2, max_messages)
+        # One thread serializes access to a blocking store's connection
+        self._executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store") if self.blocking else None
+        )
+
+    def _new_session_id(self) -> str:
+        return secrets.token_urlsafe(16)
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def acreate(self) -> str:
+        """Async create()"""
+        return await self._run(self.create)
+
+    async def aget_messages(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Async get_messages()"""
+        return await self._run(self.get_messages, session_id)
+
+    async def aappend(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """Async append()"""
+        return await self._run(self.append, session_id, messages)
+
+    async def adelete(self, session_id: str) -> bool:
+        """Async delete()"""
+        return await self._run(self.delete, session_id)
+
+    async def aget_stats(self) -> Dict[str, Any]:
+        """Async get_stats()"""
+        return await self._run(self.get_stats)
+
+    def close(self) -> None:
+        """Wait for pending operations and release resources"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    @abstractmethod
+    def create(self) -> str:
+        """
+        Create an empty session
+
+        Returns:
+            New session ID
+        """
+
+    @abstractmethod
+    def get_messages(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get a session's messages and refresh its expiry
+
+        Args:
+            session_id: Session ID
+
+        Returns:
+            Messages as {"role", "content", "images"} dicts, or None if unknown/expired
+        """
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        """
+        Append messages to a session
+
+        Args:
+            session_id: Session ID
+            messages: Messages as {"role", "content", "images"} dicts
+
+        Returns:
+            False if the session is unknown or expired
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """
+        Delete a session
+
+        Args:
+            session_id: Session ID
+
+        Returns:
+            True if the session existed
+        """
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get storage counters
+
+        Returns:
+            Dictionary with backend, sessions and max_sessions
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """In-process session store (lost on restart, not shared between workers)"""
+
+    name = "memory"
+
+    def __init__(self, ttl: float = 86400.0, max_sessions: int = 1000, max_messages: int = 200):
+        super().__init__(ttl, max_sessions, max_messages)
+        # session_id -> {"expires": ts, "messages": [{"role", "content", "images"}]} (LRU order)
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _evict(self) -> None:
+        """Drop expired sessions and least recently used ones past the limit"""
+        now = time.time()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session["expires"] > now and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def _get_live(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session["expires"] <= time.time():
+            del self._sessions[session_id]
+            return None
+        session["expires"] = time.time() + self.ttl
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def create(self) -> str:
+        session_id = self._new_session_id()
+        self._sessions[session_id] = {"expires": time.time() + self.ttl, "messages": []}
+        self._evict()
+        return session_id
+
+    def get_messages(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        session = self._get_live(session_id)
+        if session is None:
+            return None
+        return [
+            {"role": message["role"], "content": message["content"], "images": list(message["images"])}
+            for message in session["messages"]
+        ]
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        session = self._get_live(session_id)
+        if session is None:
+            return False
+        for message in messages:
+            session["messages"].append({
+                "role": message["role"],
+                "content": message["content"],
+                "images": list(message.get("images") or [])
+            })
+        overflow = len(session["messages"]) - self.max_messages
+        if overflow > 0:
+            del session["messages"][:overflow]
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._evict()
+        return {
+            "backend": self.name,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed session store (survives restarts, shared by workers on one host)"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 86400.0,
+        max_sessions: int = 1000,
+        max_messages: int = 200
+    ):
+        """
+        Initialize SQLite session store
+
+        Args:
+            path: Database file path (created if missing)
+            ttl: Seconds of inactivity after which a session expires
+            max_sessions: Maximum number of live sessions (least recently used are evicted)
+            max_messages: Maximum messages kept per session (oldest are dropped)
+        """
+        super().__init__(ttl, max_sessions, max_messages)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                images TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+            """
+        )
+        self._migrate_image_table()
+
+    def _migrate_image_table(self) -> None:
+        """Inline images of databases that still have the former content-hash table"""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images'"
+        ).fetchone()
+        if not exists:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute(
+                "UPDATE messages SET images = ("
+                " SELECT json_group_array(images.data) FROM json_each(messages.images)"
+                " JOIN images ON images.hash = json_each.value)"
+                " WHERE images != '[]'"
+            )
+            self._conn.execute("DROP TABLE images")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Session images moved into messages: {self.path}")
+
+    def _evict(self) -> None:
+        now = time.time()
+        self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def _touch(self, session_id: str) -> bool:
+        now = time.time()
+        updated = self._conn.execute(
+            "UPDATE sessions SET expires_at = ?, last_access = ? WHERE id = ? AND expires_at > ?",
+            (now + self.ttl, now, session_id, now)
+        ).rowcount
+        return updated > 0
+
+    def create(self) -> str:
+        session_id = self._new_session_id()
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO sessions (id, expires_at, last_access) VALUES (?, ?, ?)",
+            (session_id, now + self.ttl, now)
+        )
+        self._evict()
+        return session_id
+
+    def get_messages(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        if not self._touch(session_id):
+            return None
+        rows = self._conn.execute(
+            "SELECT role, content, images FROM messages WHERE session_id = ? ORDER BY seq",
+            (session_id,)
+        ).fetchall()
+        return [
+            {"role": role, "content": content, "images": json.loads(images)}
+            for role, content, images in rows
+        ]
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]]) -> bool:
+        if not self._touch(session_id):
+            return False
+        self._conn.execute("BEGIN")
+        try:
+            (next_seq,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, images) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (session_id, next_seq + offset, message["role"], message["content"],
+                     json.dumps(message.get("images") or []))
+                    for offset, message in enumerate(messages)
+                ]
+            )
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq < ?",
+                (session_id, next_seq + len(messages) - self.max_messages)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        return self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._evict()
+        (sessions,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {
+            "backend": self.name,
+            "sessions": sessions,
+            "max_sessions": self.max_sessions
+        }
+
+    def close(self) -> None:
+        """Wait for pending operations and close the database connection"""
+        super().close()
+        self._conn.close()
+
+
+def create_session_store(
+    backend: str = "memory",
+    path: str = "",
+    ttl: float = 86400.0,
+    max_sessions: int = 1000,
+    max_messages: int = 200
+) -> SessionStore:
+    """
+    Create a session store with the named backend (falls back to memory)
+
+    Args:
+        backend: 'memory' or 'sqlite'
+        path: Database path for the sqlite backend
+        ttl: Seconds of inactivity after which a session expires
+        max_sessions: Maximum number of live sessions
+        max_messages: Maximum messages kept per session
+
+    Returns:
+        SessionStore instance
+    """
+    if backend == "sqlite" and path:
+        try:
+            store: SessionStore = SQLiteSessionStore(path, ttl, max_sessions, max_messages)
+        except sqlite3.Error as e:
+            logger.warning(f"Cannot open session database {path}, using memory: {e}")
+            store = MemorySessionStore(ttl, max_sessions, max_messages)
+    else:
+        store = MemorySessionStore(ttl, max_sessions, max_messages)
+    logger.info(f"Session store ready ({store.name}, ttl={ttl}s, max_sessions={store.max_sessions})")
+    return store
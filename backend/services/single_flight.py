@@ -0,0 +1,143 @@
+"""
+Single Flight - Coalesces identical concurrent upstream requests into one call
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One shared upstream call and the number of callers waiting on it"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        # Streaming only: events produced so far, and a wake-up signal for subscribers
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def publish(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """
+    Runs at most one upstream call per key at a time.
+
+    Callers arriving while a call with the same key is in flight share its
+    result (buffered) or subscribe to its event stream from the beginning
+    (streaming). A caller that goes away only detaches itself; the shared
+    call is cancelled once its last waiter is gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def _join(self, key: str) -> Optional[_Flight]:
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            self._stats["coalesced"] += 1
+        return flight
+
+    def _start(self, key: str, runner: Callable[[_Flight], Awaitable]) -> _Flight:
+        flight = _Flight()
+        flight.waiters = 1
+        flight.task = asyncio.ensure_future(runner(flight))
+        self._flights[key] = flight
+        self._stats["leaders"] += 1
+
+        def forget(_: asyncio.Task) -> None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight.task.add_done_callback(forget)
+        return flight
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        flight.waiters -= 1
+        if flight.waiters <= 0 and not flight.task.done():
+            logger.info("All waiters left, cancelling shared upstream request")
+            flight.task.cancel()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run call() once for all concurrent callers with the same key
+
+        Args:
+            key: Request fingerprint
+            call: Factory for the upstream coroutine (only invoked by the first caller)
+
+        Returns:
+            Result of the shared call (exceptions are propagated to every caller)
+        """
+        flight = self._join(key) or self._start(key, lambda _: call())
+        try:
+            # shield: cancelling one caller must not cancel the call the others await
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(key, flight)
+
+    async def stream(self, key: str, call: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Share one upstream event stream between concurrent callers with the same key
+
+        Late subscribers first receive the events already produced, so every
+        caller sees the complete stream.
+
+        Args:
+            key: Request fingerprint
+            call: Factory for the upstream async iterator (only invoked by the first caller)
+
+        Yields:
+            Events of the shared stream (an upstream error is raised in every subscriber)
+        """
+        flight = self._join(key) or self._start(key, lambda new_flight: self._pump(new_flight, call))
+
+        position = 0
+        try:
+            while True:
+                if position < len(flight.events):
+                    event = flight.events[position]
+                    position += 1
+                    yield event
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            self._leave(key, flight)
+
+    async def _pump(self, flight: _Flight, call: Callable[[], AsyncIterator[Any]]) -> None:
+        """Drain the upstream iterator into the flight's event buffer"""
+        try:
+            async for event in call():
+                flight.events.append(event)
+                flight.publish()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.publish()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters
+
+        Returns:
+            Dictionary with leaders (upstream calls made), coalesced (calls saved) and in_flight
+        """
+        return {**self._stats, "in_flight": len(self._flights)}
@@ -0,0 +1,131 @@
+"""
+Text Analysis - Tokenization and stemming for mixed Russian/English lesson text
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words: Cyrillic or Latin letters/digits, allowing inner hyphens/dots (client-server, next.js)
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+(?:[-.][0-9a-zа-яё]+)*")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how if in into is it its of on or that the
+their then there these this to was what when where which who why will with you your can do does
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне
+было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него
+до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы
+тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому
+этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех никогда
+можно при наконец два об другой хоть после над больше тот через эти нас про всего них какая
+много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им
+более всегда конечно всю между это как также
+""".split())
+
+try:
+    import snowballstemmer
+
+    _russian_stemmer = snowballstemmer.stemmer("russian")
+    _english_stemmer = snowballstemmer.stemmer("english")
+except ImportError:  # pragma: no cover - depends on environment
+    _russian_stemmer = None
+    _english_stemmer = None
+    logger.warning("snowballstemmer not installed; using light suffix stripping for search")
+
+_RU_SUFFIXES = sorted("""
+иями ями ами ией иях ого его ому ему ыми ими ая яя ое ее ые ие ой ей ий ый ом ем ам ям ах ях ую
+юю ов ев ия ья ию ью ть ти ся сь а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+_EN_SUFFIXES = ("ations", "ation", "ings", "ing", "edly", "ed", "ies", "es", "ly", "s")
+
+
+def _light_stem_ru(word: str) -> str:
+    for suffix in _RU_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _light_stem_en(word: str) -> str:
+    for suffix in _EN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    """
+    Stem a single lowercase word with the stemmer for its script
+
+    Args:
+        word: Lowercase word (Cyrillic or Latin)
+
+    Returns:
+        Word stem
+    """
+    if _CYRILLIC_RE.search(word):
+        if _russian_stemmer is not None:
+            return _russian_stemmer.stemWord(word)
+        return _light_stem_ru(word)
+    if word.isdigit():
+        return word
+    if _english_stemmer is not None:
+        return _english_stemmer.stemWord(word)
+    return _light_stem_en(word)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens (ё normalized to е)
+
+    Args:
+        text: Raw text
+
+    Returns:
+        List of word tokens in order of appearance
+    """
+    return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def tokenize_with_offsets(text: str) -> List[Tuple[str, int, int]]:
+    """
+    Split text into lowercase word tokens together with their positions
+
+    Args:
+        text: Raw text
+
+    Returns:
+        List of (token, start, end) where start/end are character offsets into text
+    """
+    lowered = text.lower().replace("ё", "е")
+    if len(lowered) != len(text):
+        # A few characters change length when lowercased; keep offsets aligned
+        lowered = "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text).replace("ё", "е")
+    return [(match.group(), match.start(), match.end()) for match in _WORD_RE.finditer(lowered)]
+
+
+def analyze(text: str) -> List[str]:
+    """
+    Tokenize, drop stopwords and stem text for indexing or querying
+
+    Args:
+        text: Raw text
+
+    Returns:
+        List of index terms (compound tokens also contribute their parts)
+    """
+    terms = []
+    for token in tokenize(text):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        terms.append(stem(token))
+        if "-" in token or "." in token:
+            terms.extend(
+                stem(part) for part in re.split(r"[-.]", token)
+                if len(part) > 1 and part not in STOPWORDS
+            )
+    return terms
@@ -0,0 +1,257 @@
+"""
+Tokenizer - Offline token counting for lesson context estimates
+"""
+import logging
+import re
+import string
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ASCII punctuation usually becomes standalone tokens (code blocks, tables, markup)
+_SYMBOL_RE = re.compile(f"[{re.escape(string.punctuation)}]")
+_WHITESPACE_RE = re.compile(r"[ \t\n\r\f\v]")
+
+
+class Tokenizer(ABC):
+    """Base class for token counters"""
+
+    name: str = "base"
+
+    @property
+    def signature(self) -> str:
+        """Identifies tokenizer type and parameters (stored counts are only valid for the same signature)"""
+        params = ",".join(f"{k}={v}" for k, v in sorted(vars(self).items()) if not k.startswith("_"))
+        return f"{type(self).__name__}({params})"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """
+        Count tokens in text
+
+        Args:
+            text: Text to tokenize
+
+        Returns:
+            Number of tokens
+        """
+
+
+class CharRatioTokenizer(Tokenizer):
+    """Flat characters-per-token approximation"""
+
+    def __init__(self, name: str, chars_per_token: float = 4.0):
+        """
+        Initialize char-ratio tokenizer
+
+        Args:
+            name: Tokenizer name used as the key for stored counts
+            chars_per_token: Average characters per token
+        """
+        self.name = name
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token)
+
+
+class HeuristicTokenizer(Tokenizer):
+    """
+    Script-aware approximation of BPE token counts.
+
+    Latin text, non-ASCII (mostly Cyrillic) text and symbols compress very
+    differently, so each class gets its own chars-per-token ratio instead of
+    a flat 4 characters per token.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ascii_chars_per_token: float,
+        non_ascii_chars_per_token: float,
+        symbols_per_token: float = 1.2
+    ):
+        """
+        Initialize heuristic tokenizer
+
+        Args:
+            name: Tokenizer name used as the key for stored counts
+            ascii_chars_per_token: Average ASCII letters/digits per token
+            non_ascii_chars_per_token: Average non-ASCII characters per token
+            symbols_per_token: Average ASCII punctuation characters per token
+        """
+        self.name = name
+        self.ascii_chars_per_token = ascii_chars_per_token
+        self.non_ascii_chars_per_token = non_ascii_chars_per_token
+        self.symbols_per_token = symbols_per_token
+
+    @staticmethod
+    def char_classes(text: str) -> Tuple[int, int, int]:
+        """
+        Count the character classes the estimate is based on
+
+        The classes do not depend on the ratios, so one result can be
+        shared by all heuristic tokenizers (see count_all).
+
+        Args:
+            text: Non-empty text
+
+        Returns:
+            Tuple of (ASCII letters/digits, non-ASCII characters, ASCII
+            punctuation); together with ASCII whitespace they add up to len(text)
+        """
+        total_chars = len(text)
+        # Characters above U+007F, counted in C (same as sum(1 for c in text if ord(c) > 127))
+        non_ascii = total_chars - len(text.encode("ascii", errors="ignore"))
+        symbols = _SYMBOL_RE.subn("", text)[1]
+        whitespace = _WHITESPACE_RE.subn("", text)[1]
+        ascii_chars = total_chars - non_ascii - symbols - whitespace
+        return ascii_chars, non_ascii, symbols
+
+    def count_classes(self, classes: Tuple[int, int, int]) -> int:
+        """Token estimate from the result of char_classes()"""
+        ascii_chars, non_ascii, symbols = classes
+        tokens = (
+            ascii_chars / self.ascii_chars_per_token
+            + non_ascii / self.non_ascii_chars_per_token
+            + symbols / self.symbols_per_token
+        )
+        return max(1, int(tokens))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self.count_classes(self.char_classes(text))
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact BPE counts via tiktoken (requires locally cached encoding files)"""
+
+    def __init__(self, name: str, encoding_name: str):
+        """
+        Initialize tiktoken tokenizer
+
+        Args:
+            name: Tokenizer name used as the key for stored counts
+            encoding_name: tiktoken encoding (e.g. 'o200k_base')
+
+        Raises:
+            ImportError: If tiktoken is not installed
+            Exception: If the encoding cannot be loaded offline
+        """
+        import tiktoken
+
+        self.name = name
+        self.encoding_name = encoding_name
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+# Default tokenizer for unknown models: the old "1 token ≈ 4 characters" rule
+DEFAULT_TOKENIZER = "generic"
+
+# Model id prefix -> tokenizer name
+MODEL_TOKENIZERS: Dict[str, str] = {
+    "openai/": "openai",
+    "anthropic/": "anthropic",
+    "google/": "gemini",
+    "x-ai/": "grok",
+}
+
+_registry: Dict[str, Tokenizer] = {}
+
+
+def _build_default_tokenizers() -> Dict[str, Tokenizer]:
+    tokenizers: Dict[str, Tokenizer] = {
+        DEFAULT_TOKENIZER: CharRatioTokenizer(DEFAULT_TOKENIZER, 4.0),
+        "openai": HeuristicTokenizer("openai", 4.2, 3.2),
+        "anthropic": HeuristicTokenizer("anthropic", 3.8, 2.4),
+        "gemini": HeuristicTokenizer("gemini", 4.2, 3.4),
+        "grok": HeuristicTokenizer("grok", 4.0, 2.8),
+    }
+
+    # Prefer exact counts for OpenAI models when tiktoken and its encoding are available offline
+    try:
+        tokenizers["openai"] = TiktokenTokenizer("openai", "o200k_base")
+        logger.info("Using tiktoken o200k_base for OpenAI token counts")
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, using heuristic counts: {e}")
+
+    return tokenizers
+
+
+def register_tokenizer(tokenizer: Tokenizer, model_prefix: Optional[str] = None) -> None:
+    """
+    Register (or replace) a tokenizer
+
+    Args:
+        tokenizer: Tokenizer instance
+        model_prefix: Optional model id prefix that should use this tokenizer
+    """
+    get_tokenizers()[tokenizer.name] = tokenizer
+    if model_prefix:
+        MODEL_TOKENIZERS[model_prefix] = tokenizer.name
+
+
+def get_tokenizers() -> Dict[str, Tokenizer]:
+    """
+    Get all registered tokenizers
+
+    Returns:
+        Dictionary of tokenizer name -> Tokenizer
+    """
+    if not _registry:
+        _registry.update(_build_default_tokenizers())
+    return _registry
+
+
+def count_all(text: str) -> Dict[str, int]:
+    """
+    Count tokens of a text with every registered tokenizer
+
+    Heuristic tokenizers share one character-class scan instead of
+    scanning the text once each.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        Dictionary of tokenizer name -> token count
+    """
+    counts: Dict[str, int] = {}
+    classes: Optional[Tuple[int, int, int]] = None
+    for name, tokenizer in get_tokenizers().items():
+        if not text:
+            counts[name] = 0
+        elif type(tokenizer) is HeuristicTokenizer:
+            if classes is None:
+                classes = HeuristicTokenizer.char_classes(text)
+            counts[name] = tokenizer.count_classes(classes)
+        else:
+            counts[name] = tokenizer.count(text)
+    return counts
+
+
+def get_tokenizer(model_id: Optional[str] = None) -> Tokenizer:
+    """
+    Get tokenizer for a model
+
+    Args:
+        model_id: Model identifier (None = generic tokenizer)
+
+    Returns:
+        Tokenizer matching the model's provider
+    """
+    tokenizers = get_tokenizers()
+    if model_id:
+        for prefix, name in MODEL_TOKENIZERS.items():
+            if model_id.startswith(prefix) and name in tokenizers:
+                return tokenizers[name]
+    return tokenizers[DEFAULT_TOKENIZER]
@@ -0,0 +1,262 @@
+"""
+Vector Store - Local embeddings for semantic retrieval over lesson chunks
+"""
+import hashlib
+import json
+import logging
+import os
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .text_analysis import analyze
+
+logger = logging.getLogger(__name__)
+
+
+class Encoder(ABC):
+    """Base class for text encoders"""
+
+    name: str = "base"
+    dim: int = 0
+
+    @abstractmethod
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dim), rows L2-normalized
+        """
+
+
+@lru_cache(maxsize=500_000)
+def _hash_feature(feature: str, dim: int) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, (1.0 if h & 0x80000000 else -1.0)
+
+
+class HashingEncoder(Encoder):
+    """
+    Deterministic feature-hashing encoder (no model download, used as fallback).
+
+    Stemmed terms and their character trigrams are hashed with CRC32 into a
+    fixed number of signed buckets, so the same text always gets the same
+    vector across processes.
+    """
+
+    def __init__(self, dim: int = 384):
+        """
+        Initialize hashing encoder
+
+        Args:
+            dim: Vector dimensionality
+        """
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        features = []
+        for term in analyze(text):
+            features.append((term, 1.0))
+            padded = f"<{term}>"
+            for i in range(len(padded) - 2):
+                features.append((padded[i:i + 3], 0.25))
+        return features
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                bucket, sign = _hash_feature(feature, self.dim)
+                vectors[row, bucket] += sign * weight
+        # Sublinear scaling keeps frequent terms from dominating
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+
+class SentenceTransformerEncoder(Encoder):
+    """Encoder backed by a locally available sentence-transformers model"""
+
+    def __init__(self, model_name_or_path: str):
+        """
+        Initialize sentence-transformers encoder
+
+        Args:
+            model_name_or_path: Local model directory (or a name already in the local cache)
+
+        Raises:
+            ImportError: If sentence-transformers is not installed
+        """
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name_or_path)
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = f"st-{os.path.basename(model_name_or_path.rstrip('/'))}-{self.dim}"
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def get_encoder(encoder_name: str = "hashing", model_path: str = "", dim: int = 384) -> Encoder:
+    """
+    Create an encoder by name, falling back to hashing if unavailable
+
+    Args:
+        encoder_name: 'hashing' or 'sentence-transformers'
+        model_path: Local model path for sentence-transformers
+        dim: Dimensionality for the hashing encoder
+
+    Returns:
+        Encoder instance
+    """
+    if encoder_name == "sentence-transformers" and model_path:
+        try:
+            return SentenceTransformerEncoder(model_path)
+        except Exception as e:
+            logger.warning(f"Cannot load sentence-transformers model '{model_path}', using hashing encoder: {e}")
+    return HashingEncoder(dim)
+
+
+class VectorStore:
+    """
+    Float32 embedding matrix persisted as .npy and memory-mapped at startup.
+
+    Rows are keyed by content hash, so re-syncing after a lesson change only
+    embeds chunks whose text actually changed.
+    """
+
+    def __init__(self, index_dir: str, encoder: Encoder):
+        """
+        Initialize vector store
+
+        Args:
+            index_dir: Directory for the .npy matrix and its manifest
+            encoder: Encoder used to embed chunks and queries
+        """
+        self.index_dir = index_dir
+        self.encoder = encoder
+        self.keys: List[Hashable] = []
+        self.groups = np.zeros(0, dtype=np.int64)
+        self._matrix = np.zeros((0, encoder.dim), dtype=np.float32)
+        self._hashes: List[str] = []
+
+    @property
+    def _matrix_path(self) -> str:
+        return os.path.join(self.index_dir, f"vectors-{self.encoder.name}.npy")
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.index_dir, f"vectors-{self.encoder.name}.json")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _content_hash(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load_existing(self) -> Tuple[np.ndarray, List[str]]:
+        """Memory-map the stored matrix and read its row hashes (empty if absent/invalid)"""
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                hashes = json.load(f)["hashes"]
+            matrix = np.load(self._matrix_path, mmap_mode="r")
+            if matrix.shape != (len(hashes), self.encoder.dim):
+                raise ValueError(f"shape {matrix.shape} does not match manifest")
+            return matrix, hashes
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring invalid vector store {self._matrix_path}: {e}")
+        return np.zeros((0, self.encoder.dim), dtype=np.float32), []
+
+    def sync(self, items: Sequence[Tuple[Hashable, str]]) -> None:
+        """
+        Make the store contain exactly the given items, embedding only new content
+
+        Args:
+            items: (key, text) pairs; key[0] is used as the group for filtering
+        """
+        existing, existing_hashes = self._load_existing()
+        row_by_hash = {h: i for i, h in enumerate(existing_hashes)}
+
+        hashes = [self._content_hash(text) for _, text in items]
+        missing = [i for i, h in enumerate(hashes) if h not in row_by_hash]
+
+        if not missing and hashes == existing_hashes:
+            matrix = existing
+        else:
+            matrix = np.empty((len(items), self.encoder.dim), dtype=np.float32)
+            for i, h in enumerate(hashes):
+                if h in row_by_hash:
+                    matrix[i] = existing[row_by_hash[h]]
+            if missing:
+                logger.info(f"Embedding {len(missing)} new chunks with {self.encoder.name}")
+                matrix[missing] = self.encoder.encode([items[i][1] for i in missing])
+            matrix = self._save(matrix, hashes)
+
+        self._matrix = matrix
+        self._hashes = hashes
+        self.keys = [key for key, _ in items]
+        self.groups = np.array([key[0] for key in self.keys], dtype=np.int64)
+        logger.info(
+            f"Vector store ready: {len(self.keys)} vectors, {len(missing)} embedded, "
+            f"{len(self.keys) - len(missing)} reused"
+        )
+
+    def _save(self, matrix: np.ndarray, hashes: List[str]) -> np.ndarray:
+        """Persist matrix + manifest atomically and return a memory-mapped view"""
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_matrix = self._matrix_path + ".tmp.npy"
+            tmp_manifest = self._manifest_path + ".tmp"
+            np.save(tmp_matrix, matrix)
+            with open(tmp_manifest, "w", encoding="utf-8") as f:
+                json.dump({"encoder": self.encoder.name, "dim": self.encoder.dim, "hashes": hashes}, f)
+            os.replace(tmp_matrix, self._matrix_path)
+            os.replace(tmp_manifest, self._manifest_path)
+            return np.load(self._matrix_path, mmap_mode="r")
+        except OSError as e:
+            logger.warning(f"Cannot persist vector store to {self.index_dir}, keeping it in memory: {e}")
+            return matrix
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        groups: Optional[Iterable[int]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """
+        Find the items most similar to a query (cosine similarity)
+
+        Args:
+            query: Query text
+            top_k: Maximum number of results
+            groups: Optional group ids (key[0]) to restrict the search to
+
+        Returns:
+            List of (key, score) sorted by descending score
+        """
+        if not self.keys or top_k <= 0:
+            return []
+
+        query_vector = self.encoder.encode([query])[0]
+        scores = self._matrix @ query_vector
+
+        if groups is not None:
+            mask = np.isin(self.groups, np.fromiter(groups, dtype=np.int64))
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.keys[i], float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
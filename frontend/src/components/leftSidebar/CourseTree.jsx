@@ -25,6 +25,13 @@ export default function CourseTree({ lessons, currentLessonId, onLessonSelect })
     return () => window.removeEventListener('progressUpdated', handleProgressUpdate);
   }, []);
 
+  // Forget progress of lessons that no longer exist
+  useEffect(() => {
+    if (progressService.syncWithLessons(lessons)) {
+      forceUpdate(prev => prev + 1);
+    }
+  }, [lessons]);
+
   // Course metadata
   const courseInfo = {
     'ai-web-learning': {
@@ -5,6 +5,11 @@
 
 const STORAGE_KEY = 'ai-learning-agent-progress';
 
+// Version 1 stored sequential lesson IDs (1..N in server scan order); since
+// version 2 lesson IDs are stable hashes of the lesson path. The old numbers
+// cannot be mapped to lessons, so version 1 progress is discarded once.
+const PROGRESS_VERSION = 2;
+
 class ProgressService {
   /**
    * Get progress data from localStorage
@@ -16,7 +21,11 @@ class ProgressService {
       if (!stored) {
         return this._getDefaultProgress();
       }
-      return JSON.parse(stored);
+      const progress = JSON.parse(stored);
+      if (progress.version !== PROGRESS_VERSION) {
+        return this._migrateProgress(progress);
+      }
+      return progress;
     } catch (error) {
       console.error('Error loading progress:', error);
       return this._getDefaultProgress();
@@ -29,6 +38,7 @@ class ProgressService {
    */
   _getDefaultProgress() {
     return {
+      version: PROGRESS_VERSION, // Schema version (see PROGRESS_VERSION)
       completedLessons: [],     // Array of completed lesson IDs
       lastVisited: null,         // ID of last visited lesson
       lastVisitedDate: null,     // Date of last visit
@@ -36,6 +46,53 @@ class ProgressService {
     };
   }
 
+  /**
+   * Replace progress saved with an older schema version
+   * @param {Object} progress - Stored progress object
+   * @returns {Object} Migrated progress
+   */
+  _migrateProgress(progress) {
+    const migrated = this._getDefaultProgress();
+    if (progress.completedLessons?.length || progress.lastVisited != null) {
+      console.warn(
+        'Lesson IDs changed: progress saved with sequential lesson IDs was reset ' +
+        `(${progress.completedLessons?.length || 0} completed lessons)`
+      );
+    }
+    this._saveProgress(migrated);
+    return migrated;
+  }
+
+  /**
+   * Drop lesson IDs that no longer exist (deleted or renamed lessons)
+   * @param {Array} lessons - Array of all lessons from /lessons
+   * @returns {boolean} True if progress changed
+   */
+  syncWithLessons(lessons) {
+    if (!lessons || lessons.length === 0) {
+      return false;
+    }
+    const progress = this.getProgress();
+    const lessonIds = new Set(lessons.map(lesson => lesson.id));
+    const completedLessons = progress.completedLessons.filter(id => lessonIds.has(id));
+    const lastVisited = lessonIds.has(progress.lastVisited) ? progress.lastVisited : null;
+
+    if (completedLessons.length === progress.completedLessons.length &&
+        lastVisited === progress.lastVisited &&
+        progress.totalCompleted === completedLessons.length) {
+      return false;
+    }
+
+    progress.completedLessons = completedLessons;
+    progress.totalCompleted = completedLessons.length;
+    progress.lastVisited = lastVisited;
+    if (lastVisited === null) {
+      progress.lastVisitedDate = null;
+    }
+    this._saveProgress(progress);
+    return true;
+  }
+
   /**
    * Save progress to localStorage
    * @param {Object} progress - Progress object
@@ -189,11 +246,11 @@ class ProgressService {
    * @returns {Object|null} Next lesson to study or null
    */
   getNextLesson(lessons) {
-    // Sort lessons by course, module, then id
+    // Sort lessons by course, module, then filename (IDs are path hashes, not positions)
     const sortedLessons = [...lessons].sort((a, b) => {
       if (a.course !== b.course) return a.course.localeCompare(b.course);
       if (a.module !== b.module) return a.module.localeCompare(b.module);
-      return a.id - b.id;
+      return a.filename.localeCompare(b.filename, undefined, { numeric: true });
     });
 
     // Find first incomplete lesson
@@ -229,6 +286,9 @@ class ProgressService {
       if (!Array.isArray(progress.completedLessons)) {
         throw new Error('Invalid progress format');
       }
+      if (progress.version !== PROGRESS_VERSION) {
+        throw new Error('Progress was exported with outdated lesson IDs');
+      }
 
       this._saveProgress(progress);
       return true;